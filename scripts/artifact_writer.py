@@ -0,0 +1,272 @@
+"""
+Background artifact writer for NYC flood-related 311 complaints analysis.
+
+Pipeline stages hand their output tables to this module instead of writing
+them in place. A single background thread writes them, by default as
+(Geo)Parquet with zstd compression, while the pipeline keeps computing; each
+file is written to a temporary name and renamed, so readers never see a
+partial artifact. GeoJSON and CSV can be selected for legacy consumers.
+flush() is the barrier that waits for every queued write and re-raises the
+first write error; it runs at interpreter exit and before artifacts are read
+back.
+"""
+
+import pandas as pd
+import geopandas as gpd
+import pyarrow.parquet as pq
+import atexit
+import os
+import queue
+import threading
+import time
+
+import metrics
+
+# Artifact formats and their file extensions
+ARTIFACT_FORMATS = {
+    'parquet': '.parquet',
+    'geojson': '.geojson',
+    'csv': '.csv'
+}
+DEFAULT_FORMATS = ['parquet']
+
+# Parquet compression codecs ('none' for uncompressed)
+COMPRESSION_CODECS = ['zstd', 'snappy', 'gzip', 'none']
+DEFAULT_COMPRESSION = 'zstd'
+
+# CRS of the WKT geometries in CSV artifacts, which cannot record their CRS
+CSV_CRS = "EPSG:4326"
+
+# Queued writes beyond this block the submitting stage, bounding the memory held by pending tables
+MAX_PENDING_WRITES = 8
+
+def _copy_on_write():
+    """
+    Check whether pandas copy-on-write is active (always on from pandas 3).
+    
+    Returns:
+        bool: True if shallow copies do not share data with their source
+    """
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    
+    # The option is opt-in before pandas 3 (absent before 1.5); 'warn' still shares data
+    return getattr(pd.options.mode, 'copy_on_write', False) is True
+
+class ArtifactWriter:
+    """
+    Writes tables on a background thread.
+    
+    Args:
+        formats (list): Formats written for each artifact (keys of ARTIFACT_FORMATS)
+        compression (str): Parquet compression codec
+        background (bool): Whether to write on a background thread (False writes synchronously)
+    """
+    
+    def __init__(self, formats=None, compression=DEFAULT_COMPRESSION, background=True):
+        formats = list(DEFAULT_FORMATS if formats is None else formats)
+        unknown = [fmt for fmt in formats if fmt not in ARTIFACT_FORMATS]
+        if unknown or not formats:
+            raise ValueError(f"Unknown artifact formats {unknown}; choose from {list(ARTIFACT_FORMATS)}")
+        if compression not in COMPRESSION_CODECS:
+            raise ValueError(f"Unknown compression {compression}; choose from {COMPRESSION_CODECS}")
+        
+        self.formats = formats
+        self.compression = compression
+        self.background = background
+        self._queue = queue.Queue(maxsize=MAX_PENDING_WRITES)
+        self._thread = None
+        self._errors = []
+    
+    def _run(self):
+        """Write queued artifacts until the process exits."""
+        while True:
+            df, path, stage = self._queue.get()
+            try:
+                self._write(df, path, stage)
+            except Exception as e:
+                self._errors.append((path, e))
+            finally:
+                self._queue.task_done()
+    
+    def _write(self, df, path, stage=None):
+        """Write one artifact file through a temporary file, recording its size and write time."""
+        start = time.perf_counter()
+        tmp_path = path + '.tmp'
+        fmt = next(fmt for fmt, extension in ARTIFACT_FORMATS.items() if path.endswith(extension))
+        is_geo = isinstance(df, gpd.GeoDataFrame)
+        compression = None if self.compression == 'none' else self.compression
+        
+        if fmt == 'parquet':
+            df.to_parquet(tmp_path, index=False, compression=compression)
+        elif fmt == 'geojson':
+            df.to_file(tmp_path, driver='GeoJSON')
+        elif is_geo:
+            # Legacy CSV consumers get geometries as WKT text, in the CRS read_artifact assumes
+            if df.crs is not None:
+                df = df.to_crs(CSV_CRS)
+            pd.DataFrame(df).assign(**{df.geometry.name: df.geometry.to_wkt()}).to_csv(tmp_path, index=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        
+        os.replace(tmp_path, path)
+        metrics.emit('artifact', path=path, stage=stage, rows=len(df), bytes=os.path.getsize(path),
+                     wall_s=round(time.perf_counter() - start, 6))
+    
+    def submit(self, df, path_stem, formats=None):
+        """
+        Queue a table to be written in every selected format.
+        
+        The table is not copied: callers must not modify its values in place
+        after submitting it (replacing columns is safe). GeoJSON is only
+        written for GeoDataFrames. Files of the artifact in other formats,
+        left by earlier runs, are removed so they cannot be read back stale.
+        
+        Args:
+            df (pd.DataFrame): Table to write (a GeoDataFrame is written as GeoParquet)
+            path_stem (str): Output path without extension
+            formats (list): Formats for this artifact (None for the writer's formats)
+        
+        Returns:
+            list: Paths of the files that will be written
+        """
+        is_geo = isinstance(df, gpd.GeoDataFrame)
+        formats = [fmt for fmt in (self.formats if formats is None else formats) if is_geo or fmt != 'geojson']
+        if not formats:
+            formats = ['parquet']
+        
+        paths = [path_stem + ARTIFACT_FORMATS[fmt] for fmt in formats]
+        for fmt, extension in ARTIFACT_FORMATS.items():
+            if fmt not in formats and os.path.exists(path_stem + extension):
+                os.remove(path_stem + extension)
+        
+        # A shallow copy only isolates the queued table from later in-place edits under copy-on-write
+        snapshot = df.copy(deep=not _copy_on_write())
+        stage = metrics.current_stage()
+        for path in paths:
+            if not self.background:
+                self._write(snapshot, path, stage)
+                continue
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='artifact-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((snapshot, path, stage))
+        
+        return paths
+    
+    def _reset_after_fork(self):
+        """
+        Give a forked child process its own queue and thread.
+        
+        The child inherits the queue, including the waiters of the parent's
+        writer thread, but not the thread: writes queued in the child would
+        wake a waiter that no longer exists and never be written. Writes still
+        queued in the parent stay the parent's.
+        """
+        self._queue = queue.Queue(maxsize=MAX_PENDING_WRITES)
+        self._thread = None
+        self._errors = []
+    
+    def wait(self):
+        """Wait until every queued artifact is written, keeping write errors for the next flush."""
+        self._queue.join()
+    
+    def flush(self):
+        """
+        Wait until every queued artifact is written.
+        
+        Raises:
+            RuntimeError: If a write failed since the last flush
+        """
+        self._queue.join()
+        if self._errors:
+            errors, self._errors = self._errors, []
+            path, error = errors[0]
+            raise RuntimeError(f"{len(errors)} artifact writes failed, first {path}: {error}") from error
+
+_writer = ArtifactWriter()
+
+def configure(formats=None, compression=DEFAULT_COMPRESSION, background=True):
+    """
+    Replace the artifact writer, after writing everything queued to the current one.
+    
+    Args:
+        formats (list): Formats written for each artifact (None for DEFAULT_FORMATS)
+        compression (str): Parquet compression codec
+        background (bool): Whether to write on a background thread
+    """
+    global _writer
+    _writer.flush()
+    _writer = ArtifactWriter(formats=formats, compression=compression, background=background)
+
+def write_artifact(df, path_stem, formats=None):
+    """
+    Queue a table to be written by the artifact writer.
+    
+    Args:
+        df (pd.DataFrame): Table to write
+        path_stem (str): Output path without extension
+        formats (list): Formats for this artifact (None for the configured formats)
+    
+    Returns:
+        list: Paths of the files that will be written
+    """
+    return _writer.submit(df, path_stem, formats=formats)
+
+def flush():
+    """Wait until every queued artifact is written, re-raising the first write error."""
+    _writer.flush()
+
+def wait():
+    """Wait until every queued artifact is written, keeping write errors for the next flush."""
+    _writer.wait()
+
+def find_artifact(path_stem):
+    """
+    Find the file of an artifact, after writing everything queued.
+    
+    Args:
+        path_stem (str): Artifact path without extension
+    
+    Returns:
+        str: Path of the artifact, preferring Parquet over GeoJSON over CSV (None if not written)
+    """
+    flush()
+    for extension in ARTIFACT_FORMATS.values():
+        if os.path.exists(path_stem + extension):
+            return path_stem + extension
+    
+    return None
+
+def read_artifact(path_stem):
+    """
+    Read an artifact back, in whichever format it was written.
+    
+    Args:
+        path_stem (str): Artifact path without extension
+    
+    Returns:
+        pd.DataFrame: The table (a GeoDataFrame for geo artifacts; the WKT geometry column of a CSV
+            artifact is parsed back in CSV_CRS)
+    """
+    path = find_artifact(path_stem)
+    if path is None:
+        raise FileNotFoundError(f"No artifact {path_stem} in any of the formats {list(ARTIFACT_FORMATS)}")
+    
+    if path.endswith('.parquet'):
+        metadata = pq.read_schema(path).metadata or {}
+        return gpd.read_parquet(path) if b'geo' in metadata else pd.read_parquet(path)
+    if path.endswith('.geojson'):
+        return gpd.read_file(path)
+    
+    df = pd.read_csv(path)
+    if 'geometry' in df.columns:
+        return gpd.GeoDataFrame(df, geometry=gpd.GeoSeries.from_wkt(df['geometry']), crs=CSV_CRS)
+    
+    return df
+
+# Barrier at exit, so no queued artifact is lost
+atexit.register(flush)
+
+# Worker processes forked by process pools start with an empty writer
+os.register_at_fork(after_in_child=lambda: _writer._reset_after_fork())
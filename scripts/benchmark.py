@@ -0,0 +1,373 @@
+"""
+Benchmark suite for NYC flood-related 311 complaints analysis.
+
+Drives the pipeline entry points (filtering, spatial join, aggregation, static
+and interactive maps, regression models) over synthetic datasets of a range of
+complaint and tract counts, records their wall time and peak memory to a
+results file, and compares them against a stored baseline. A case slower or
+bigger than its baseline by more than the threshold is flagged as a
+regression and the script exits with status 1, so it can gate commits.
+
+Everything runs in a scratch directory: the modules' relative data, figure and
+result paths resolve under it, so benchmarks never touch the real outputs.
+Quick mode (one small dataset) is meant to run on every commit.
+
+Peak memory is measured with tracemalloc in a separate, untimed run. It
+covers Python objects and the NumPy buffers behind pandas columns, but not
+memory allocated by GEOS or Arrow.
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import artifact_writer
+import data_processing
+import interactive_map
+import schema
+import socioeconomic_analysis
+import tract_index
+import visualization
+
+# Constants
+RESULTS_DIR = "../results"
+BENCHMARK_DIR = os.path.join(RESULTS_DIR, "benchmarks")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+BENCHMARK_PERIOD = 'benchmark'
+
+# Synthetic dataset sizes: every complaint count is run against every tract count
+FULL_COMPLAINTS = [10000, 100000, 1000000, 10000000]
+FULL_TRACTS = [300, 5000]
+QUICK_COMPLAINTS = [10000]
+QUICK_TRACTS = [300]
+
+# Relative slowdown (or memory growth) beyond which a case is flagged
+DEFAULT_THRESHOLD = 0.25
+
+# Differences below these are timer and allocator noise, never regressions
+MIN_WALL_DELTA = 0.01
+MIN_MEMORY_DELTA_MB = 1.0
+
+# Benchmarked entry points: (input of the dataset, function running the entry point on the dataset)
+CASES = {
+    'filter_flood_complaints': ('complaints', lambda data: data_processing.filter_flood_complaints(
+        data['complaints'], period=BENCHMARK_PERIOD
+    )),
+    'spatial_join_with_census': ('flood', lambda data: data_processing.spatial_join_with_census(
+        data['flood'], data['census'], period=BENCHMARK_PERIOD
+    )),
+    'aggregate_by_census_tract': ('joined', lambda data: data_processing.aggregate_by_census_tract(
+        data['joined'], data['census'], period=BENCHMARK_PERIOD
+    )),
+    'create_simplified_pixel_map': ('aggregated', lambda data: visualization.create_simplified_pixel_map(
+        data['aggregated'], 'complaint_rate', 'Benchmark Pixel Map', 'benchmark_pixel.png', resolution=100
+    )),
+    'create_heatmap': ('flood', lambda data: visualization.create_heatmap(
+        data['flood'], 'Benchmark Heatmap', 'benchmark_heatmap.png'
+    )),
+    'create_interactive_choropleth': ('aggregated', lambda data: interactive_map.create_interactive_choropleth(
+        data['aggregated'], 'complaint_rate', 'Benchmark Choropleth', 'benchmark_choropleth.html'
+    )),
+    'create_interactive_heatmap': ('flood', lambda data: interactive_map.create_interactive_heatmap(
+        data['flood'], 'Benchmark Heatmap', 'benchmark_heatmap.html'
+    )),
+    'create_interactive_complaint_map': ('flood', lambda data: interactive_map.create_interactive_complaint_map(
+        data['flood'], 'Benchmark Complaints', 'benchmark_markers.html'
+    )),
+    'create_bivariate_interactive_map': ('aggregated', lambda data: interactive_map.create_bivariate_interactive_map(
+        data['aggregated'], 'complaint_rate', 'median_income', 'Complaint Rate', 'Median Income',
+        'Benchmark Bivariate Map', 'benchmark_bivariate.html'
+    )),
+    'run_regression_models': ('aggregated', lambda data: socioeconomic_analysis.run_regression_models(
+        data['aggregated']
+    ))
+}
+
+@contextlib.contextmanager
+def scratch_dir():
+    """
+    Run in a temporary copy of the repository layout.
+    
+    The modules resolve their paths (../data, ../figures, ../results) from
+    the working directory, so the block runs in <scratch>/scripts.
+    
+    Yields:
+        str: The scratch directory
+    """
+    root = tempfile.mkdtemp(prefix='flood311_benchmark_')
+    cwd = os.getcwd()
+    try:
+        for directory in ['scripts', 'data/raw', 'data/processed', 'figures', 'results']:
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+        os.chdir(os.path.join(root, 'scripts'))
+        yield root
+    finally:
+        # Queued artifacts must be written before their directory is removed
+        artifact_writer.flush()
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+def prepare_dataset(n_complaints, n_tracts, seed=42):
+    """
+    Generate a synthetic dataset and the inputs of every benchmarked entry point.
+    
+    The tracts are written to the tract cache of the scratch directory, as
+    download_census_tracts does, and each stage's input is produced by the
+    stages before it.
+    
+    Args:
+        n_complaints (int): Number of raw 311 complaints
+        n_tracts (int): Number of census tracts
+        seed (int): Random seed
+    
+    Returns:
+        dict: Raw complaints, census tracts, flood complaints, joined complaints and aggregated tracts
+    """
+    census_gdf = data_processing.create_sample_census_data(n_tracts=n_tracts, seed=seed)
+    census_gdf['tract_code'] = np.arange(len(census_gdf), dtype=np.int32)
+    census_gdf = schema.enforce_schema(census_gdf, stage='census tracts')
+    tract_index.write_tract_cache(census_gdf)
+    
+    complaints_df = data_processing.create_sample_311_data(
+        n_complaints=n_complaints, seed=seed, n_workers=os.cpu_count() or 1
+    )
+    complaints_df = schema.enforce_schema(data_processing.apply_311_schema(complaints_df), stage='raw 311 records')
+    
+    data = {'complaints': complaints_df, 'census': census_gdf}
+    data['flood'] = data_processing.filter_flood_complaints(complaints_df, period=BENCHMARK_PERIOD)
+    data['joined'] = data_processing.spatial_join_with_census(data['flood'], census_gdf, period=BENCHMARK_PERIOD)
+    data['aggregated'] = data_processing.aggregate_by_census_tract(data['joined'], census_gdf, period=BENCHMARK_PERIOD)
+    artifact_writer.flush()
+    
+    return data
+
+def _run_case(func, data):
+    """Run an entry point, including the artifacts it queued, with its progress messages and warnings silenced."""
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        func(data)
+        artifact_writer.flush()
+
+def measure_case(func, data, repeat=3):
+    """
+    Measure the wall time and peak memory of an entry point.
+    
+    Args:
+        func (callable): Function running the entry point on the dataset
+        data (dict): Dataset from prepare_dataset
+        repeat (int): Number of timed runs
+    
+    Returns:
+        dict: Fastest and median wall time in seconds and peak traced memory in MB
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        _run_case(func, data)
+        times.append(time.perf_counter() - start)
+    
+    # tracemalloc slows allocations down, so memory is measured in a separate run
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _run_case(func, data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    return {
+        'wall_s': round(min(times), 6),
+        'wall_median_s': round(float(np.median(times)), 6),
+        'peak_mb': round(peak / 1024 ** 2, 3)
+    }
+
+def run_benchmarks(complaint_sizes, tract_sizes, cases=None, repeat=3, seed=42):
+    """
+    Benchmark the entry points on every combination of dataset sizes.
+    
+    Args:
+        complaint_sizes (list): Numbers of raw complaints
+        tract_sizes (list): Numbers of census tracts
+        cases (list): Names of the cases to run (None for every case in CASES)
+        repeat (int): Number of timed runs per case
+        seed (int): Random seed of the synthetic data
+    
+    Returns:
+        pd.DataFrame: One row per case and dataset size
+    """
+    cases = list(CASES) if cases is None else cases
+    rows = []
+    with scratch_dir():
+        for n_complaints in complaint_sizes:
+            for n_tracts in tract_sizes:
+                print(f"Generating {n_complaints} complaints over {n_tracts} tracts...")
+                with contextlib.redirect_stdout(io.StringIO()):
+                    data = prepare_dataset(n_complaints, n_tracts, seed=seed)
+                
+                for case in cases:
+                    input_name, func = CASES[case]
+                    row = {'case': case, 'n_complaints': n_complaints, 'n_tracts': n_tracts,
+                           'rows_in': len(data[input_name])}
+                    try:
+                        result = measure_case(func, data, repeat=repeat)
+                    except Exception as e:
+                        # A failing entry point is reported without stopping the other cases
+                        print(f"  {case}: failed: {type(e).__name__}: {e}")
+                        rows.append({**row, 'error': f"{type(e).__name__}: {e}"})
+                        continue
+                    rows.append({**row, **result})
+                    print(f"  {case}: {result['wall_s']:.3f} s, {result['peak_mb']:.1f} MB peak")
+                
+                del data
+                gc.collect()
+    
+    return pd.DataFrame(rows)
+
+def save_results(results_df, path, quick=False, repeat=3):
+    """
+    Save benchmark results with the environment they were measured in.
+    
+    Args:
+        results_df (pd.DataFrame): Results from run_benchmarks
+        path (str): JSON output file
+        quick (bool): Whether the results come from quick mode
+        repeat (int): Number of timed runs per case
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'quick': quick,
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results_df.to_dict(orient='records')
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+def load_results(path):
+    """
+    Load benchmark results saved by save_results.
+    
+    Args:
+        path (str): JSON results file
+    
+    Returns:
+        pd.DataFrame: One row per case and dataset size
+    """
+    with open(path) as f:
+        return pd.DataFrame(json.load(f)['results'])
+
+def compare_to_baseline(results_df, baseline_df, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare benchmark results against a baseline.
+    
+    Cases are matched on their name and dataset size; cases missing from
+    either side are not compared. A metric regresses when it grew by more
+    than the threshold and by more than the noise floor (MIN_WALL_DELTA,
+    MIN_MEMORY_DELTA_MB).
+    
+    Args:
+        results_df (pd.DataFrame): Current results
+        baseline_df (pd.DataFrame): Baseline results
+        threshold (float): Allowed relative growth, e.g. 0.25 for 25%
+    
+    Returns:
+        pd.DataFrame: One row per compared case and metric, with the ratio and a regression flag
+    """
+    keys = ['case', 'n_complaints', 'n_tracts']
+    merged = results_df.merge(baseline_df, on=keys, suffixes=('', '_baseline'))
+    
+    comparisons = []
+    for metric, min_delta in [('wall_s', MIN_WALL_DELTA), ('peak_mb', MIN_MEMORY_DELTA_MB)]:
+        current, baseline = merged[metric], merged[f'{metric}_baseline']
+        comparison = merged[keys].assign(
+            metric=metric, baseline=baseline, current=current,
+            ratio=(current / baseline.where(baseline > 0)).round(3)
+        )
+        comparison['regression'] = (current > baseline * (1 + threshold)) & (current - baseline > min_delta)
+        comparisons.append(comparison)
+    
+    return pd.concat(comparisons, ignore_index=True)
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Benchmark the NYC flood-related 311 complaints pipeline')
+    
+    parser.add_argument('--quick', action='store_true',
+                        help=f'Run the small dataset only ({QUICK_COMPLAINTS[0]} complaints, {QUICK_TRACTS[0]} tracts)')
+    parser.add_argument('--complaints', type=int, nargs='+', default=None, metavar='N',
+                        help=f'Complaint counts (default: {" ".join(map(str, FULL_COMPLAINTS))})')
+    parser.add_argument('--tracts', type=int, nargs='+', default=None, metavar='N',
+                        help=f'Tract counts (default: {" ".join(map(str, FULL_TRACTS))})')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=None, metavar='CASE',
+                        help='Entry points to benchmark (default: all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timed runs per case; the fastest is kept (default: 3)')
+    parser.add_argument('--output', type=str, default=None,
+                        help=f'Results file (default: {BENCHMARK_DIR}/benchmark_<timestamp>.json)')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE,
+                        help=f'Baseline results to compare against (default: {DEFAULT_BASELINE})')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the results as the new baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Relative growth flagged as a regression (default: {DEFAULT_THRESHOLD})')
+    
+    return parser.parse_args()
+
+def main():
+    """Run the benchmarks, save the results and compare them against the baseline."""
+    args = parse_arguments()
+    complaint_sizes = args.complaints or (QUICK_COMPLAINTS if args.quick else FULL_COMPLAINTS)
+    tract_sizes = args.tracts or (QUICK_TRACTS if args.quick else FULL_TRACTS)
+    
+    # Output paths are resolved before the benchmarks move to their scratch directory
+    output = args.output or os.path.join(BENCHMARK_DIR, f'benchmark_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    output, baseline = os.path.abspath(output), os.path.abspath(args.baseline)
+    
+    results_df = run_benchmarks(complaint_sizes, tract_sizes, cases=args.cases, repeat=args.repeat)
+    save_results(results_df, output, quick=args.quick, repeat=args.repeat)
+    print(f"Saved benchmark results to {output}")
+    
+    if args.save_baseline:
+        save_results(results_df, baseline, quick=args.quick, repeat=args.repeat)
+        print(f"Saved benchmark baseline to {baseline}")
+        return 0
+    
+    if not os.path.exists(baseline):
+        print(f"No baseline at {baseline}; store one with --save-baseline")
+        return 0
+    
+    comparison = compare_to_baseline(results_df, load_results(baseline), threshold=args.threshold)
+    if comparison.empty:
+        print("No case of the baseline was run, nothing to compare")
+        return 0
+    
+    regressions = comparison[comparison['regression']]
+    print(f"Compared {len(comparison)} measurements against {baseline}")
+    if regressions.empty:
+        print(f"No regressions beyond {args.threshold:.0%}")
+        return 0
+    
+    print(f"{len(regressions)} regressions beyond {args.threshold:.0%}:")
+    print(regressions.drop(columns='regression').to_string(index=False))
+    
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Memory-mapped complaint arrays for NYC flood-related 311 complaints analysis.
+
+This module exports the processed complaints once as plain NumPy arrays (one .npy
+file per field) that any process can open with ``np.load(mmap_mode='r')``. Every
+reader maps the same pages of the OS file cache, so parallel renderers share one
+physical copy of the data instead of each receiving a pickled DataFrame.
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import os
+import shutil
+
+# Constants
+DATA_DIR = "../data"
+PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
+MISSING_DAY = np.iinfo(np.int32).min
+
+# Exported fields and their dtypes
+ARRAY_DTYPES = {
+    'lat': np.float32,
+    'lon': np.float32,
+    'day': np.int32,
+    'type_code': np.int16,
+    'status_code': np.int8,
+    'subcategory_code': np.int8,
+    'tract_code': np.int32
+}
+
+def arrays_dir(period=2019):
+    """
+    Get the directory holding the complaint arrays of a period.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        str: Directory of the arrays
+    """
+    return os.path.join(PROCESSED_DATA_DIR, f"complaint_arrays_{period}")
+
+def has_complaint_arrays(period=2019):
+    """
+    Check whether complaint arrays were exported for a period.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        bool: True if the arrays exist
+    """
+    return os.path.exists(os.path.join(arrays_dir(period), "meta.json"))
+
+def export_complaint_arrays(complaints_df, tract_codes, period=2019):
+    """
+    Export complaints as memory-mappable arrays.
+    
+    Days are stored as days since 1970-01-01, and complaint types, statuses and
+    flood sub-categories as codes into the label lists of meta.json (-1 for
+    missing values). The arrays are written to a temporary directory that
+    replaces the previous export in one rename.
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with complaint data
+        tract_codes (np.ndarray): int32 tract_code per complaint (-1 if not in a tract)
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        str: Directory of the arrays
+    """
+    complaint_types = complaints_df['Complaint Type'].astype('category').cat.remove_unused_categories()
+    statuses = complaints_df['Status'].astype('category').cat.remove_unused_categories()
+    if 'flood_subcategory' in complaints_df.columns:
+        subcategories = complaints_df['flood_subcategory'].astype('category')
+    else:
+        subcategories = pd.Series(pd.Categorical([None] * len(complaints_df), categories=[]))
+    created = complaints_df['Created Date']
+    days = created.to_numpy().astype('datetime64[D]').astype(np.int64)
+    
+    arrays = {
+        'lat': complaints_df['Latitude'].to_numpy(),
+        'lon': complaints_df['Longitude'].to_numpy(),
+        'day': np.where(created.notna().to_numpy(), days, MISSING_DAY),
+        'type_code': complaint_types.cat.codes.to_numpy(),
+        'status_code': statuses.cat.codes.to_numpy(),
+        'subcategory_code': subcategories.cat.codes.to_numpy(),
+        'tract_code': tract_codes
+    }
+    meta = {
+        'n_complaints': len(complaints_df),
+        'complaint_types': complaint_types.cat.categories.tolist(),
+        'statuses': statuses.cat.categories.tolist(),
+        'subcategories': subcategories.cat.categories.tolist(),
+        'dtypes': {name: np.dtype(dtype).name for name, dtype in ARRAY_DTYPES.items()}
+    }
+    
+    path = arrays_dir(period)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, dtype in ARRAY_DTYPES.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(arrays[name], dtype=dtype))
+    with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+        json.dump(meta, f, indent=2)
+    
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    print(f"Exported {len(complaints_df)} complaints as memory-mapped arrays to {path}")
+    
+    return path
+
+def open_complaint_arrays(period=2019):
+    """
+    Open the complaint arrays of a period without reading them.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        tuple: (arrays, meta) with a dict of read-only memory-mapped arrays and the label lists
+    """
+    path = arrays_dir(period)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in ARRAY_DTYPES}
+    
+    return arrays, meta
+
+def load_complaint_frame(period=2019):
+    """
+    Open the complaint arrays of a period as a DataFrame.
+    
+    The numeric columns are views of the memory-mapped arrays rather than
+    copies, and complaint types and statuses are categoricals built from
+    the stored codes.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        pd.DataFrame: DataFrame with Latitude, Longitude, Created Date, Complaint Type, Status,
+            flood_subcategory and tract_code columns
+    """
+    arrays, meta = open_complaint_arrays(period)
+    
+    day = arrays['day']
+    created = np.where(day == MISSING_DAY, np.datetime64('NaT'), day.astype('datetime64[D]'))
+    
+    return pd.DataFrame({
+        'Latitude': arrays['lat'],
+        'Longitude': arrays['lon'],
+        'Created Date': created.astype('datetime64[s]'),
+        'Complaint Type': pd.Categorical.from_codes(arrays['type_code'], categories=meta['complaint_types']),
+        'Status': pd.Categorical.from_codes(arrays['status_code'], categories=meta['statuses']),
+        'flood_subcategory': pd.Categorical.from_codes(arrays['subcategory_code'], categories=meta['subcategories']),
+        'tract_code': arrays['tract_code']
+    }, copy=False)
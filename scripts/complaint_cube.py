@@ -0,0 +1,305 @@
+"""
+Complaint count cube for NYC flood-related 311 complaints analysis.
+
+This module counts the processed complaints once per tract × day × complaint
+type × flood sub-category × status cell, in a single bincount pass over the
+memory-mapped complaint arrays. Charts and statistics then roll the cube up
+to the dimensions they need instead of regrouping complaint-level rows.
+Small cubes are stored dense; larger ones keep only their non-empty cells.
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import os
+import shutil
+
+import complaint_arrays
+
+# Constants
+DATA_DIR = "../data"
+PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
+DIMENSIONS = ['tract', 'day', 'type', 'subcategory', 'status']
+
+# Cubes with more cells than this are stored sparse
+DENSE_MAX_CELLS = 1 << 24
+
+def cube_dir(period=2019):
+    """
+    Get the directory holding the complaint cube of a period.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        str: Directory of the cube
+    """
+    return os.path.join(PROCESSED_DATA_DIR, f"complaint_cube_{period}")
+
+def has_complaint_cube(period=2019):
+    """
+    Check whether a complaint cube was built for a period.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        bool: True if the cube exists
+    """
+    return os.path.exists(os.path.join(cube_dir(period), "meta.json"))
+
+class ComplaintCube:
+    """
+    Complaint counts over tract × day × type × sub-category × status.
+    
+    Every axis but day has one extra last position for complaints outside
+    every tract, or without a type, sub-category or status. Days are offsets
+    from ``first_day``.
+    
+    Args:
+        shape (tuple): Size of each dimension, in DIMENSIONS order
+        labels (dict): Labels of the type, subcategory and status positions (without the extra one)
+        first_day (str): Date of day 0 (ISO format)
+        counts (np.ndarray): Dense int32 counts of the given shape (None if sparse)
+        cells (np.ndarray): Sorted int64 flat indices of the non-empty cells (None if dense)
+        values (np.ndarray): int32 counts of the non-empty cells (None if dense)
+    """
+    
+    def __init__(self, shape, labels, first_day, counts=None, cells=None, values=None):
+        self.shape = tuple(int(size) for size in shape)
+        self.labels = labels
+        self.first_day = pd.Timestamp(first_day)
+        self.counts = counts
+        self.cells = cells
+        self.values = values
+    
+    @property
+    def is_dense(self):
+        """bool: Whether the counts are stored dense."""
+        return self.counts is not None
+    
+    @property
+    def total(self):
+        """int: Number of complaints in the cube."""
+        return int(self.counts.sum() if self.is_dense else self.values.sum())
+    
+    def index(self, dim):
+        """
+        Get the labels of the positions along a dimension.
+        
+        Args:
+            dim (str): Dimension name
+        
+        Returns:
+            pd.Index: Dates for day, tract codes (-1 for outside every tract) for tract,
+                labels (a missing value for the extra position) otherwise
+        """
+        if dim == 'day':
+            return pd.date_range(self.first_day, periods=self.shape[1], freq='D', name=dim)
+        if dim == 'tract':
+            return pd.Index(np.r_[np.arange(self.shape[0] - 1), -1], name=dim)
+        
+        return pd.Index(list(self.labels[dim]) + [None], name=dim)
+    
+    def _positions(self, dim, selection):
+        """Positions along a dimension selected by labels, dates or positions."""
+        size = self.shape[DIMENSIONS.index(dim)]
+        selection = np.atleast_1d(selection)
+        if dim == 'day':
+            positions = (pd.DatetimeIndex(selection).normalize() - self.first_day).days.to_numpy()
+        elif dim != 'tract':
+            lookup = {label: i for i, label in enumerate(self.labels[dim])}
+            positions = np.array([lookup[label] for label in selection if label in lookup], dtype=np.int64)
+        else:
+            positions = selection.astype(np.int64) % size
+        
+        return positions[(positions >= 0) & (positions < size)]
+    
+    def rollup(self, *dims, **selections):
+        """
+        Sum the cube over every dimension not kept.
+        
+        Args:
+            *dims (str): Dimensions to keep, in the order of the result
+            **selections: Dates (day), tract codes (tract) or labels (type, subcategory,
+                status) to restrict a dimension to, e.g. status=['Open', 'Pending']
+        
+        Returns:
+            np.ndarray: int64 counts over the kept dimensions (a 0-d array if none are kept)
+        """
+        keep = [DIMENSIONS.index(dim) for dim in dims]
+        kept_shape = [self.shape[axis] for axis in keep]
+        masks = {}
+        for dim, selection in selections.items():
+            axis = DIMENSIONS.index(dim)
+            masks[axis] = np.zeros(self.shape[axis], dtype=bool)
+            masks[axis][self._positions(dim, selection)] = True
+        
+        if self.is_dense:
+            # Restrict the summed axes, sum them away, then zero the unselected kept positions
+            counts = self.counts
+            for axis, mask in masks.items():
+                if axis not in keep:
+                    counts = np.compress(mask, counts, axis=axis)
+            summed = tuple(axis for axis in range(len(DIMENSIONS)) if axis not in keep)
+            rolled = counts.sum(axis=summed, dtype=np.int64).transpose(np.argsort(np.argsort(keep)))
+            for i, axis in enumerate(keep):
+                if axis in masks:
+                    rolled = rolled * masks[axis].reshape([-1 if j == i else 1 for j in range(len(keep))])
+            
+            return rolled
+        
+        coords = np.unravel_index(self.cells, self.shape)
+        selected = np.ones(len(self.cells), dtype=bool)
+        for axis, mask in masks.items():
+            selected &= mask[coords[axis]]
+        
+        flat = np.ravel_multi_index([coords[axis][selected] for axis in keep], kept_shape) if keep else 0
+        rolled = np.bincount(
+            np.broadcast_to(flat, selected.sum()), weights=self.values[selected], minlength=int(np.prod(kept_shape))
+        )
+        
+        return rolled.astype(np.int64).reshape(kept_shape)
+    
+    def series(self, dim, **selections):
+        """
+        Roll the cube up to one dimension, with its labels.
+        
+        Args:
+            dim (str): Dimension to keep
+            **selections: Restrictions of other dimensions (see rollup)
+        
+        Returns:
+            pd.Series: Complaint counts indexed by the labels of the dimension
+        """
+        return pd.Series(self.rollup(dim, **selections), index=self.index(dim), name='complaints')
+    
+    def slice(self, **selections):
+        """
+        Restrict the cube to selected positions, keeping every dimension.
+        
+        Args:
+            **selections: Restrictions of dimensions (see rollup)
+        
+        Returns:
+            ComplaintCube: Cube with the unselected cells set to zero
+        """
+        if self.is_dense:
+            return ComplaintCube(
+                self.shape, self.labels, self.first_day, counts=self.rollup(*DIMENSIONS, **selections).astype(np.int32)
+            )
+        
+        coords = np.unravel_index(self.cells, self.shape)
+        selected = np.ones(len(self.cells), dtype=bool)
+        for dim, selection in selections.items():
+            axis = DIMENSIONS.index(dim)
+            selected &= np.isin(coords[axis], self._positions(dim, selection))
+        
+        return ComplaintCube(
+            self.shape, self.labels, self.first_day, cells=self.cells[selected], values=self.values[selected]
+        )
+
+def build_complaint_cube(arrays, meta, n_tracts):
+    """
+    Count complaints per cube cell in one pass.
+    
+    Complaints without a Created Date are left out.
+    
+    Args:
+        arrays (dict): Complaint arrays (see complaint_arrays.open_complaint_arrays)
+        meta (dict): Label lists of the complaint arrays
+        n_tracts (int): Number of census tracts
+    
+    Returns:
+        ComplaintCube: The complaint cube
+    """
+    day = arrays['day']
+    has_day = day != complaint_arrays.MISSING_DAY
+    first_day = int(day[has_day].min()) if has_day.any() else 0
+    n_days = int(day[has_day].max()) - first_day + 1 if has_day.any() else 1
+    
+    labels = {'type': meta['complaint_types'], 'subcategory': meta['subcategories'], 'status': meta['statuses']}
+    shape = (n_tracts + 1, n_days, len(labels['type']) + 1, len(labels['subcategory']) + 1, len(labels['status']) + 1)
+    
+    # Missing codes (-1) wrap to the extra last position of their axis
+    coords = [
+        arrays['tract_code'][has_day],
+        day[has_day] - first_day,
+        arrays['type_code'][has_day],
+        arrays['subcategory_code'][has_day],
+        arrays['status_code'][has_day]
+    ]
+    flat = np.ravel_multi_index([np.asarray(c, dtype=np.int64) % size for c, size in zip(coords, shape)], shape)
+    first_date = str(np.datetime64(first_day, 'D'))
+    
+    if np.prod(shape) <= DENSE_MAX_CELLS:
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).astype(np.int32).reshape(shape)
+        return ComplaintCube(shape, labels, first_date, counts=counts)
+    
+    cells, values = np.unique(flat, return_counts=True)
+    
+    return ComplaintCube(shape, labels, first_date, cells=cells, values=values.astype(np.int32))
+
+def export_complaint_cube(n_tracts, period=2019):
+    """
+    Build the complaint cube of a period from its complaint arrays and save it.
+    
+    Args:
+        n_tracts (int): Number of census tracts
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        ComplaintCube: The complaint cube
+    """
+    arrays, meta = complaint_arrays.open_complaint_arrays(period)
+    cube = build_complaint_cube(arrays, meta, n_tracts)
+    
+    path = cube_dir(period)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    if cube.is_dense:
+        np.save(os.path.join(tmp_path, "counts.npy"), cube.counts)
+    else:
+        np.save(os.path.join(tmp_path, "cells.npy"), cube.cells)
+        np.save(os.path.join(tmp_path, "values.npy"), cube.values)
+    cube_meta = {
+        'dimensions': DIMENSIONS,
+        'shape': list(cube.shape),
+        'first_day': cube.first_day.strftime('%Y-%m-%d'),
+        'labels': cube.labels,
+        'dense': cube.is_dense
+    }
+    with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+        json.dump(cube_meta, f, indent=2)
+    
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    storage = "dense" if cube.is_dense else f"sparse, {len(cube.cells)} non-empty cells"
+    print(f"Built {' x '.join(map(str, cube.shape))} complaint cube ({storage}) in {path}")
+    
+    return cube
+
+def load_complaint_cube(period=2019):
+    """
+    Load the complaint cube of a period.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        ComplaintCube: The complaint cube, with memory-mapped counts
+    """
+    path = cube_dir(period)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    
+    if meta['dense']:
+        storage = {'counts': np.load(os.path.join(path, "counts.npy"), mmap_mode='r')}
+    else:
+        storage = {
+            'cells': np.load(os.path.join(path, "cells.npy"), mmap_mode='r'),
+            'values': np.load(os.path.join(path, "values.npy"), mmap_mode='r')
+        }
+    
+    return ComplaintCube(meta['shape'], meta['labels'], meta['first_day'], **storage)
@@ -0,0 +1,499 @@
+"""
+Partitioned dataset store for NYC 311 complaints.
+
+This module keeps raw 311 records in a Parquet dataset partitioned by year, month
+and borough (``year=2019/month=07/borough=BROOKLYN/part-00000.parquet``), so that a
+run for one year or date range only reads the partitions it needs. The years
+whose import completed are recorded in an imports manifest at its root.
+"""
+
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import json
+import os
+import shutil
+from urllib.parse import quote, unquote
+
+# Constants
+DATA_DIR = "../data"
+STORE_DIR = os.path.join(DATA_DIR, "raw", "nyc_311_store")
+UNSPECIFIED_BOROUGH = 'Unspecified'
+IMPORTS_MANIFEST = "imports.json"
+
+def partition_dir(year, month, borough, root=STORE_DIR):
+    """
+    Get the directory of a single partition.
+    
+    Args:
+        year (int): Year of the partition
+        month (int): Month of the partition
+        borough (str): Borough of the partition
+        root (str): Root directory of the store
+    
+    Returns:
+        str: Partition directory
+    """
+    return os.path.join(
+        root, f"year={int(year)}", f"month={int(month):02d}", f"borough={quote(str(borough), safe='')}"
+    )
+
+def _parse_partition_value(dirname):
+    """Split a ``key=value`` directory name into its value."""
+    return dirname.split('=', 1)[1] if '=' in dirname else None
+
+def list_partitions(root=STORE_DIR):
+    """
+    List all partitions in the store.
+    
+    Partitions left behind by an interrupted replace are recovered first (see
+    _recover_partition).
+    
+    Args:
+        root (str): Root directory of the store
+    
+    Returns:
+        pd.DataFrame: DataFrame with year, month, borough and path columns
+    """
+    rows = []
+    if os.path.isdir(root):
+        for year_entry in sorted(os.scandir(root), key=lambda e: e.name):
+            if not (year_entry.is_dir() and year_entry.name.startswith('year=')):
+                continue
+            for month_entry in sorted(os.scandir(year_entry.path), key=lambda e: e.name):
+                if not (month_entry.is_dir() and month_entry.name.startswith('month=')):
+                    continue
+                for entry in os.scandir(month_entry.path):
+                    if entry.name.startswith(('.old-', '.tmp-')):
+                        _recover_partition(os.path.join(month_entry.path, entry.name.split('-', 1)[1]))
+                for borough_entry in sorted(os.scandir(month_entry.path), key=lambda e: e.name):
+                    if not (borough_entry.is_dir() and borough_entry.name.startswith('borough=')):
+                        continue
+                    rows.append({
+                        'year': int(_parse_partition_value(year_entry.name)),
+                        'month': int(_parse_partition_value(month_entry.name)),
+                        'borough': unquote(_parse_partition_value(borough_entry.name)),
+                        'path': borough_entry.path
+                    })
+    
+    return pd.DataFrame(rows, columns=['year', 'month', 'borough', 'path'])
+
+def prune_partitions(root=STORE_DIR, years=None, start_date=None, end_date=None, boroughs=None):
+    """
+    Select the partitions that can contain records matching the given filters.
+    
+    Pruning only looks at partition keys, never at file contents.
+    
+    Args:
+        root (str): Root directory of the store
+        years (list): Years to keep (None for all)
+        start_date (str or pd.Timestamp): Earliest Created Date to keep (None for no bound)
+        end_date (str or pd.Timestamp): Latest Created Date to keep (None for no bound)
+        boroughs (list): Boroughs to keep, case-insensitive (None for all)
+    
+    Returns:
+        pd.DataFrame: Matching partitions with year, month, borough and path columns
+    """
+    partitions = list_partitions(root)
+    mask = pd.Series(True, index=partitions.index)
+    
+    # Compare (year, month) pairs as a single month ordinal
+    month_ordinal = partitions['year'] * 12 + partitions['month']
+    
+    if years is not None:
+        mask &= partitions['year'].isin([int(year) for year in years])
+    if start_date is not None:
+        start = pd.Timestamp(start_date)
+        mask &= month_ordinal >= start.year * 12 + start.month
+    if end_date is not None:
+        end = pd.Timestamp(end_date)
+        mask &= month_ordinal <= end.year * 12 + end.month
+    if boroughs is not None:
+        mask &= partitions['borough'].str.upper().isin([str(b).upper() for b in boroughs])
+    
+    return partitions[mask].reset_index(drop=True)
+
+def partition_files(partitions):
+    """
+    List the Parquet files of the given partitions.
+    
+    Args:
+        partitions (pd.DataFrame): Partitions as returned by prune_partitions
+    
+    Returns:
+        list: Paths of the Parquet files, in partition order
+    """
+    files = []
+    for path in partitions['path']:
+        files.extend(
+            os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.parquet')
+        )
+    
+    return files
+
+def _plain_table(complaints_df):
+    """
+    Convert records to an Arrow table with categoricals stored as plain strings.
+    
+    Parquet dictionary-encodes strings on disk anyway; storing every partition
+    file with the same plain types keeps files written from categorical and
+    string data compatible. Readers restore categoricals with read_dictionary.
+    """
+    table = pa.Table.from_pandas(complaints_df, preserve_index=False)
+    fields = [
+        pa.field(field.name, field.type.value_type) if pa.types.is_dictionary(field.type) else field
+        for field in table.schema
+    ]
+    
+    return table.cast(pa.schema(fields))
+
+def write_partitions(complaints_df, root=STORE_DIR, mode='overwrite'):
+    """
+    Write 311 records to the store, partitioned by year, month and borough.
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with 311 complaint data (Created Date as datetime64)
+        root (str): Root directory of the store
+        mode (str): 'overwrite' replaces the partitions being written, 'append' adds a new file to them
+    
+    Returns:
+        list: Directories of the partitions that were written
+    """
+    if mode not in ('overwrite', 'append'):
+        raise ValueError(f"Unknown write mode: {mode}")
+    
+    created = complaints_df['Created Date']
+    valid = created.notna()
+    if not valid.all():
+        print(f"Skipping {(~valid).sum()} records without a valid Created Date")
+    
+    complaints_df = complaints_df[valid]
+    boroughs = complaints_df['Borough'].astype(str).where(complaints_df['Borough'].notna(), UNSPECIFIED_BOROUGH)
+    keys = [created[valid].dt.year.rename('year'), created[valid].dt.month.rename('month'), boroughs.rename('borough')]
+    
+    written = []
+    for (year, month, borough), group in complaints_df.groupby(keys, sort=True, observed=True):
+        path = partition_dir(year, month, borough, root=root)
+        if mode == 'overwrite' and os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+        
+        part_number = sum(1 for name in os.listdir(path) if name.endswith('.parquet'))
+        pq.write_table(_plain_table(group), os.path.join(path, f"part-{part_number:05d}.parquet"))
+        written.append(path)
+    
+    return written
+
+def _read_partition(path):
+    """Read all files of a partition into one DataFrame (None if it has no files)."""
+    files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.parquet')]
+    if not files:
+        return None
+    
+    return pa.concat_tables([pq.read_table(f) for f in files], promote_options='permissive').to_pandas()
+
+def month_ordinals(created_dates):
+    """
+    Number the partition months of records as year * 12 + month.
+    
+    Args:
+        created_dates (pd.Series): datetime64 Created Date per record
+    
+    Returns:
+        np.ndarray: int32 month per record (-1 where the date is missing)
+    """
+    months = created_dates.dt.year * 12 + created_dates.dt.month
+    
+    return months.fillna(-1).to_numpy(dtype=np.int32)
+
+def _partitions_holding(keys, root=STORE_DIR, key='Unique Key', months=None):
+    """
+    Find the partitions holding records with the given keys.
+    
+    Only the partitions of the given months are searched. Files whose key
+    statistics cannot contain any of the keys are skipped without reading
+    them; the key column of the others is read.
+    """
+    keys = np.unique(np.asarray(keys, dtype=np.int64))
+    partitions = list_partitions(root)
+    if months is not None:
+        partitions = partitions[(partitions['year'] * 12 + partitions['month']).isin(months)]
+    holding = []
+    for path in partitions['path']:
+        for name in sorted(os.listdir(path)):
+            if not name.endswith('.parquet'):
+                continue
+            file_path = os.path.join(path, name)
+            metadata = pq.ParquetFile(file_path).metadata
+            column = metadata.schema.names.index(key)
+            candidate = False
+            for i in range(metadata.num_row_groups):
+                stats = metadata.row_group(i).column(column).statistics
+                if stats is None or not stats.has_min_max or \
+                        np.searchsorted(keys, stats.min) < np.searchsorted(keys, stats.max, side='right'):
+                    candidate = True
+                    break
+            if candidate and np.isin(pq.read_table(file_path, columns=[key])[key].to_numpy(), keys).any():
+                holding.append(path)
+                break
+    
+    return holding
+
+def _recover_partition(path):
+    """
+    Recover a partition from an interrupted _replace_partition.
+    
+    If the replace stopped between its two renames, the stored records only
+    exist in the .old- directory, which is moved back. Otherwise the .old-
+    directory is a copy that was already replaced and is removed, as is any
+    partially written .tmp- directory.
+    """
+    parent, name = os.path.split(path)
+    old_path = os.path.join(parent, f".old-{name}")
+    if os.path.isdir(old_path):
+        if os.path.isdir(path):
+            shutil.rmtree(old_path)
+        else:
+            print(f"Restoring partition {path} from an interrupted write")
+            os.replace(old_path, path)
+    shutil.rmtree(os.path.join(parent, f".tmp-{name}"), ignore_errors=True)
+
+def _replace_partition(path, complaints_df):
+    """
+    Replace the files of a partition with one file of the given records.
+    
+    The new file is written to a temporary directory next to the partition,
+    which then replaces the partition in two renames. If the write is
+    interrupted between them, the records already stored are in a .old-
+    directory that the next listing or replace of the partition moves back.
+    An empty DataFrame removes the partition.
+    """
+    parent, name = os.path.split(path)
+    tmp_path = os.path.join(parent, f".tmp-{name}")
+    old_path = os.path.join(parent, f".old-{name}")
+    _recover_partition(path)
+    
+    if not complaints_df.empty:
+        os.makedirs(tmp_path)
+        pq.write_table(_plain_table(complaints_df), os.path.join(tmp_path, "part-00000.parquet"))
+    if os.path.isdir(path):
+        os.replace(path, old_path)
+    if not complaints_df.empty:
+        os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def upsert_partitions(complaints_df, root=STORE_DIR, key='Unique Key', previous_months=None):
+    """
+    Insert or replace 311 records in the store, rewriting only the touched partitions.
+    
+    The touched partitions are those the records belong to and those holding
+    an earlier version of a record, which may differ when its Created Date or
+    Borough changed. Each is read, stripped of the records whose key appears
+    in ``complaints_df``, merged with the new records it receives and written
+    back as a single compacted file. Earlier versions are only searched in
+    previous_months when given, e.g. from the incremental key index; without
+    them every partition is searched.
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with 311 complaint data (Created Date as datetime64)
+        root (str): Root directory of the store
+        key (str): Column identifying a record
+        previous_months (iterable): Months (see month_ordinals) of the partitions holding earlier
+            versions of the records (None to search the whole store)
+    
+    Returns:
+        list: Directories of the partitions that were written
+    """
+    created = complaints_df['Created Date']
+    boroughs = complaints_df['Borough'].astype(str).where(complaints_df['Borough'].notna(), UNSPECIFIED_BOROUGH)
+    keys = [created.dt.year.rename('year'), created.dt.month.rename('month'), boroughs.rename('borough')]
+    
+    groups = {
+        partition_dir(year, month, borough, root=root): group
+        for (year, month, borough), group in complaints_df[created.notna()].groupby(keys, sort=True, observed=True)
+    }
+    holding = _partitions_holding(complaints_df[key], root, key, months=previous_months)
+    touched = list(groups) + [path for path in holding if path not in groups]
+    
+    written = []
+    for path in touched:
+        parts = []
+        _recover_partition(path)
+        if os.path.isdir(path):
+            existing = _read_partition(path)
+            if existing is not None:
+                parts.append(existing[~existing[key].isin(complaints_df[key])])
+        if path in groups:
+            parts.append(groups[path])
+        merged = pd.concat(parts, ignore_index=True) if parts else complaints_df.iloc[:0]
+        
+        _replace_partition(path, merged)
+        written.append(path)
+    
+    return written
+
+def _load_imports_manifest(root=STORE_DIR):
+    """Read the imports manifest, creating it from the stored years for a store written without one."""
+    path = os.path.join(root, IMPORTS_MANIFEST)
+    if not os.path.exists(path):
+        manifest = {'years': sorted(set(int(year) for year in list_partitions(root)['year'])), 'samples': {}}
+        _save_imports_manifest(manifest, root)
+        return manifest
+    
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest.setdefault('samples', {})
+    
+    return manifest
+
+def _save_imports_manifest(manifest, root=STORE_DIR):
+    """Write the imports manifest in one rename."""
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, IMPORTS_MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def load_imported_years(root=STORE_DIR, sample_size=None):
+    """
+    List the years whose import into the store completed.
+    
+    Completed imports are recorded in the imports manifest at the root of the
+    store, so a year whose import was interrupted is imported again. Sample
+    imports (the first records of a year only) are recorded apart, so they do
+    not count as full imports. A store written before the manifest existed
+    counts the years it has partitions of as imported, and gets a manifest
+    recording them.
+    
+    Args:
+        root (str): Root directory of the store
+        sample_size (int): List the years imported as a sample of this size instead of in full
+    
+    Returns:
+        set: Imported years
+    """
+    manifest = _load_imports_manifest(root)
+    if sample_size is None:
+        return set(manifest['years'])
+    
+    return set(int(year) for year, size in manifest['samples'].items() if size == sample_size)
+
+def mark_year_imported(year, root=STORE_DIR, sample_size=None):
+    """
+    Record in the imports manifest that the import of a year completed.
+    
+    Args:
+        year (int): Imported year
+        root (str): Root directory of the store
+        sample_size (int): Number of records of a sample import (None for a full import)
+    """
+    manifest = _load_imports_manifest(root)
+    year = int(year)
+    years = set(manifest['years']) - {year}
+    manifest['samples'].pop(str(year), None)
+    if sample_size is None:
+        years.add(year)
+    else:
+        manifest['samples'][str(year)] = int(sample_size)
+    manifest['years'] = sorted(years)
+    _save_imports_manifest(manifest, root)
+
+def delete_partitions(partitions):
+    """
+    Delete the given partitions from the store.
+    
+    Args:
+        partitions (pd.DataFrame): Partitions as returned by prune_partitions
+    """
+    for path in partitions['path']:
+        shutil.rmtree(path, ignore_errors=True)
+
+def read_partitions(root=STORE_DIR, years=None, start_date=None, end_date=None, boroughs=None,
+                    columns=None, read_dictionary=None):
+    """
+    Read 311 records from the partitions matching the given filters.
+    
+    Partitions are pruned by key first; records of boundary months are then
+    filtered to the exact date range.
+    
+    Args:
+        root (str): Root directory of the store
+        years (list): Years to read (None for all)
+        start_date (str or pd.Timestamp): Earliest Created Date to read (None for no bound)
+        end_date (str or pd.Timestamp): Latest Created Date to read (None for no bound)
+        boroughs (list): Boroughs to read, case-insensitive (None for all)
+        columns (list): Columns to read (None for all); missing columns are ignored
+        read_dictionary (list): Columns to decode as categoricals
+    
+    Returns:
+        pd.DataFrame: Matching 311 records
+    """
+    partitions = prune_partitions(root, years=years, start_date=start_date, end_date=end_date, boroughs=boroughs)
+    files = partition_files(partitions)
+    print(f"Reading {len(partitions)} partitions ({len(files)} files) from {root}")
+    
+    if not files:
+        return pd.DataFrame(columns=columns)
+    
+    # The date filter needs Created Date even when it is not projected
+    read_columns = columns
+    filter_dates = start_date is not None or end_date is not None
+    if columns is not None:
+        available = pq.read_schema(files[0]).names
+        read_columns = [col for col in columns if col in available]
+        if filter_dates and 'Created Date' not in read_columns:
+            read_columns = read_columns + ['Created Date']
+    if read_dictionary is not None:
+        read_dictionary = [col for col in read_dictionary if read_columns is None or col in read_columns]
+    
+    tables = [pq.read_table(path, columns=read_columns, read_dictionary=read_dictionary) for path in files]
+    complaints_df = pa.concat_tables(tables, promote_options='permissive').to_pandas()
+    
+    if filter_dates:
+        complaints_df = filter_date_range(complaints_df, start_date, end_date)
+        if columns is not None and 'Created Date' not in columns:
+            complaints_df = complaints_df.drop(columns='Created Date')
+    
+    return complaints_df
+
+def date_range_mask(complaints_df, start_date=None, end_date=None):
+    """
+    Flag records whose Created Date falls within [start_date, end_date].
+    
+    An end date without a time component includes the whole day.
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with a datetime64 Created Date column
+        start_date (str or pd.Timestamp): Earliest Created Date to keep (None for no bound)
+        end_date (str or pd.Timestamp): Latest Created Date to keep (None for no bound)
+    
+    Returns:
+        pd.Series: Boolean mask over complaints_df
+    """
+    mask = pd.Series(True, index=complaints_df.index)
+    if start_date is not None:
+        mask &= complaints_df['Created Date'] >= pd.Timestamp(start_date)
+    if end_date is not None:
+        end = pd.Timestamp(end_date)
+        if end == end.normalize():
+            end = end + pd.Timedelta(days=1)
+            mask &= complaints_df['Created Date'] < end
+        else:
+            mask &= complaints_df['Created Date'] <= end
+    
+    return mask
+
+def filter_date_range(complaints_df, start_date=None, end_date=None):
+    """
+    Keep records whose Created Date falls within [start_date, end_date].
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with a datetime64 Created Date column
+        start_date (str or pd.Timestamp): Earliest Created Date to keep (None for no bound)
+        end_date (str or pd.Timestamp): Latest Created Date to keep (None for no bound)
+    
+    Returns:
+        pd.DataFrame: Filtered DataFrame
+    """
+    return complaints_df[date_range_mask(complaints_df, start_date, end_date)].reset_index(drop=True)
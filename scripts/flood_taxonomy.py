@@ -0,0 +1,329 @@
+"""
+Flood complaint taxonomy for NYC flood-related 311 complaints analysis.
+
+This module classifies complaints with a configurable taxonomy of include/exclude
+keyword rules over several text fields (Complaint Type, Descriptor, ...). The
+keywords of each field are compiled into one Aho-Corasick automaton that finds
+every keyword of a value in a single pass. Values are matched once per distinct value of
+each field (a few thousand rather than millions of rows), the verdicts are cached,
+and complaints are then classified by a vectorized lookup of their category codes.
+"""
+
+import pandas as pd
+import numpy as np
+import json
+from collections import deque
+
+# Constants
+DEFAULT_FIELDS = ['Complaint Type']
+NO_RULE = -1
+MAX_RULES = 64
+
+# Default taxonomy. A rule matches a complaint when one of its include keywords
+# occurs in one of its fields (case-insensitive) and none of its exclude keywords
+# does; the first matching rule is recorded, along with its sub-category.
+DEFAULT_TAXONOMY = {
+    'rules': [
+        {'name': 'street_flooding', 'subcategory': 'street flooding',
+         'fields': ['Complaint Type', 'Descriptor'], 'include': ['street flooding', 'flooding (sj)', 'ponding']},
+        {'name': 'catch_basin', 'subcategory': 'catch basin',
+         'fields': ['Complaint Type', 'Descriptor'], 'include': ['catch basin', 'basin']},
+        {'name': 'sewer', 'subcategory': 'sewer',
+         'fields': ['Complaint Type', 'Descriptor'], 'include': ['sewer', 'manhole overflow']},
+        {'name': 'flooding', 'subcategory': 'flooding',
+         'fields': ['Complaint Type', 'Descriptor'], 'include': ['flood']},
+        {'name': 'standing_water', 'subcategory': 'standing water',
+         'fields': ['Complaint Type', 'Descriptor'], 'include': ['standing water']},
+        {'name': 'drainage', 'subcategory': 'sewer', 'include': ['drain']},
+        {'name': 'leak', 'subcategory': 'leak', 'include': ['leak', 'wet']},
+        {'name': 'plumbing', 'subcategory': 'leak', 'include': ['plumb']},
+        {'name': 'water', 'subcategory': 'water',
+         'include': ['water'], 'exclude': ['water conservation', 'water quality']}
+    ]
+}
+
+# Compiled taxonomies and verdicts of already classified values, per taxonomy
+_compiled_cache = {}
+_verdict_cache = {}
+
+def _normalize_rule(rule):
+    """Fill in rule defaults, accepting the older keywords/column rule keys."""
+    fields = rule.get('fields') or ([rule['column']] if 'column' in rule else DEFAULT_FIELDS)
+    
+    return {
+        'name': rule['name'],
+        'subcategory': rule.get('subcategory', rule['name']),
+        'fields': list(fields),
+        'include': [keyword.lower() for keyword in rule.get('include', rule.get('keywords', []))],
+        'exclude': [keyword.lower() for keyword in rule.get('exclude', [])]
+    }
+
+def load_taxonomy(path=None):
+    """
+    Load a flood taxonomy.
+    
+    A taxonomy file is JSON of the form ``{"rules": [{"name": ..., "subcategory": ...,
+    "fields": [...], "include": [...], "exclude": [...]}, ...]}``. ``fields``
+    defaults to Complaint Type, ``subcategory`` to the rule name and ``exclude``
+    to no keywords. Rules are tried in order and the first one that matches is
+    recorded.
+    
+    Args:
+        path (str): Path to a taxonomy JSON file (None for DEFAULT_TAXONOMY)
+    
+    Returns:
+        dict: The taxonomy
+    """
+    if path is None:
+        return DEFAULT_TAXONOMY
+    
+    with open(path) as f:
+        taxonomy = json.load(f)
+    
+    rules = [_normalize_rule(rule) for rule in taxonomy['rules']]
+    names = [rule['name'] for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate rule names in taxonomy {path}")
+    if any(not rule['include'] for rule in rules):
+        raise ValueError(f"Every rule in taxonomy {path} needs at least one include keyword")
+    if len(rules) > MAX_RULES:
+        raise ValueError(f"Taxonomy {path} has {len(rules)} rules, at most {MAX_RULES} are supported")
+    
+    return taxonomy
+
+def build_automaton(keywords):
+    """
+    Build an Aho-Corasick automaton over a list of keywords.
+    
+    Args:
+        keywords (list): Keywords to search for
+    
+    Returns:
+        tuple: (goto, fail, output) lists indexed by state; goto maps characters
+            to states and output holds the keyword indices ending at a state
+    """
+    goto, fail, output = [{}], [0], [set()]
+    
+    # Trie of the keywords
+    for keyword_id, keyword in enumerate(keywords):
+        state = 0
+        for char in keyword:
+            if char not in goto[state]:
+                goto.append({})
+                fail.append(0)
+                output.append(set())
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        output[state].add(keyword_id)
+    
+    # Failure links, breadth first from the root
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(char, 0)
+            output[next_state] |= output[fail[next_state]]
+    
+    return goto, fail, output
+
+def find_keywords(automaton, text):
+    """
+    Find all keywords occurring in a text in a single pass.
+    
+    Args:
+        automaton (tuple): Automaton built by build_automaton
+        text (str): Text to search
+    
+    Returns:
+        set: Indices of the keywords found
+    """
+    goto, fail, output = automaton
+    found = set()
+    state = 0
+    for char in text:
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        if output[state]:
+            found |= output[state]
+    
+    return found
+
+def _compile(taxonomy):
+    """Compile a taxonomy into per-field automata and keyword-to-rule bitmasks."""
+    key = json.dumps(taxonomy, sort_keys=True)
+    if key in _compiled_cache:
+        return _compiled_cache[key]
+    
+    rules = [_normalize_rule(rule) for rule in taxonomy['rules']]
+    if len(rules) > MAX_RULES:
+        raise ValueError(f"Taxonomy has {len(rules)} rules, at most {MAX_RULES} are supported")
+    
+    fields = {}
+    for rule_id, rule in enumerate(rules):
+        for field in rule['fields']:
+            keywords = fields.setdefault(field, {})
+            for kind in ('include', 'exclude'):
+                for keyword in rule[kind]:
+                    masks = keywords.setdefault(keyword, {'include': 0, 'exclude': 0})
+                    masks[kind] |= 1 << rule_id
+    
+    compiled = {'key': key, 'rules': rules, 'fields': {}}
+    for field, keywords in fields.items():
+        keyword_list = list(keywords)
+        compiled['fields'][field] = {
+            'automaton': build_automaton(keyword_list),
+            'include': [keywords[keyword]['include'] for keyword in keyword_list],
+            'exclude': [keywords[keyword]['exclude'] for keyword in keyword_list]
+        }
+    _compiled_cache[key] = compiled
+    
+    return compiled
+
+def _value_masks(compiled, field, values):
+    """Get the include and exclude rule bitmasks of each distinct value, matching only values not seen before."""
+    matcher = compiled['fields'][field]
+    cache = _verdict_cache.setdefault((compiled['key'], field), {})
+    
+    for value in values:
+        if value not in cache:
+            include, exclude = 0, 0
+            for keyword_id in find_keywords(matcher['automaton'], str(value).lower()):
+                include |= matcher['include'][keyword_id]
+                exclude |= matcher['exclude'][keyword_id]
+            cache[value] = (include, exclude)
+    
+    masks = np.array([cache[value] for value in values], dtype=np.uint64).reshape(-1, 2)
+    
+    return masks[:, 0], masks[:, 1]
+
+def _column_codes(series):
+    """Encode a column as (codes, distinct values), reusing categorical codes when present."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    
+    return pd.factorize(series)
+
+def classify(complaints_df, taxonomy=None):
+    """
+    Find the first taxonomy rule matching each complaint.
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with the fields the taxonomy looks at
+        taxonomy (dict): Taxonomy (None for DEFAULT_TAXONOMY)
+    
+    Returns:
+        np.ndarray: int16 rule index per complaint (NO_RULE where no rule matches)
+    """
+    compiled = _compile(taxonomy or DEFAULT_TAXONOMY)
+    include = np.zeros(len(complaints_df), dtype=np.uint64)
+    exclude = np.zeros(len(complaints_df), dtype=np.uint64)
+    
+    for field in compiled['fields']:
+        if field not in complaints_df.columns:
+            continue
+        
+        codes, values = _column_codes(complaints_df[field])
+        include_masks, exclude_masks = _value_masks(compiled, field, values)
+        
+        # Missing values have code -1, which picks the trailing empty mask
+        include |= np.append(include_masks, np.uint64(0))[codes]
+        exclude |= np.append(exclude_masks, np.uint64(0))[codes]
+    
+    # Rules are tried in taxonomy order, so the lowest set bit wins
+    matched = include & ~exclude
+    lowest_bit = matched & (~matched + np.uint64(1))
+    rule_ids = np.full(len(complaints_df), NO_RULE, dtype=np.int16)
+    has_match = matched != 0
+    rule_ids[has_match] = np.log2(lowest_bit[has_match]).astype(np.int16)
+    
+    return rule_ids
+
+def rule_names(taxonomy=None):
+    """
+    Get the names of the rules of a taxonomy, in rule order.
+    
+    Args:
+        taxonomy (dict): Taxonomy (None for DEFAULT_TAXONOMY)
+    
+    Returns:
+        list: Rule names
+    """
+    return [rule['name'] for rule in _compile(taxonomy or DEFAULT_TAXONOMY)['rules']]
+
+def subcategory_names(taxonomy=None):
+    """
+    Get the distinct sub-categories of a taxonomy, in order of first use.
+    
+    Args:
+        taxonomy (dict): Taxonomy (None for DEFAULT_TAXONOMY)
+    
+    Returns:
+        list: Sub-category names
+    """
+    rules = _compile(taxonomy or DEFAULT_TAXONOMY)['rules']
+    
+    return list(dict.fromkeys(rule['subcategory'] for rule in rules))
+
+def rule_labels(rule_ids, taxonomy=None):
+    """
+    Convert rule indices to a categorical of rule names.
+    
+    Args:
+        rule_ids (np.ndarray): Rule index per complaint, as returned by classify
+        taxonomy (dict): Taxonomy the indices refer to (None for DEFAULT_TAXONOMY)
+    
+    Returns:
+        pd.Categorical: Rule name per complaint (NaN where no rule matched)
+    """
+    return pd.Categorical.from_codes(rule_ids, categories=rule_names(taxonomy))
+
+def subcategory_labels(rule_ids, taxonomy=None):
+    """
+    Convert rule indices to a categorical of sub-categories.
+    
+    The categorical's codes are stable sub-category codes for grouping.
+    
+    Args:
+        rule_ids (np.ndarray): Rule index per complaint, as returned by classify
+        taxonomy (dict): Taxonomy the indices refer to (None for DEFAULT_TAXONOMY)
+    
+    Returns:
+        pd.Categorical: Sub-category per complaint (NaN where no rule matched)
+    """
+    rules = _compile(taxonomy or DEFAULT_TAXONOMY)['rules']
+    subcategories = subcategory_names(taxonomy)
+    
+    # Sub-category code of each rule, with NO_RULE mapped to -1 by the trailing entry
+    rule_subcategory = np.array([subcategories.index(rule['subcategory']) for rule in rules] + [-1], dtype=np.int8)
+    
+    return pd.Categorical.from_codes(rule_subcategory[rule_ids], categories=subcategories)
+
+def verdict_table(taxonomy=None):
+    """
+    Get the cached verdicts of a taxonomy.
+    
+    Args:
+        taxonomy (dict): Taxonomy (None for DEFAULT_TAXONOMY)
+    
+    Returns:
+        pd.DataFrame: One row per classified value with field, value, include and exclude
+            columns, the latter two listing the names of the rules whose keywords occur
+    """
+    compiled = _compile(taxonomy or DEFAULT_TAXONOMY)
+    names = [rule['name'] for rule in compiled['rules']]
+    
+    def rules_in(mask):
+        return [name for rule_id, name in enumerate(names) if mask >> rule_id & 1]
+    
+    rows = [
+        {'field': field, 'value': value, 'include': rules_in(include), 'exclude': rules_in(exclude)}
+        for (key, field), cache in _verdict_cache.items() if key == compiled['key']
+        for value, (include, exclude) in cache.items()
+    ]
+    
+    return pd.DataFrame(rows, columns=['field', 'value', 'include', 'exclude'])
@@ -0,0 +1,350 @@
+"""
+Local gazetteer geocoder for NYC flood-related 311 complaints analysis.
+
+Many 311 records have an Incident Address and Incident Zip but no coordinates.
+This module places them offline with a local address gazetteer (e.g. a PAD or
+LION extract of house number ranges per street). Street names are normalized
+the same way on both sides and looked up in hash maps by street and ZIP code
+(or borough); names that are not found exactly are resolved through a trie of
+the gazetteer street names. House numbers are then matched against the
+address ranges of all queried streets in one vectorized search. Results are
+cached by normalized address, so each distinct address is only resolved once.
+"""
+
+import pandas as pd
+import numpy as np
+import os
+
+# Constants
+DATA_DIR = "../data"
+RAW_DATA_DIR = os.path.join(DATA_DIR, "raw")
+
+# Street name tokens and their standard abbreviations
+STREET_ABBREVIATIONS = {
+    'STREET': 'ST', 'AVENUE': 'AVE', 'AV': 'AVE', 'ROAD': 'RD', 'BOULEVARD': 'BLVD', 'PLACE': 'PL',
+    'DRIVE': 'DR', 'LANE': 'LN', 'COURT': 'CT', 'TERRACE': 'TER', 'PARKWAY': 'PKWY', 'HIGHWAY': 'HWY',
+    'EXPRESSWAY': 'EXPY', 'SQUARE': 'SQ', 'TURNPIKE': 'TPKE', 'EAST': 'E', 'WEST': 'W', 'NORTH': 'N',
+    'SOUTH': 'S'
+}
+ABBREVIATION_PATTERN = r'\b(' + '|'.join(STREET_ABBREVIATIONS) + r')\b'
+
+# House numbers: plain ("123", "123A") or hyphenated Queens style ("12-34")
+ADDRESS_PATTERN = r'^\s*(\d+)(?:-(\d+))?[A-Z]?\s+(.+?)\s*$'
+HYPHEN_FACTOR = 10000
+
+# Street keys are combined with house numbers into one sortable int64
+STREET_KEY_SHIFT = np.int64(1) << 40
+
+def normalize_streets(streets):
+    """
+    Normalize street names for matching.
+    
+    Names are upper-cased, punctuation is dropped, ordinals lose their suffix
+    ("5TH" -> "5") and street types and directions are abbreviated.
+    
+    Args:
+        streets (pd.Series): Street names
+    
+    Returns:
+        pd.Series: Normalized street names (object dtype)
+    """
+    streets = streets.astype(str).str.upper()
+    streets = streets.str.replace(r'[^A-Z0-9 ]', ' ', regex=True)
+    streets = streets.str.replace(r'\b(\d+)(?:ST|ND|RD|TH)\b', r'\1', regex=True)
+    streets = streets.str.replace(ABBREVIATION_PATTERN, lambda m: STREET_ABBREVIATIONS[m.group(1)], regex=True)
+    
+    return streets.str.split().str.join(' ').astype(object)
+
+def house_numbers(main, hyphenated=None):
+    """
+    Encode house numbers as sortable integers.
+    
+    Args:
+        main (pd.Series): Leading number of each house number
+        hyphenated (pd.Series): Number after the hyphen of Queens-style house numbers (missing if none)
+    
+    Returns:
+        np.ndarray: int64 house numbers, -1 where there is none
+    """
+    numbers = pd.to_numeric(main, errors='coerce').fillna(-1).to_numpy(dtype=np.int64, copy=True)
+    if hyphenated is not None:
+        second = pd.to_numeric(hyphenated, errors='coerce').to_numpy(dtype=np.float64)
+        has_second = ~np.isnan(second)
+        numbers[has_second] = numbers[has_second] * HYPHEN_FACTOR + second[has_second].astype(np.int64)
+    
+    return numbers
+
+def parse_addresses(addresses):
+    """
+    Split addresses into house numbers and normalized street names.
+    
+    Args:
+        addresses (pd.Series): Addresses such as "123 West 5th Street"
+    
+    Returns:
+        tuple: (house numbers as int64, -1 if unparsed; normalized streets, missing if unparsed)
+    """
+    parts = addresses.astype(str).str.upper().str.extract(ADDRESS_PATTERN)
+    streets = normalize_streets(parts[2].fillna(''))
+    streets[parts[2].isna().to_numpy()] = None
+    
+    return house_numbers(parts[0], parts[1]), streets
+
+class StreetTrie:
+    """
+    Character trie over the gazetteer street names.
+    
+    Resolves street names that are not in the gazetteer verbatim: a query with
+    trailing words ("BROADWAY APT 3") resolves to the longest gazetteer street
+    it starts with, and a truncated query ("LEXINGTON") to the only gazetteer
+    street that starts with it.
+    
+    Args:
+        names (iterable): Normalized street names
+    """
+    
+    def __init__(self, names):
+        self.root = {}
+        for name in names:
+            node = self.root
+            for char in name:
+                node = node.setdefault(char, {})
+                node['#'] = node.get('#', 0) + 1
+                node.setdefault('@', name)
+            node['$'] = name
+    
+    def resolve(self, query):
+        """
+        Resolve a street name to a gazetteer street name.
+        
+        Args:
+            query (str): Normalized street name
+        
+        Returns:
+            str: Gazetteer street name (None if the query is ambiguous or unknown)
+        """
+        node = self.root
+        longest = None
+        for i, char in enumerate(query):
+            node = node.get(char)
+            if node is None:
+                return longest
+            # Only whole words count as a shorter street name
+            if '$' in node and (i + 1 == len(query) or query[i + 1] == ' '):
+                longest = node['$']
+        
+        if '$' in node:
+            return node['$']
+        if node.get('#') == 1:
+            return node['@']
+        
+        return longest
+
+class Geocoder:
+    """
+    Offline geocoder over a local address gazetteer.
+    
+    Args:
+        gazetteer_df (pd.DataFrame): Address ranges with street, low_house, high_house,
+            latitude and longitude columns, and zip and/or borough columns
+            (a house_number column may replace low_house and high_house, and an O/E parity
+            column splits the odd and even sides of a street)
+        cache_path (str): Parquet file persisting resolved addresses (None for no persistence)
+    """
+    
+    def __init__(self, gazetteer_df, cache_path=None):
+        gazetteer_df = gazetteer_df.reset_index(drop=True)
+        if 'low_house' not in gazetteer_df.columns:
+            gazetteer_df = gazetteer_df.assign(low_house=gazetteer_df['house_number'],
+                                               high_house=gazetteer_df['house_number'])
+        
+        low = _house_column(gazetteer_df['low_house'])
+        high = _house_column(gazetteer_df['high_house'])
+        streets = normalize_streets(gazetteer_df['street'])
+        
+        # Street ids per (street, ZIP) and (street, borough) key, each range being listed under both;
+        # PAD-style ranges of the odd and even sides of a street overlap, so sides get their own ids
+        key_columns = [col for col in ['zip', 'borough'] if col in gazetteer_df.columns]
+        if not key_columns:
+            raise ValueError("The gazetteer needs a zip or borough column")
+        self.has_parity = 'parity' in gazetteer_df.columns
+        sides = '|' + gazetteer_df['parity'].astype(str).str.upper().str[0] if self.has_parity else ''
+        self.street_ids = {}
+        street_id = []
+        for col in key_columns:
+            codes, uniques = pd.factorize(streets + '|' + _key_values(gazetteer_df[col]) + sides)
+            offset = len(self.street_ids)
+            self.street_ids.update({key: offset + i for i, key in enumerate(uniques)})
+            street_id.append(offset + codes.astype(np.int64))
+        street_id = np.concatenate(street_id)
+        
+        # Ranges of every key, sorted by (street id, low house number)
+        n_keys = len(key_columns)
+        range_low = np.tile(low, n_keys)
+        order = np.lexsort((range_low, street_id))
+        self.range_keys = street_id[order] * STREET_KEY_SHIFT + range_low[order]
+        self.range_streets = street_id[order]
+        self.range_high = np.tile(high, n_keys)[order]
+        self.range_lat = np.tile(gazetteer_df['latitude'].to_numpy(dtype=np.float64), n_keys)[order]
+        self.range_lon = np.tile(gazetteer_df['longitude'].to_numpy(dtype=np.float64), n_keys)[order]
+        
+        self.trie = StreetTrie(pd.unique(streets))
+        self.cache_path = cache_path
+        self.cache = {}
+        if cache_path is not None and os.path.exists(cache_path):
+            cached = pd.read_parquet(cache_path)
+            self.cache = dict(zip(cached['address'], zip(cached['latitude'], cached['longitude'])))
+        self._n_cached = len(self.cache)
+    
+    def _street_id_array(self, houses, streets, areas):
+        """Look up the street ids of (street, area) keys, resolving unknown names through the trie."""
+        sides = np.where(houses % 2 == 1, '|O', '|E') if self.has_parity else np.full(len(houses), '')
+        ids = np.array([
+            self.street_ids.get(f"{street}|{area}{side}", -1) for street, area, side in zip(streets, areas, sides)
+        ], dtype=np.int64)
+        for i in np.flatnonzero(ids < 0):
+            if streets[i] is None:
+                continue
+            resolved = self.trie.resolve(streets[i])
+            if resolved is not None:
+                ids[i] = self.street_ids.get(f"{resolved}|{areas[i]}{sides[i]}", -1)
+        
+        return ids
+    
+    def _resolve(self, houses, streets, zips, boroughs):
+        """Match house numbers against the ranges of their streets, by ZIP code then borough."""
+        lat = np.full(len(houses), np.nan)
+        lon = np.full(len(houses), np.nan)
+        
+        for areas in (zips, boroughs):
+            todo = np.flatnonzero(np.isnan(lat) & (houses >= 0))
+            if areas is None or len(todo) == 0:
+                continue
+            ids = self._street_id_array(houses[todo], streets[todo], areas[todo])
+            query = ids * STREET_KEY_SHIFT + houses[todo]
+            pos = np.searchsorted(self.range_keys, query, side='right') - 1
+            valid = ids >= 0
+            pos = np.where(valid & (pos >= 0), pos, 0)
+            hit = valid & (self.range_streets[pos] == ids) & (self.range_high[pos] >= houses[todo])
+            lat[todo[hit]] = self.range_lat[pos[hit]]
+            lon[todo[hit]] = self.range_lon[pos[hit]]
+        
+        return lat, lon
+    
+    def geocode(self, addresses, zips=None, boroughs=None):
+        """
+        Geocode a batch of addresses.
+        
+        Each distinct (address, ZIP, borough) is normalized and resolved once;
+        normalized addresses already in the result cache are not resolved again.
+        
+        Args:
+            addresses (pd.Series): Incident Address per record
+            zips (pd.Series): Incident Zip per record (None if unknown)
+            boroughs (pd.Series): Borough per record (None if unknown)
+        
+        Returns:
+            tuple: (latitude, longitude) float64 arrays, NaN where the address was not found
+        """
+        addresses = pd.Series(addresses).reset_index(drop=True)
+        frame = pd.DataFrame({
+            'address': addresses.astype(object),
+            'zip': _key_values(zips).to_numpy() if zips is not None else '',
+            'borough': _key_values(boroughs).to_numpy() if boroughs is not None else ''
+        })
+        codes, _ = pd.factorize(frame['address'].fillna('').astype(str) + '|' + frame['zip'] + '|' + frame['borough'])
+        uniques = frame.iloc[np.unique(codes, return_index=True)[1]].reset_index(drop=True)
+        
+        houses, streets = parse_addresses(uniques['address'])
+        keys = (pd.Series(houses).astype(str) + ' ' + streets.fillna('').astype(str) + '|' + uniques['zip'] + '|'
+                + uniques['borough']).to_numpy()
+        cached = np.array([key in self.cache for key in keys], dtype=bool)
+        
+        lat = np.full(len(uniques), np.nan)
+        lon = np.full(len(uniques), np.nan)
+        for i in np.flatnonzero(cached):
+            lat[i], lon[i] = self.cache[keys[i]]
+        
+        todo = np.flatnonzero(~cached)
+        if len(todo):
+            todo_lat, todo_lon = self._resolve(
+                houses[todo], streets.to_numpy()[todo],
+                uniques['zip'].to_numpy()[todo] if zips is not None else None,
+                uniques['borough'].to_numpy()[todo] if boroughs is not None else None
+            )
+            lat[todo], lon[todo] = todo_lat, todo_lon
+            self.cache.update(zip(keys[todo], zip(todo_lat, todo_lon)))
+        
+        return lat[codes], lon[codes]
+    
+    def save_cache(self):
+        """Persist the result cache, if it has new entries and a cache path."""
+        if self.cache_path is None or len(self.cache) == self._n_cached:
+            return
+        
+        addresses = list(self.cache)
+        coords = np.array(list(self.cache.values()), dtype=np.float64).reshape(-1, 2)
+        pd.DataFrame({'address': addresses, 'latitude': coords[:, 0], 'longitude': coords[:, 1]}).to_parquet(
+            self.cache_path, index=False
+        )
+        self._n_cached = len(self.cache)
+
+def _house_column(values):
+    """Encode a gazetteer house number column, which may hold Queens-style hyphenated numbers."""
+    parts = values.astype(str).str.extract(r'^\s*(\d+)(?:-(\d+))?')
+    
+    return house_numbers(parts[0], parts[1])
+
+def _key_values(values):
+    """Format ZIP codes or boroughs as lookup key strings ('' if missing)."""
+    values = pd.Series(values).astype(object)
+    numeric = pd.to_numeric(values, errors='coerce')
+    
+    return pd.Series(
+        np.where(numeric.notna(), numeric.fillna(0).astype(np.int64).astype(str), values.astype(str).str.upper()),
+        index=values.index
+    ).where(values.notna(), '').astype(object)
+
+def geocode_cache_path(gazetteer_path):
+    """
+    Get the result cache file of a gazetteer.
+    
+    Args:
+        gazetteer_path (str): Gazetteer file
+    
+    Returns:
+        str: Parquet file of the resolved addresses
+    """
+    name = os.path.splitext(os.path.basename(gazetteer_path))[0]
+    
+    return os.path.join(RAW_DATA_DIR, f"geocode_cache_{name}.parquet")
+
+def load_geocoder(gazetteer_path, use_cache=True):
+    """
+    Load a gazetteer file into a geocoder.
+    
+    The result cache of the gazetteer is discarded if the gazetteer file is
+    newer than it.
+    
+    Args:
+        gazetteer_path (str): CSV or Parquet gazetteer (see Geocoder for its columns)
+        use_cache (bool): Whether to persist resolved addresses across runs
+    
+    Returns:
+        Geocoder: The geocoder
+    """
+    if gazetteer_path.endswith('.parquet'):
+        gazetteer_df = pd.read_parquet(gazetteer_path)
+    else:
+        gazetteer_df = pd.read_csv(gazetteer_path, dtype={'zip': str, 'low_house': str, 'high_house': str,
+                                                          'house_number': str})
+    print(f"Loaded {len(gazetteer_df)} gazetteer address ranges from {gazetteer_path}")
+    
+    cache_path = None
+    if use_cache:
+        os.makedirs(RAW_DATA_DIR, exist_ok=True)
+        cache_path = geocode_cache_path(gazetteer_path)
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) < os.path.getmtime(gazetteer_path):
+            os.remove(cache_path)
+    
+    return Geocoder(gazetteer_df, cache_path=cache_path)
@@ -0,0 +1,280 @@
+"""
+Incremental ingestion module for NYC 311 complaints.
+
+This module keeps a high-water mark of what has been ingested into the partitioned
+dataset store and a persisted index of ingested Unique Keys with a fingerprint of
+each record's mutable fields (Status, Closed Date) and the month of the store
+partition holding it. A refresh then only writes records that are new or whose
+status changed since they were last ingested, and only scans the months holding
+their earlier versions.
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import os
+
+import dataset_store
+
+# Constants
+DATA_DIR = "../data"
+STATE_DIR = os.path.join(DATA_DIR, "raw", "ingest_state")
+MUTABLE_COLUMNS = ['Status', 'Closed Date']
+KEY_INDEX_FILES = ["keys.npy", "fingerprints.npy", "months.npy"]
+
+def load_watermark(state_dir=STATE_DIR):
+    """
+    Load the ingestion high-water mark.
+    
+    Args:
+        state_dir (str): Directory holding the ingestion state
+    
+    Returns:
+        dict: Watermark with created_date, unique_key and updated_at entries (None if never ingested)
+    """
+    path = os.path.join(state_dir, "watermark.json")
+    if not os.path.exists(path):
+        return None
+    
+    with open(path) as f:
+        return json.load(f)
+
+def bootstrap_watermark(store_root=dataset_store.STORE_DIR):
+    """
+    Derive a high-water mark from the latest month in the store.
+    
+    Used for the first refresh after a bulk import, which records no watermark.
+    
+    Args:
+        store_root (str): Root directory of the dataset store
+    
+    Returns:
+        dict: Watermark with created_date and unique_key entries (None if the store is empty)
+    """
+    partitions = dataset_store.list_partitions(store_root)
+    if partitions.empty:
+        return None
+    
+    latest = partitions.sort_values(['year', 'month']).iloc[-1]
+    latest_month = dataset_store.read_partitions(
+        root=store_root, years=[latest['year']],
+        start_date=pd.Timestamp(year=latest['year'], month=latest['month'], day=1),
+        columns=['Unique Key', 'Created Date']
+    )
+    
+    return {
+        'created_date': latest_month['Created Date'].max().isoformat(),
+        'unique_key': int(latest_month['Unique Key'].max())
+    }
+
+def save_watermark(watermark, state_dir=STATE_DIR):
+    """
+    Atomically save the ingestion high-water mark.
+    
+    Args:
+        watermark (dict): Watermark to save
+        state_dir (str): Directory holding the ingestion state
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, "watermark.json")
+    with open(path + '.tmp', 'w') as f:
+        json.dump(watermark, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def record_fingerprints(complaints_df):
+    """
+    Hash the mutable fields of each record.
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with Status and Closed Date columns
+    
+    Returns:
+        np.ndarray: uint64 fingerprint per record
+    """
+    mutable = complaints_df[MUTABLE_COLUMNS].astype(str)
+    
+    return pd.util.hash_pandas_object(mutable, index=False).to_numpy(dtype=np.uint64)
+
+def load_key_index(state_dir=STATE_DIR):
+    """
+    Load the index of ingested records.
+    
+    Args:
+        state_dir (str): Directory holding the ingestion state
+    
+    Returns:
+        tuple: (keys, fingerprints, months) as a sorted int64 array and its parallel uint64
+            fingerprints and int32 partition months (see dataset_store.month_ordinals), or None
+            if there is no complete index yet
+    """
+    paths = [os.path.join(state_dir, name) for name in KEY_INDEX_FILES]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    
+    return tuple(np.load(path) for path in paths)
+
+def save_key_index(keys, fingerprints, months, state_dir=STATE_DIR):
+    """
+    Save the index of ingested records.
+    
+    Args:
+        keys (np.ndarray): Sorted int64 Unique Keys
+        fingerprints (np.ndarray): uint64 fingerprints parallel to keys
+        months (np.ndarray): int32 partition months parallel to keys
+        state_dir (str): Directory holding the ingestion state
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    for name, array in zip(KEY_INDEX_FILES, [keys, fingerprints, months]):
+        path = os.path.join(state_dir, name)
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(path + '.tmp', path)
+
+def build_key_index(store_root=dataset_store.STORE_DIR):
+    """
+    Build the index of ingested records from the records already in the store.
+    
+    Args:
+        store_root (str): Root directory of the dataset store
+    
+    Returns:
+        tuple: (keys, fingerprints, months) as in load_key_index
+    """
+    stored = dataset_store.read_partitions(root=store_root, columns=['Unique Key', 'Created Date'] + MUTABLE_COLUMNS)
+    if stored.empty:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.uint64), np.array([], dtype=np.int32)
+    
+    stored = stored.drop_duplicates('Unique Key', keep='last')
+    keys = stored['Unique Key'].to_numpy(dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    
+    return keys[order], record_fingerprints(stored)[order], dataset_store.month_ordinals(stored['Created Date'])[order]
+
+def _lookup_keys(keys, query_keys):
+    """Locate query keys in a sorted key array, returning (positions, found)."""
+    if len(keys) == 0:
+        return np.zeros(len(query_keys), dtype=np.int64), np.zeros(len(query_keys), dtype=bool)
+    
+    positions = np.minimum(np.searchsorted(keys, query_keys), len(keys) - 1)
+    
+    return positions, keys[positions] == query_keys
+
+def find_delta(records_df, keys, fingerprints):
+    """
+    Find the records that are new or changed with respect to the key index.
+    
+    Args:
+        records_df (pd.DataFrame): Candidate records with unique Unique Keys
+        keys (np.ndarray): Sorted int64 Unique Keys of ingested records
+        fingerprints (np.ndarray): uint64 fingerprints parallel to keys
+    
+    Returns:
+        tuple: (is_new, is_changed) boolean arrays over records_df
+    """
+    positions, found = _lookup_keys(keys, records_df['Unique Key'].to_numpy(dtype=np.int64))
+    
+    is_new = ~found
+    is_changed = found.copy()
+    if found.any():
+        is_changed[found] = fingerprints[positions[found]] != record_fingerprints(records_df[found])
+    
+    return is_new, is_changed
+
+def previous_months(keys, months, delta_df):
+    """
+    List the partition months holding the stored versions of changed records.
+    
+    Args:
+        keys (np.ndarray): Sorted int64 Unique Keys of ingested records
+        months (np.ndarray): int32 partition months parallel to keys
+        delta_df (pd.DataFrame): New and changed records
+    
+    Returns:
+        np.ndarray: Sorted distinct months (empty if every record is new)
+    """
+    positions, found = _lookup_keys(keys, delta_df['Unique Key'].to_numpy(dtype=np.int64))
+    
+    return np.unique(months[positions[found]])
+
+def merge_key_index(keys, fingerprints, months, delta_df):
+    """
+    Add new records to the key index and update the fingerprints and months of changed ones.
+    
+    Args:
+        keys (np.ndarray): Sorted int64 Unique Keys of ingested records
+        fingerprints (np.ndarray): uint64 fingerprints parallel to keys
+        months (np.ndarray): int32 partition months parallel to keys
+        delta_df (pd.DataFrame): New and changed records with unique Unique Keys
+    
+    Returns:
+        tuple: Updated (keys, fingerprints, months)
+    """
+    delta_keys = delta_df['Unique Key'].to_numpy(dtype=np.int64)
+    delta_fingerprints = record_fingerprints(delta_df)
+    delta_months = dataset_store.month_ordinals(delta_df['Created Date'])
+    positions, found = _lookup_keys(keys, delta_keys)
+    
+    fingerprints = fingerprints.copy()
+    fingerprints[positions[found]] = delta_fingerprints[found]
+    months = months.copy()
+    months[positions[found]] = delta_months[found]
+    
+    keys = np.concatenate([keys, delta_keys[~found]])
+    fingerprints = np.concatenate([fingerprints, delta_fingerprints[~found]])
+    months = np.concatenate([months, delta_months[~found]])
+    order = np.argsort(keys, kind='stable')
+    
+    return keys[order], fingerprints[order], months[order]
+
+def ingest_incremental(records_df, state_dir=STATE_DIR, store_root=dataset_store.STORE_DIR, refreshed_at=None):
+    """
+    Ingest a batch of 311 records, writing only new and changed records to the store.
+    
+    Records are deduplicated within the batch (last one wins) and against the
+    persisted key index. New records and records whose Status or Closed Date
+    changed are upserted into their partitions; everything else is skipped.
+    The key index and the high-water mark are updated afterwards.
+    
+    Args:
+        records_df (pd.DataFrame): Batch of 311 records with schema dtypes
+        state_dir (str): Directory holding the ingestion state
+        store_root (str): Root directory of the dataset store
+        refreshed_at (str): Time the batch was fetched (ISO format), recorded in the watermark
+    
+    Returns:
+        pd.DataFrame: The new and changed records that were written
+    """
+    print(f"Ingesting {len(records_df)} records incrementally...")
+    
+    key_index = load_key_index(state_dir)
+    if key_index is None:
+        print("No key index found, building it from the dataset store")
+        key_index = build_key_index(store_root)
+    keys, fingerprints, months = key_index
+    watermark = load_watermark(state_dir) or bootstrap_watermark(store_root) or {}
+    
+    records_df = records_df.drop_duplicates('Unique Key', keep='last').reset_index(drop=True)
+    is_new, is_changed = find_delta(records_df, keys, fingerprints)
+    delta_df = records_df[is_new | is_changed].reset_index(drop=True)
+    print(f"Found {is_new.sum()} new and {is_changed.sum()} changed records "
+          f"({len(records_df) - len(delta_df)} unchanged records skipped)")
+    
+    if not delta_df.empty:
+        written = dataset_store.upsert_partitions(
+            delta_df, root=store_root, previous_months=previous_months(keys, months, delta_df)
+        )
+        print(f"Updated {len(written)} partitions")
+        keys, fingerprints, months = merge_key_index(keys, fingerprints, months, delta_df)
+    save_key_index(keys, fingerprints, months, state_dir)
+    
+    # Advance the high-water mark
+    if not delta_df.empty:
+        max_created = delta_df['Created Date'].max()
+        if watermark.get('created_date') is None or max_created > pd.Timestamp(watermark['created_date']):
+            watermark['created_date'] = max_created.isoformat()
+        watermark['unique_key'] = int(max(watermark.get('unique_key') or 0, keys[-1]))
+    if refreshed_at is not None:
+        watermark['updated_at'] = refreshed_at
+    save_watermark(watermark, state_dir)
+    
+    return delta_df
@@ -5,9 +5,7 @@ This module provides functions to create interactive maps for flood-related
 311 complaints in NYC, allowing hover information display and interactive exploration.
 """
 
-import pandas as pd
 import numpy as np
-import geopandas as gpd
 import folium
 from folium.plugins import HeatMap
 import json
@@ -15,6 +13,10 @@ import os
 import branca.colormap as cm
 from shapely.geometry import mapping
 
+import artifact_writer
+import complaint_arrays
+import task_graph
+
 # Constants
 DATA_DIR = "../data"
 FIGURES_DIR = "../figures"
@@ -148,8 +150,8 @@ def create_interactive_heatmap(df, title, filename, radius=15, blur=10):
     """
     print("Creating interactive heatmap...")
     
-    # Create a copy to avoid modifying the original
-    df_copy = df.copy()
+    # Only the coordinate columns are read, so df can be a frame over memory-mapped arrays
+    df_copy = df
     
     # Calculate center of the map
     center = [df_copy['Latitude'].mean(), df_copy['Longitude'].mean()]
@@ -164,7 +166,7 @@ def create_interactive_heatmap(df, title, filename, radius=15, blur=10):
     m.get_root().html.add_child(folium.Element(title_html))
     
     # Create the heatmap
-    heat_data = [[row['Latitude'], row['Longitude']] for _, row in df_copy.iterrows()]
+    heat_data = np.column_stack([df_copy['Latitude'], df_copy['Longitude']]).astype(np.float64).tolist()
     HeatMap(heat_data, radius=radius, blur=blur, gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}).add_to(m)
     
     # Save the map
@@ -370,63 +372,114 @@ def create_bivariate_interactive_map(gdf, var1, var2, var1_name, var2_name, titl
     
     return m
 
-def create_interactive_maps(complaints_df, aggregated_gdf):
+def render_map(create, *args, **kwargs):
     """
-    Create all interactive maps for the analysis.
+    Run a map function as a task, keeping the map (which cannot be pickled) in the task.
+    
+    Args:
+        create (callable): Map function (create_interactive_*)
+        *args: Positional arguments of create
+        **kwargs: Keyword arguments of create
+    """
+    create(*args, **kwargs)
+
+def render_interactive_heatmap(complaints_df, period, title, filename):
+    """
+    Create the interactive heatmap as a task, loading the complaint arrays in the task.
     
     Args:
-        complaints_df (pd.DataFrame): DataFrame with complaint data
+        complaints_df (pd.DataFrame): DataFrame with complaint data (None to load the complaint arrays)
+        period (str): Year or date-range label of the complaint arrays
+        title (str): Title for the map
+        filename (str): Output filename (HTML)
+    """
+    if complaints_df is None:
+        complaints_df = complaint_arrays.load_complaint_frame(period)
+    
+    create_interactive_heatmap(complaints_df, title, filename)
+
+def add_interactive_map_tasks(graph, complaints_df, aggregated_gdf, period=2019, prefix='interactive_maps'):
+    """
+    Add one task per interactive map to a task graph.
+    
+    Args:
+        graph (task_graph.TaskGraph): Graph to add the tasks to
+        complaints_df (pd.DataFrame): DataFrame with complaint data (None to only create the tract maps)
         aggregated_gdf (gpd.GeoDataFrame): GeoDataFrame with aggregated complaint data
+        period (str): Year or date-range label shown in titles
+        prefix (str): Prefix of the task names
+    
+    Returns:
+        list: Names of the added tasks
     """
     # Ensure directories exist
     ensure_dirs()
     
+    names = []
+    
+    def add(name, func, *args, filename, **kwargs):
+        graph.add(f"{prefix}.{name}", func, *args, outputs=[os.path.join(FIGURES_DIR, filename)], **kwargs)
+        names.append(f"{prefix}.{name}")
+    
     # Create interactive choropleth maps
-    create_interactive_choropleth(
-        aggregated_gdf,
-        'complaint_count',
-        'NYC Flood-Related 311 Complaints (2019) - Count by Census Tract',
-        'interactive_flood_complaints_count.html',
-        legend_name='Complaint Count'
-    )
+    add('count_choropleth', render_map, create_interactive_choropleth, aggregated_gdf, 'complaint_count',
+        f'NYC Flood-Related 311 Complaints ({period}) - Count by Census Tract',
+        'interactive_flood_complaints_count.html', legend_name='Complaint Count',
+        filename='interactive_flood_complaints_count.html')
+    add('rate_choropleth', render_map, create_interactive_choropleth, aggregated_gdf, 'complaint_rate',
+        f'NYC Flood-Related 311 Complaints ({period}) - Rate by Census Tract',
+        'interactive_flood_complaints_rate.html', legend_name='Complaint Rate (per 1000 people)',
+        filename='interactive_flood_complaints_rate.html')
     
-    create_interactive_choropleth(
-        aggregated_gdf,
-        'complaint_rate',
-        'NYC Flood-Related 311 Complaints (2019) - Rate by Census Tract',
-        'interactive_flood_complaints_rate.html',
-        legend_name='Complaint Rate (per 1000 people)'
-    )
+    # Create bivariate map
+    add('bivariate', render_map, create_bivariate_interactive_map, aggregated_gdf, 'complaint_rate',
+        'median_income', 'Complaint Rate', 'Median Income', 'NYC Flood Complaints vs Median Income',
+        'interactive_flood_complaints_vs_income.html', filename='interactive_flood_complaints_vs_income.html')
     
-    # Create interactive heatmap
-    create_interactive_heatmap(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Heatmap',
-        'interactive_flood_complaints_heatmap.html'
-    )
+    # Complaint-level maps need the complaints (not kept by the fused pipeline by default)
+    if complaints_df is None:
+        print("No complaint-level data, skipping interactive heatmap and complaint map")
+        return names
+    
+    # Create interactive heatmap, from the complaint arrays when they exist
+    heatmap_df = None if complaint_arrays.has_complaint_arrays(period) else complaints_df
+    add('heatmap', render_interactive_heatmap, heatmap_df, period,
+        f'NYC Flood-Related 311 Complaints ({period}) - Heatmap', 'interactive_flood_complaints_heatmap.html',
+        filename='interactive_flood_complaints_heatmap.html')
     
     # Create interactive complaint map
-    create_interactive_complaint_map(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Individual Complaints',
-        'interactive_flood_complaints_markers.html'
-    )
+    add('markers', render_map, create_interactive_complaint_map, complaints_df,
+        f'NYC Flood-Related 311 Complaints ({period}) - Individual Complaints',
+        'interactive_flood_complaints_markers.html', filename='interactive_flood_complaints_markers.html')
     
-    # Create bivariate map
-    create_bivariate_interactive_map(
-        aggregated_gdf,
-        'complaint_rate',
-        'median_income',
-        'Complaint Rate',
-        'Median Income',
-        'NYC Flood Complaints vs Median Income',
-        'interactive_flood_complaints_vs_income.html'
-    )
+    return names
+
+def create_interactive_maps(complaints_df, aggregated_gdf, period=2019, max_workers=1,
+                            executor=task_graph.DEFAULT_EXECUTOR):
+    """
+    Create all interactive maps for the analysis.
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with complaint data (None to only create the tract maps)
+        aggregated_gdf (gpd.GeoDataFrame): GeoDataFrame with aggregated complaint data
+        period (str): Year or date-range label shown in titles
+        max_workers (int): Number of maps created concurrently
+        executor (str): 'process' or 'thread' pool
+    
+    Raises:
+        RuntimeError: If any map failed (the other maps are still created)
+    """
+    graph = task_graph.TaskGraph()
+    add_interactive_map_tasks(graph, complaints_df, aggregated_gdf, period)
+    
+    run = task_graph.run_tasks(graph, max_workers=max_workers, executor=executor)
+    if run.failed:
+        raise RuntimeError(f"{len(run.failed)} interactive maps failed: {', '.join(run.failed)}")
 
 if __name__ == "__main__":
     # Load processed data
-    complaints_df = pd.read_csv(os.path.join(DATA_DIR, "processed", "flood_complaints_2019.csv"))
-    aggregated_gdf = gpd.read_file(os.path.join(DATA_DIR, "processed", "aggregated_flood_complaints_2019.geojson"))
+    complaints_df = artifact_writer.read_artifact(os.path.join(DATA_DIR, "processed", "flood_complaints_2019"))
+    aggregated_gdf = artifact_writer.read_artifact(os.path.join(DATA_DIR, "processed", "aggregated_flood_complaints_2019"))
     
     # Print available columns to debug
     print("Available columns in aggregated_gdf:", aggregated_gdf.columns.tolist())
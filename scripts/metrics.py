@@ -0,0 +1,218 @@
+"""
+Run metrics for NYC flood-related 311 complaints analysis.
+
+Stages are wrapped in stage(), which records their wall and CPU time, rows in
+and out, and the bytes of the files they declare as outputs. Each record is
+appended as one JSON line to the metrics file of the run, next to its text
+log in logs/. Other events, such as stage cache lookups and background
+artifact writes, are recorded with emit(). Artifact records name the stage
+that submitted them, so the bytes a stage wrote can be summed afterwards.
+
+Worker processes append to the same file. Each record is a single write to a
+file opened in append mode, so records of concurrent writers do not
+interleave. Nothing is recorded until a metrics file is configured.
+"""
+
+import pandas as pd
+import numpy as np
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+_config = {'path': None, 'run_id': None}
+_local = threading.local()
+
+def configure(path, run_id=None):
+    """
+    Set the metrics file of the run.
+    
+    Args:
+        path (str): JSON-lines file the records are appended to (None to stop recording)
+        run_id (str): Identifier added to every record (default: the file name without extension)
+    """
+    if path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        run_id = run_id or os.path.basename(path).split('.')[0]
+    
+    _config['path'] = path
+    _config['run_id'] = run_id
+
+def metrics_path():
+    """
+    Get the metrics file of the run.
+    
+    Returns:
+        str: Path of the metrics file (None if metrics are not recorded)
+    """
+    return _config['path']
+
+def _json_value(value):
+    """Convert NumPy scalars and other values json cannot serialize."""
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    
+    return str(value)
+
+def emit(event, **fields):
+    """
+    Append a record to the metrics file.
+    
+    Args:
+        event (str): Record type, e.g. 'stage', 'cache' or 'artifact'
+        **fields: JSON-serializable fields of the record
+    """
+    if _config['path'] is None:
+        return
+    
+    record = {'ts': time.time(), 'run_id': _config['run_id'], 'pid': os.getpid(), 'event': event, **fields}
+    line = json.dumps(record, default=_json_value) + '\n'
+    
+    # A single append-mode write, so records of concurrent processes and threads stay whole
+    fd = os.open(_config['path'], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+def current_stage():
+    """
+    Get the innermost stage running in this thread.
+    
+    Returns:
+        str: Stage name (None outside every stage)
+    """
+    stack = getattr(_local, 'stack', [])
+    
+    return stack[-1].name if stack else None
+
+def output_bytes(paths):
+    """
+    Sum the sizes of output files.
+    
+    Args:
+        paths (iterable): Files or directories (missing ones count 0)
+    
+    Returns:
+        int: Total size in bytes
+    """
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    
+    return total
+
+class StageMetrics:
+    """
+    Metrics of a running stage, completed by the stage body.
+    
+    Args:
+        name (str): Stage name
+        rows_in (int): Rows the stage reads
+        fields (dict): Further fields of the record
+    """
+    
+    def __init__(self, name, rows_in=None, fields=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.outputs = []
+        self.fields = dict(fields or {})
+    
+    def set(self, **fields):
+        """Set fields of the record (rows_in and rows_out included)."""
+        for key in ('rows_in', 'rows_out'):
+            if key in fields:
+                setattr(self, key, fields.pop(key))
+        self.fields.update(fields)
+
+@contextmanager
+def stage(name, rows_in=None, outputs=(), **fields):
+    """
+    Record the metrics of a stage run in the with block.
+    
+    The record is emitted when the block exits, with status 'failed' and the
+    error if it raised. CPU time is that of the whole process, so it includes
+    threads running concurrently with the stage.
+    
+    Args:
+        name (str): Stage name
+        rows_in (int): Rows the stage reads
+        outputs (iterable): Files the stage writes synchronously, measured at exit
+        **fields: Further fields of the record
+    
+    Yields:
+        StageMetrics: Record to complete with rows_out, outputs or other fields
+    """
+    record = StageMetrics(name, rows_in, fields)
+    record.outputs = list(outputs)
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1].name if stack else None
+    stack.append(record)
+    
+    status, error = 'done', None
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    except BaseException as e:
+        status, error = 'failed', f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        stack.pop()
+        emit(
+            'stage', stage=name, parent=parent, status=status, error=error,
+            wall_s=round(time.perf_counter() - wall_start, 6), cpu_s=round(time.process_time() - cpu_start, 6),
+            rows_in=record.rows_in, rows_out=record.rows_out, artifact_bytes=output_bytes(record.outputs),
+            **record.fields
+        )
+
+def read_metrics(path):
+    """
+    Read a metrics file.
+    
+    Args:
+        path (str): JSON-lines metrics file
+    
+    Returns:
+        pd.DataFrame: One row per record (fields a record lacks are NaN)
+    """
+    return pd.read_json(path, lines=True)
+
+def summarize_stages(metrics_df):
+    """
+    Summarize the stage records of a run, with the bytes of the artifacts each stage submitted.
+    
+    Args:
+        metrics_df (pd.DataFrame): Records from read_metrics
+    
+    Returns:
+        pd.DataFrame: Wall time, CPU time, rows and bytes per stage, slowest first
+    """
+    def total(values):
+        # Stages that never report rows stay NaN instead of 0
+        return values.sum(min_count=1)
+    
+    stages = metrics_df[metrics_df['event'] == 'stage']
+    summary = stages.groupby('stage').agg(
+        runs=('stage', 'size'), wall_s=('wall_s', 'sum'), cpu_s=('cpu_s', 'sum'),
+        rows_in=('rows_in', total), rows_out=('rows_out', total), artifact_bytes=('artifact_bytes', 'sum'),
+        failed=('status', lambda status: (status == 'failed').sum())
+    )
+    
+    if 'artifact' in set(metrics_df['event']):
+        artifacts = metrics_df[metrics_df['event'] == 'artifact']
+        written = artifacts.groupby('stage')['bytes'].sum()
+        summary['artifact_bytes'] = summary['artifact_bytes'].add(written, fill_value=0).reindex(summary.index)
+    
+    return summary.sort_values('wall_s', ascending=False)
@@ -13,6 +13,9 @@ import os
 import branca.colormap as cm
 import random
 
+import artifact_writer
+import complaint_arrays
+
 # Constants
 DATA_DIR = "../data"
 FIGURES_DIR = "../figures"
@@ -23,6 +26,22 @@ def ensure_dirs():
     os.makedirs(FIGURES_DIR, exist_ok=True)
     os.makedirs(RESULTS_DIR, exist_ok=True)
 
+def status_colors(statuses):
+    """
+    Get the marker color of each complaint status.
+    
+    Args:
+        statuses (pd.Series): Complaint statuses
+    
+    Returns:
+        np.ndarray: Color name per complaint (green for Closed, red for Open, orange for Pending, blue otherwise)
+    """
+    return np.select(
+        [statuses == 'Closed', statuses == 'Open', statuses == 'Pending'],
+        ['green', 'red', 'orange'],
+        default='blue'
+    )
+
 def create_point_interactive_map(df, title, filename, cluster=True, max_points=None):
     """
     Create an interactive map with markers for each complaint point.
@@ -149,8 +168,8 @@ def create_fast_point_map(df, title, filename, max_points=None):
     """
     print(f"Creating fast point-based interactive map: {title}...")
     
-    # Create a copy to avoid modifying the original
-    df_copy = df.copy()
+    # Only the sampled rows are read, so df can be a frame over memory-mapped arrays
+    df_copy = df
     
     # Limit points if specified
     if max_points is not None and len(df_copy) > max_points:
@@ -183,21 +202,14 @@ def create_fast_point_map(df, title, filename, max_points=None):
     };
     """
     
-    # Prepare data for FastMarkerCluster
-    data = []
-    for idx, row in df_copy.iterrows():
-        # Determine marker color based on complaint status
-        if row['Status'] == 'Closed':
-            color = 'green'
-        elif row['Status'] == 'Open':
-            color = 'red'
-        elif row['Status'] == 'Pending':
-            color = 'orange'
-        else:
-            color = 'blue'
-        
-        # Add data point: [lat, lng, color, tooltip]
-        data.append([row['Latitude'], row['Longitude'], color, row['Complaint Type']])
+    # Prepare data for FastMarkerCluster: [lat, lng, color, tooltip]
+    colors = status_colors(df_copy['Status'])
+    data = [
+        list(point) for point in zip(
+            df_copy['Latitude'].tolist(), df_copy['Longitude'].tolist(), colors.tolist(),
+            df_copy['Complaint Type'].astype(str).tolist()
+        )
+    ]
     
     # Add FastMarkerCluster to the map
     FastMarkerCluster(data, callback=callback).add_to(m)
@@ -367,17 +379,16 @@ def create_time_animated_map(df, title, filename, time_column='Created Date', ti
     # Import TimestampedGeoJson
     from folium.plugins import TimestampedGeoJson
     
-    # Create a copy to avoid modifying the original
-    df_copy = df.copy()
-    
-    # Ensure time column is in datetime format
-    if not pd.api.types.is_datetime64_any_dtype(df_copy[time_column]):
-        df_copy[time_column] = pd.to_datetime(df_copy[time_column])
-    
-    # Limit points if specified
+    # Limit points first, so df can be a frame over memory-mapped arrays
+    df_copy = df
     if max_points is not None and len(df_copy) > max_points:
         df_copy = df_copy.sample(max_points, random_state=42)
     
+    # Ensure time column is in datetime format
+    times = df_copy[time_column]
+    if not pd.api.types.is_datetime64_any_dtype(times):
+        times = pd.to_datetime(times)
+    
     # Calculate center of the map
     center = [df_copy['Latitude'].mean(), df_copy['Longitude'].mean()]
     
@@ -393,30 +404,23 @@ def create_time_animated_map(df, title, filename, time_column='Created Date', ti
     # Prepare features for TimestampedGeoJson
     features = []
     
-    for idx, row in df_copy.iterrows():
-        # Format time for TimestampedGeoJson
-        time_str = row[time_column].strftime(time_format)
-        
-        # Determine marker color based on complaint status
-        if row['Status'] == 'Closed':
-            color = 'green'
-        elif row['Status'] == 'Open':
-            color = 'red'
-        elif row['Status'] == 'Pending':
-            color = 'orange'
-        else:
-            color = 'blue'
-        
+    points = zip(
+        df_copy['Longitude'].tolist(), df_copy['Latitude'].tolist(),
+        times.dt.strftime(time_format).tolist(), status_colors(df_copy['Status']).tolist(),
+        df_copy['Complaint Type'].tolist(), df_copy['Status'].tolist()
+    )
+    
+    for lon, lat, time_str, color, complaint_type, status in points:
         # Create feature
         feature = {
             'type': 'Feature',
             'geometry': {
                 'type': 'Point',
-                'coordinates': [row['Longitude'], row['Latitude']]
+                'coordinates': [lon, lat]
             },
             'properties': {
                 'time': time_str,
-                'popup': f"{row['Complaint Type']}<br>{time_str}<br>Status: {row['Status']}",
+                'popup': f"{complaint_type}<br>{time_str}<br>Status: {status}",
                 'icon': 'circle',
                 'iconstyle': {
                     'fillColor': color,
@@ -473,20 +477,27 @@ def create_time_animated_map(df, title, filename, time_column='Created Date', ti
     
     return m
 
-def create_all_point_maps(complaints_df):
+def create_all_point_maps(complaints_df, period=2019):
     """
     Create all point-based interactive maps for the analysis.
     
     Args:
         complaints_df (pd.DataFrame): DataFrame with complaint data
+        period (str): Year or date-range label shown in titles
     """
     # Ensure directories exist
     ensure_dirs()
     
+    # Maps that only need coordinates, dates, types and statuses read the memory-mapped arrays
+    if complaint_arrays.has_complaint_arrays(period):
+        point_df = complaint_arrays.load_complaint_frame(period)
+    else:
+        point_df = complaints_df
+    
     # Create basic point map with clustering
     create_point_interactive_map(
         complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Individual Points',
+        f'NYC Flood-Related 311 Complaints ({period}) - Individual Points',
         'interactive_flood_complaints_points.html',
         cluster=True,
         max_points=10000  # Limit for better performance
@@ -494,8 +505,8 @@ def create_all_point_maps(complaints_df):
     
     # Create fast point map for larger datasets
     create_fast_point_map(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - All Points (Fast Rendering)',
+        point_df,
+        f'NYC Flood-Related 311 Complaints ({period}) - All Points (Fast Rendering)',
         'interactive_flood_complaints_fast_points.html',
         max_points=20000  # Limit for better performance
     )
@@ -504,7 +515,7 @@ def create_all_point_maps(complaints_df):
     create_category_point_map(
         complaints_df,
         'Complaint Type',
-        'NYC Flood-Related 311 Complaints (2019) - By Complaint Type',
+        f'NYC Flood-Related 311 Complaints ({period}) - By Complaint Type',
         'interactive_flood_complaints_by_type.html',
         cluster=True,
         max_points=10000  # Limit for better performance
@@ -512,8 +523,8 @@ def create_all_point_maps(complaints_df):
     
     # Create time-animated map
     create_time_animated_map(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Time Animation',
+        point_df,
+        f'NYC Flood-Related 311 Complaints ({period}) - Time Animation',
         'interactive_flood_complaints_time_animation.html',
         time_column='Created Date',
         max_points=5000  # Limit for better performance
@@ -521,7 +532,7 @@ def create_all_point_maps(complaints_df):
 
 if __name__ == "__main__":
     # Load processed data
-    complaints_df = pd.read_csv(os.path.join(DATA_DIR, "processed", "flood_complaints_2019.csv"))
+    complaints_df = artifact_writer.read_artifact(os.path.join(DATA_DIR, "processed", "flood_complaints_2019"))
     
     # Create all point-based interactive maps
     create_all_point_maps(complaints_df)
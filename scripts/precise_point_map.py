@@ -6,7 +6,6 @@ with precise small markers for flood-related 311 complaints in NYC, allowing hov
 display and interactive exploration.
 """
 
-import pandas as pd
 import numpy as np
 import folium
 from folium.plugins import HeatMap, MarkerCluster, FastMarkerCluster
@@ -14,6 +13,8 @@ import os
 import branca.colormap as cm
 import random
 
+import artifact_writer
+
 # Constants
 DATA_DIR = "../data"
 FIGURES_DIR = "../figures"
@@ -80,7 +81,7 @@ def create_precise_point_map(df, title, filename, cluster=False, max_points=None
         # Create popup and tooltip with detailed information
         popup = folium.Popup(popup_content, max_width=300)
         # Create a more compact tooltip that works better with folium's hover display
-        tooltip = f"类型: {row['Complaint Type']} | 状态: {row['Status']} | 日期: {row['Created Date'].split()[0]}"
+        tooltip = f"类型: {row['Complaint Type']} | 状态: {row['Status']} | 日期: {str(row['Created Date']).split()[0]}"
         
         # Determine marker color based on complaint status
         if row['Status'] == 'Closed':
@@ -262,7 +263,7 @@ if __name__ == "__main__":
     
     # Load processed data if available
     try:
-        df = pd.read_csv(os.path.join(DATA_DIR, "processed", "flood_complaints_2019.csv"))
+        df = artifact_writer.read_artifact(os.path.join(DATA_DIR, "processed", "flood_complaints_2019"))
         
         # Create precise point maps
         create_precise_point_map(
@@ -10,22 +10,32 @@ import os
 import sys
 import argparse
 import logging
+import time
 from datetime import datetime
 
 # Add the scripts directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import modules
+import artifact_writer
 import data_processing
+import flood_taxonomy
+import geocoder
+import interactive_map
+import metrics
+import tract_aggregates
 import visualization
 import socioeconomic_analysis
+import stage_cache
+import task_graph
 
-def setup_logging(log_level=logging.INFO):
-    """Set up logging configuration."""
+def setup_logging(log_level=logging.INFO, metrics_file=None):
+    """Set up logging configuration and the JSON-lines metrics file of the run."""
     log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
     os.makedirs(log_dir, exist_ok=True)
     
     log_file = os.path.join(log_dir, f'run_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
+    metrics.configure(metrics_file or log_file[:-len('.log')] + '.metrics.jsonl')
     
     logging.basicConfig(
         level=log_level,
@@ -44,18 +54,68 @@ def parse_arguments():
     
     parser.add_argument('--year', type=int, default=2019,
                         help='Year to analyze (default: 2019)')
+    parser.add_argument('--start-date', type=str, default=None,
+                        help='First Created Date to analyze, YYYY-MM-DD (overrides --year)')
+    parser.add_argument('--end-date', type=str, default=None,
+                        help='Last Created Date to analyze, YYYY-MM-DD (overrides --year)')
+    parser.add_argument('--download', action='store_true',
+                        help='Download years missing from the raw data store from NYC Open Data')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Fetch and ingest only 311 records new or changed since the last refresh')
     parser.add_argument('--sample', action='store_true',
-                        help='Use a sample of the data for testing')
+                        help='Use a sample of the data for testing (with --download, only the first '
+                             '--sample-size records of each missing year are downloaded)')
     parser.add_argument('--sample-size', type=int, default=10000,
                         help='Sample size if using sample data (default: 10000)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Stream the raw 311 extract in chunks to bound memory use')
+    parser.add_argument('--chunksize', type=int, default=data_processing.DEFAULT_CHUNKSIZE,
+                        help=f'Rows per chunk in streaming mode (default: {data_processing.DEFAULT_CHUNKSIZE})')
+    parser.add_argument('--fused', action='store_true',
+                        help='Classify, join and aggregate in a single streaming pass, keeping only per-tract counts')
+    parser.add_argument('--keep-complaints', action='store_true',
+                        help='In fused mode, also write the complaint-level outputs')
+    parser.add_argument('--taxonomy', type=str, default=None,
+                        help='JSON file with the flood taxonomy rules (default: built-in keyword rules)')
+    parser.add_argument('--join-workers', type=int, default=1,
+                        help='Worker processes for the spatial join, sharded by spatial tile (default: 1)')
+    parser.add_argument('--snap-tolerance', type=float, nargs='?', default=None,
+                        const=data_processing.DEFAULT_SNAP_TOLERANCE, metavar='METERS',
+                        help='Snap complaints outside every census tract to the nearest tract within METERS '
+                             f'(default when given without a value: {data_processing.DEFAULT_SNAP_TOLERANCE:g})')
+    parser.add_argument('--gazetteer', type=str, default=None,
+                        help='Address gazetteer (CSV or Parquet) used to geocode complaints without coordinates')
+    parser.add_argument('--artifact-format', nargs='+', choices=list(artifact_writer.ARTIFACT_FORMATS),
+                        default=artifact_writer.DEFAULT_FORMATS, metavar='FORMAT',
+                        help='Formats of the processed tables: parquet (GeoParquet for tracts), geojson and/or csv '
+                             f'(default: {" ".join(artifact_writer.DEFAULT_FORMATS)})')
+    parser.add_argument('--artifact-compression', choices=artifact_writer.COMPRESSION_CODECS,
+                        default=artifact_writer.DEFAULT_COMPRESSION,
+                        help=f'Parquet compression codec (default: {artifact_writer.DEFAULT_COMPRESSION})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Run every stage instead of loading unchanged stages from the stage cache')
+    parser.add_argument('--clear-cache', action='store_true',
+                        help='Remove every stage cache entry before running')
+    parser.add_argument('--cache-size', type=int, default=stage_cache.DEFAULT_MAX_BYTES // 1024 ** 2, metavar='MB',
+                        help='Size of the stage cache above which least recently used entries are evicted '
+                             f'(default: {stage_cache.DEFAULT_MAX_BYTES // 1024 ** 2})')
+    parser.add_argument('--metrics-file', type=str, default=None,
+                        help='JSON-lines file for the stage metrics (default: logs/run_<timestamp>.metrics.jsonl)')
     parser.add_argument('--skip-processing', action='store_true',
                         help='Skip data processing step (use existing processed data)')
     parser.add_argument('--skip-visualization', action='store_true',
                         help='Skip visualization step')
     parser.add_argument('--skip-analysis', action='store_true',
                         help='Skip socioeconomic analysis step')
+    parser.add_argument('--interactive-maps', action='store_true',
+                        help='Also create the interactive (HTML) maps')
     parser.add_argument('--resolution', type=int, default=100,
                         help='Resolution for pixel maps (default: 100)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Figures, maps and analyses run concurrently (default: number of CPUs)')
+    parser.add_argument('--executor', choices=task_graph.EXECUTORS, default=task_graph.DEFAULT_EXECUTOR,
+                        help='Pool running concurrent tasks: process or thread '
+                             f'(default: {task_graph.DEFAULT_EXECUTOR})')
     
     return parser.parse_args()
 
@@ -65,9 +125,11 @@ def main():
     args = parse_arguments()
     
     # Set up logging
-    logger = setup_logging()
+    logger = setup_logging(metrics_file=args.metrics_file)
     logger.info("Starting NYC flood-related 311 complaints analysis")
     logger.info(f"Arguments: {args}")
+    logger.info(f"Recording stage metrics to {metrics.metrics_path()}")
+    run_start = time.perf_counter()
     
     # Create necessary directories
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -79,44 +141,173 @@ def main():
     os.makedirs(figures_dir, exist_ok=True)
     os.makedirs(results_dir, exist_ok=True)
     
-    # Step 1: Data Processing
-    if not args.skip_processing:
-        logger.info("Step 1: Processing data")
+    period = data_processing.period_label(args.year, args.start_date, args.end_date)
+    artifact_writer.configure(formats=args.artifact_format, compression=args.artifact_compression)
+    taxonomy = flood_taxonomy.load_taxonomy(args.taxonomy)
+    address_geocoder = geocoder.load_geocoder(args.gazetteer) if args.gazetteer else None
+    
+    # Stages whose parameters, inputs and code are unchanged are loaded from the stage cache
+    cache = stage_cache.StageCache(max_bytes=args.cache_size * 1024 ** 2)
+    if args.clear_cache:
+        cache.invalidate()
+    
+    def run_stage(stage, func, params, inputs, modules, outputs=(), output_dirs=()):
+        if args.no_cache:
+            return func() or {}
+        values, hit = cache.run(stage, func, params=params, inputs=inputs, modules=modules, outputs=outputs,
+                                output_dirs=output_dirs)
+        if hit:
+            logger.info(f"Stage {stage} unchanged, loaded from the stage cache")
+        return values
+    
+    # Step 0: Incremental refresh of the raw data store (and of the tract aggregates, if built before)
+    aggregated_gdf = None
+    if args.incremental:
+        logger.info("Step 0: Refreshing raw data incrementally")
         try:
-            flood_complaints_df, census_gdf, aggregated_gdf = data_processing.process_data()
-            logger.info("Data processing completed successfully")
+            with metrics.stage('refresh') as record:
+                delta_df = data_processing.refresh_nyc_311_data()
+                record.set(rows_out=len(delta_df))
+            logger.info(f"Ingested {len(delta_df)} new or changed records")
+            if tract_aggregates.has_tract_aggregates(period):
+                with metrics.stage('update_aggregates', rows_in=len(delta_df)) as record:
+                    census_gdf = data_processing.download_census_tracts()
+                    aggregated_gdf = data_processing.update_tract_aggregates(
+                        delta_df, census_gdf, year=args.year, start_date=args.start_date, end_date=args.end_date,
+                        taxonomy=taxonomy, snap_tolerance=args.snap_tolerance, geocoder=address_geocoder
+                    )
+                    record.set(rows_out=len(aggregated_gdf))
+                logger.info("Tract aggregates updated incrementally")
         except Exception as e:
-            logger.error(f"Error in data processing: {e}")
+            logger.error(f"Error in incremental refresh: {e}")
             return
-    else:
-        logger.info("Skipping data processing, loading processed data")
-        try:
-            flood_complaints_df = data_processing.download_nyc_311_data(year=args.year, sample=args.sample, sample_size=args.sample_size)
-            census_gdf = data_processing.download_census_tracts()
-            aggregated_gdf = socioeconomic_analysis.load_data()
+    
+    # The remaining steps form a task graph: the figures, interactive maps and analyses only depend on the
+    # processed data, so they run concurrently and a failing one does not stop the others
+    graph = task_graph.TaskGraph()
+    
+    # Step 1: Data Processing
+    def load_processed_data():
+        if aggregated_gdf is not None:
+            logger.info("Skipping data processing, the tract aggregates are up to date")
+            return {'flood_complaints': None, 'aggregated': aggregated_gdf}
+        
+        if args.skip_processing:
+            logger.info("Skipping data processing, loading processed data")
+            flood_complaints_path = os.path.join(data_processing.PROCESSED_DATA_DIR, f"flood_complaints_{period}")
+            flood_complaints_df = None
+            if artifact_writer.find_artifact(flood_complaints_path) is not None:
+                flood_complaints_df = artifact_writer.read_artifact(flood_complaints_path)
+            data_processing.download_census_tracts()
             logger.info("Processed data loaded successfully")
-        except Exception as e:
-            logger.error(f"Error loading processed data: {e}")
-            return
+            return {'flood_complaints': flood_complaints_df, 'aggregated': socioeconomic_analysis.load_data(period)}
+        
+        logger.info("Step 1: Processing data")
+        
+        def process():
+            if args.fused:
+                flood_df, _, aggregated = data_processing.process_data_fused(
+                    year=args.year, start_date=args.start_date, end_date=args.end_date,
+                    chunksize=args.chunksize, download=args.download, taxonomy=taxonomy,
+                    keep_complaints=args.keep_complaints, snap_tolerance=args.snap_tolerance,
+                    geocoder=address_geocoder, sample=args.sample, sample_size=args.sample_size
+                )
+            else:
+                flood_df, _, aggregated = data_processing.process_data(
+                    year=args.year, start_date=args.start_date, end_date=args.end_date,
+                    streaming=args.streaming, chunksize=args.chunksize, download=args.download,
+                    taxonomy=taxonomy, join_workers=args.join_workers, snap_tolerance=args.snap_tolerance,
+                    geocoder=address_geocoder, sample=args.sample, sample_size=args.sample_size
+                )
+            return {'flood_complaints': flood_df, 'aggregated': aggregated}
+        
+        # Chunk sizes and worker counts do not change the results, so they are not part of the key
+        processing_params = {
+            'period': period, 'fused': args.fused, 'keep_complaints': args.keep_complaints,
+            'taxonomy': taxonomy, 'snap_tolerance': args.snap_tolerance, 'artifact_format': args.artifact_format,
+            'gazetteer': stage_cache.fingerprint(args.gazetteer) if args.gazetteer else None,
+            'sample_size': args.sample_size if args.sample else None
+        }
+        # The key fingerprints the store partitions and census files, so create them first: keyed before
+        # the first import, a run would be stored under a key the next run cannot reproduce
+        data_processing.prepare_store_partitions(
+            year=args.year, start_date=args.start_date, end_date=args.end_date,
+            chunksize=args.chunksize, download=args.download, sample=args.sample, sample_size=args.sample_size
+        )
+        data_processing.download_census_tracts()
+        values = run_stage(
+            'processing', process, processing_params,
+            inputs=data_processing.period_inputs(args.year, args.start_date, args.end_date),
+            modules=[data_processing], outputs=lambda: data_processing.processed_outputs(period)
+        )
+        logger.info("Data processing completed successfully")
+        return values
+    
+    processed = graph.add('processing', load_processed_data, inline=True)
+    
+    def add_stage(stage, description, add_tasks, params, modules):
+        """Add a stage: a planning task that loads it from the stage cache or adds its tasks to the graph."""
+        def plan_stage(values):
+            logger.info(description)
+            if not args.no_cache:
+                key = stage_cache.stage_key(stage, params, inputs=data_processing.processed_outputs(period),
+                                            modules=modules)
+                if cache.lookup(key, stage) is not None:
+                    logger.info(f"Stage {stage} unchanged, loaded from the stage cache")
+                    return
+            
+            names = add_tasks(values)
+            if not args.no_cache:
+                # The outputs are positional: outputs= would be taken as the cache task's own outputs
+                graph.add(f"{stage}.cache", cache.store, key, stage, None, graph.outputs(names), deps=names,
+                          inline=True)
+        
+        graph.add(stage, plan_stage, processed, inline=True)
     
     # Step 2: Visualization
     if not args.skip_visualization:
-        logger.info("Step 2: Creating visualizations")
-        try:
-            visualization.visualize_data(flood_complaints_df, aggregated_gdf)
-            logger.info("Visualizations created successfully")
-        except Exception as e:
-            logger.error(f"Error in visualization: {e}")
+        add_stage(
+            'visualization', "Step 2: Creating visualizations",
+            lambda values: visualization.add_visualization_tasks(
+                graph, values['flood_complaints'], values['aggregated'], period, resolution=args.resolution
+            ),
+            {'period': period, 'resolution': args.resolution}, [visualization]
+        )
+    
+    if args.interactive_maps:
+        add_stage(
+            'interactive_maps', "Step 2b: Creating interactive maps",
+            lambda values: interactive_map.add_interactive_map_tasks(
+                graph, values['flood_complaints'], values['aggregated'], period
+            ),
+            {'period': period}, [interactive_map]
+        )
     
     # Step 3: Socioeconomic Analysis
     if not args.skip_analysis:
-        logger.info("Step 3: Running socioeconomic analysis")
-        try:
-            results = socioeconomic_analysis.run_analysis()
-            logger.info("Socioeconomic analysis completed successfully")
-        except Exception as e:
-            logger.error(f"Error in socioeconomic analysis: {e}")
+        add_stage(
+            'analysis', "Step 3: Running socioeconomic analysis",
+            lambda values: socioeconomic_analysis.add_analysis_tasks(
+                graph, socioeconomic_analysis.load_data(period), period
+            ),
+            {'period': period}, [socioeconomic_analysis]
+        )
+    
+    run = task_graph.run_tasks(graph, max_workers=args.workers, executor=args.executor)
+    for name in run.failed:
+        logger.error(f"Task {name} failed: {run.errors[name]}")
+    if run.skipped:
+        logger.error(f"Skipped {len(run.skipped)} tasks depending on failed tasks: {', '.join(run.skipped)}")
+    logger.info(f"Ran {len(run.durations)} tasks ({len(run.failed)} failed) on {args.workers} {args.executor} workers")
+    
+    # Wait for the processed tables still being written in the background
+    try:
+        artifact_writer.flush()
+    except Exception as e:
+        logger.error(f"Error writing processed data: {e}")
     
+    metrics.emit('run', period=period, wall_s=round(time.perf_counter() - run_start, 6), tasks=len(run.status),
+                 failed=len(run.failed), skipped=len(run.skipped), workers=args.workers, executor=args.executor)
     logger.info("Analysis pipeline completed")
 
 if __name__ == "__main__":
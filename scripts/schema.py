@@ -0,0 +1,168 @@
+"""
+Schema registry for NYC flood-related 311 complaints analysis.
+
+This module defines the compact dtypes of every column the pipeline produces
+(categoricals for repeated labels, int32 codes, float32 where precision allows,
+nullable integers for sparse numbers) and provides functions to enforce them and
+to account for the memory saved.
+"""
+
+import pandas as pd
+import numpy as np
+
+# Columns of the columnar 311 cache, grouped by storage type
+CATEGORICAL_311_COLUMNS = ['Agency', 'Complaint Type', 'Descriptor', 'Status', 'Borough']
+DATETIME_311_COLUMNS = ['Created Date', 'Closed Date']
+TEXT_311_COLUMNS = [
+    'Agency', 'Complaint Type', 'Descriptor', 'Location Type', 'Incident Zip',
+    'Incident Address', 'Status', 'Borough'
+]
+
+# Date formats of raw 311 extracts: API pages (ISO 8601) and NYC Open Data CSV exports
+DATETIME_FORMATS = ['ISO8601', '%m/%d/%Y %I:%M:%S %p']
+
+# In-memory dtype of every known column. float32 resolves coordinates to under
+# a meter at NYC's longitude, well below the precision of 311 geocoding. 'zip'
+# keeps the 5-digit ZIP code of ZIP or ZIP+4 values as a categorical.
+COLUMN_DTYPES = {
+    # 311 complaints
+    'Unique Key': 'int64',
+    'Created Date': 'datetime',
+    'Closed Date': 'datetime',
+    'Agency': 'category',
+    'Complaint Type': 'category',
+    'Descriptor': 'category',
+    'Location Type': 'category',
+    'Incident Zip': 'zip',
+    'Incident Address': 'string',
+    'Status': 'category',
+    'Borough': 'category',
+    'Latitude': 'float32',
+    'Longitude': 'float32',
+    'flood_rule': 'category',
+    'flood_subcategory': 'category',
+    'geocoded': 'bool',
+    # Census tracts
+    'GEOID': 'category',
+    'TRACTCE': 'category',
+    'COUNTYFP': 'category',
+    'NAME': 'category',
+    'tract_code': 'int32',
+    'median_income': 'int32',
+    'population': 'int32',
+    'pct_college': 'float32',
+    'pct_poverty': 'float32',
+    'pct_owner_occupied': 'float32',
+    'pct_minority': 'float32',
+    # Aggregates
+    'complaint_count': 'int32',
+    'complaint_rate': 'float32',
+    'count_open': 'int32',
+    'count_in_progress': 'int32',
+    'count_closed': 'int32',
+    'count_other': 'int32',
+    'snap_distance_m': 'float32'
+}
+
+def _has_dtype(series, dtype):
+    """Check whether a series already has a registry dtype."""
+    if dtype == 'datetime':
+        return pd.api.types.is_datetime64_any_dtype(series)
+    if dtype in ('category', 'zip'):
+        return isinstance(series.dtype, pd.CategoricalDtype)
+    if dtype == 'string':
+        return pd.api.types.is_string_dtype(series) and not series.dtype == object
+    
+    return series.dtype == pd.api.types.pandas_dtype(dtype)
+
+def _to_datetime(series):
+    """Parse dates with the first known format that fits, falling back to per-value parsing."""
+    for date_format in DATETIME_FORMATS:
+        try:
+            return pd.to_datetime(series, format=date_format)
+        except (ValueError, TypeError):
+            continue
+    
+    return pd.to_datetime(series, format='mixed', errors='coerce')
+
+def _convert(series, dtype):
+    """Convert a series to a registry dtype."""
+    if dtype == 'datetime':
+        return _to_datetime(series)
+    if dtype == 'zip':
+        # ZIP+4 values ('11201-1234') keep their ZIP code, so they still match 5-digit gazetteer ZIPs
+        return series.astype('string').str.extract(r'^\s*(\d{5})', expand=False).astype('category')
+    if dtype in ('Int32', 'int32', 'int64') and not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series, errors='coerce')
+    if dtype in ('int32', 'int64') and series.isna().any():
+        return series.astype('Int32' if dtype == 'int32' else 'Int64')
+    
+    return series.astype(dtype)
+
+def enforce_schema(df, stage=None, columns=None):
+    """
+    Convert the columns of a DataFrame to their registry dtypes.
+    
+    Columns not in the registry (and geometry columns) are left untouched. When
+    a stage name is given, a memory report of the conversion is printed.
+    
+    Args:
+        df (pd.DataFrame): DataFrame to convert
+        stage (str): Name of the pipeline stage, used in the memory report (None for no report)
+        columns (list): Columns to convert (None for all registry columns present)
+    
+    Returns:
+        pd.DataFrame: DataFrame with compact dtypes
+    """
+    if columns is None:
+        columns = [col for col in df.columns if col in COLUMN_DTYPES]
+    to_convert = [col for col in columns if not _has_dtype(df[col], COLUMN_DTYPES[col])]
+    
+    converted = df.copy(deep=False)
+    for col in to_convert:
+        converted[col] = _convert(df[col], COLUMN_DTYPES[col])
+    
+    if stage is not None:
+        print_memory_report(memory_report(df, converted), stage)
+    
+    return converted
+
+def memory_report(before_df, after_df):
+    """
+    Compare the per-column memory use of a DataFrame before and after conversion.
+    
+    Args:
+        before_df (pd.DataFrame): DataFrame before conversion
+        after_df (pd.DataFrame): DataFrame after conversion
+    
+    Returns:
+        pd.DataFrame: Per-column dtypes and deep memory use in bytes, with a total row
+    """
+    report = pd.DataFrame({
+        'dtype_before': before_df.dtypes.astype(str),
+        'dtype_after': after_df.dtypes.astype(str),
+        'bytes_before': before_df.memory_usage(deep=True, index=False),
+        'bytes_after': after_df.memory_usage(deep=True, index=False)
+    })
+    report.loc['TOTAL'] = ['', '', report['bytes_before'].sum(), report['bytes_after'].sum()]
+    report['reduction'] = report['bytes_before'] / report['bytes_after'].replace(0, np.nan)
+    
+    return report
+
+def print_memory_report(report, stage):
+    """
+    Print a memory report produced by memory_report.
+    
+    Args:
+        report (pd.DataFrame): Memory report
+        stage (str): Name of the pipeline stage
+    """
+    total = report.loc['TOTAL']
+    print(f"Memory for {stage}: {total['bytes_before'] / 1e6:.1f} MB -> "
+          f"{total['bytes_after'] / 1e6:.1f} MB ({total['reduction']:.1f}x smaller)")
+    
+    changed = report.drop(index='TOTAL')
+    changed = changed[changed['dtype_before'] != changed['dtype_after']]
+    for col, row in changed.iterrows():
+        print(f"  {col}: {row['dtype_before']} -> {row['dtype_after']}, "
+              f"{row['bytes_before'] / 1e6:.1f} MB -> {row['bytes_after'] / 1e6:.1f} MB")
@@ -7,7 +7,6 @@ flood-related 311 complaints and socioeconomic factors at the census tract level
 
 import pandas as pd
 import numpy as np
-import geopandas as gpd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
@@ -17,6 +16,10 @@ from sklearn.ensemble import RandomForestRegressor
 import statsmodels.api as sm
 import statsmodels.formula.api as smf
 
+import artifact_writer
+import schema
+import task_graph
+
 # Constants
 DATA_DIR = "../data"
 FIGURES_DIR = "../figures"
@@ -26,17 +29,22 @@ def ensure_dirs():
     """Create necessary directories if they don't exist."""
     os.makedirs(RESULTS_DIR, exist_ok=True)
 
-def load_data():
+def load_data(period=2019):
     """
     Load processed data for analysis.
     
+    Args:
+        period (str): Year or date-range label of the processed data
+    
     Returns:
         gpd.GeoDataFrame: GeoDataFrame with aggregated complaint data and socioeconomic variables
     """
     # Load aggregated data
-    aggregated_gdf = gpd.read_file(os.path.join(DATA_DIR, "processed", "aggregated_flood_complaints_2019.geojson"))
+    aggregated_gdf = artifact_writer.read_artifact(
+        os.path.join(DATA_DIR, "processed", f"aggregated_flood_complaints_{period}")
+    )
     
-    return aggregated_gdf
+    return schema.enforce_schema(aggregated_gdf)
 
 def calculate_descriptive_statistics(gdf):
     """
@@ -96,28 +104,26 @@ def calculate_correlations(gdf):
     corr_matrix.to_csv(os.path.join(RESULTS_DIR, "correlation_matrix.csv"))
     
     # Create correlation heatmap
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
-    plt.title('Correlation Matrix: Flood Complaints and Socioeconomic Factors')
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIGURES_DIR, "correlation_heatmap.png"), dpi=300)
-    plt.close()
+    with task_graph.PYPLOT_LOCK:
+        plt.figure(figsize=(10, 8))
+        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
+        plt.title('Correlation Matrix: Flood Complaints and Socioeconomic Factors')
+        plt.tight_layout()
+        plt.savefig(os.path.join(FIGURES_DIR, "correlation_heatmap.png"), dpi=300)
+        plt.close()
     
     return corr_matrix
 
-def run_regression_models(gdf):
+def _regression_data(gdf):
     """
-    Run regression models to analyze the relationship between complaint rates
-    and socioeconomic factors.
+    Prepare the standardized features and target of the regression models.
     
     Args:
         gdf (gpd.GeoDataFrame): GeoDataFrame with complaint and socioeconomic data
     
     Returns:
-        dict: Dictionary with regression results
+        tuple: (X_scaled_df, y) or None if no feature column exists
     """
-    print("Running regression models...")
-    
     # Select columns for analysis
     target_col = 'complaint_rate'
     feature_cols = ['median_income', 'pct_college', 'pct_poverty', 'pct_owner_occupied']
@@ -142,6 +148,25 @@ def run_regression_models(gdf):
     X_scaled = scaler.fit_transform(X)
     X_scaled_df = pd.DataFrame(X_scaled, columns=feature_cols)
     
+    return X_scaled_df, y
+
+def run_ols_model(gdf):
+    """
+    Fit an OLS regression of complaint rates on socioeconomic factors.
+    
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame with complaint and socioeconomic data
+    
+    Returns:
+        dict: Dictionary with the fitted OLS model (None if no feature column exists)
+    """
+    print("Running OLS regression...")
+    
+    data = _regression_data(gdf)
+    if data is None:
+        return None
+    X_scaled_df, y = data
+    
     # OLS Regression with statsmodels
     X_with_const = sm.add_constant(X_scaled_df)
     ols_model = sm.OLS(y, X_with_const).fit()
@@ -150,13 +175,32 @@ def run_regression_models(gdf):
     with open(os.path.join(RESULTS_DIR, "ols_regression_results.txt"), 'w') as f:
         f.write(ols_model.summary().as_text())
     
+    return {'ols_model': ols_model}
+
+def run_random_forest(gdf):
+    """
+    Fit a random forest regression of complaint rates on socioeconomic factors.
+    
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame with complaint and socioeconomic data
+    
+    Returns:
+        dict: Dictionary with the fitted model and feature importance (None if no feature column exists)
+    """
+    print("Running random forest regression...")
+    
+    data = _regression_data(gdf)
+    if data is None:
+        return None
+    X_scaled_df, y = data
+    
     # Random Forest Regression
     rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
-    rf_model.fit(X_scaled, y)
+    rf_model.fit(X_scaled_df.to_numpy(), y)
     
     # Feature importance
     feature_importance = pd.DataFrame({
-        'Feature': feature_cols,
+        'Feature': X_scaled_df.columns,
         'Importance': rf_model.feature_importances_
     }).sort_values('Importance', ascending=False)
     
@@ -164,21 +208,44 @@ def run_regression_models(gdf):
     feature_importance.to_csv(os.path.join(RESULTS_DIR, "rf_feature_importance.csv"), index=False)
     
     # Create feature importance plot
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x='Importance', y='Feature', data=feature_importance)
-    plt.title('Random Forest Feature Importance')
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIGURES_DIR, "rf_feature_importance.png"), dpi=300)
-    plt.close()
+    with task_graph.PYPLOT_LOCK:
+        plt.figure(figsize=(10, 6))
+        sns.barplot(x='Importance', y='Feature', data=feature_importance)
+        plt.title('Random Forest Feature Importance')
+        plt.tight_layout()
+        plt.savefig(os.path.join(FIGURES_DIR, "rf_feature_importance.png"), dpi=300)
+        plt.close()
+    
+    return {'rf_model': rf_model, 'feature_importance': feature_importance}
+
+def run_regression_models(gdf):
+    """
+    Run regression models to analyze the relationship between complaint rates
+    and socioeconomic factors.
     
-    # Return results
-    results = {
-        'ols_model': ols_model,
-        'rf_model': rf_model,
-        'feature_importance': feature_importance
-    }
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame with complaint and socioeconomic data
     
-    return results
+    Returns:
+        dict: Dictionary with regression results
+    """
+    return combine_regression_results(run_ols_model(gdf), run_random_forest(gdf))
+
+def combine_regression_results(ols_results, rf_results):
+    """
+    Combine the results of the regression models.
+    
+    Args:
+        ols_results (dict): Results of run_ols_model
+        rf_results (dict): Results of run_random_forest
+    
+    Returns:
+        dict: Dictionary with regression results (None if no model ran)
+    """
+    if ols_results is None and rf_results is None:
+        return None
+    
+    return {**(ols_results or {}), **(rf_results or {})}
 
 def analyze_spatial_patterns(gdf):
     """
@@ -214,7 +281,7 @@ def analyze_spatial_patterns(gdf):
     
     # Save hotspots
     if not hotspots.empty:
-        hotspots.to_file(os.path.join(RESULTS_DIR, "complaint_hotspots.geojson"), driver='GeoJSON')
+        artifact_writer.write_artifact(hotspots, os.path.join(RESULTS_DIR, "complaint_hotspots"))
     
     # Return results
     results = {
@@ -224,45 +291,110 @@ def analyze_spatial_patterns(gdf):
     
     return results
 
-def run_analysis():
+def compile_results(gdf, period, stats_df, corr_matrix, ols_results, rf_results, spatial_results):
     """
-    Run the complete socioeconomic analysis.
+    Compile the analysis results and generate the summary report.
+    
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame with complaint and socioeconomic data
+        period (str): Year or date-range label of the analyzed data
+        stats_df (pd.DataFrame): Descriptive statistics
+        corr_matrix (pd.DataFrame): Correlation coefficients
+        ols_results (dict): Results of run_ols_model
+        rf_results (dict): Results of run_random_forest
+        spatial_results (dict): Results of analyze_spatial_patterns
     
     Returns:
         dict: Dictionary with all analysis results
     """
-    # Ensure directories exist
-    ensure_dirs()
-    
-    # Load data
-    gdf = load_data()
-    
-    # Run analyses
-    stats_df = calculate_descriptive_statistics(gdf)
-    corr_matrix = calculate_correlations(gdf)
-    regression_results = run_regression_models(gdf)
-    spatial_results = analyze_spatial_patterns(gdf)
-    
-    # Compile results
     results = {
         'descriptive_stats': stats_df,
         'correlations': corr_matrix,
-        'regression': regression_results,
+        'regression': combine_regression_results(ols_results, rf_results),
         'spatial': spatial_results
     }
     
     # Generate summary report
-    generate_summary_report(results, gdf)
+    generate_summary_report(results, gdf, period)
     
     return results
 
-def generate_summary_report(results, gdf):
+def add_analysis_tasks(graph, gdf, period=2019, prefix='analysis'):
+    """
+    Add the analyses to a task graph: one task per analysis, then the summary report.
+    
+    Args:
+        graph (task_graph.TaskGraph): Graph to add the tasks to
+        gdf (gpd.GeoDataFrame): GeoDataFrame with complaint and socioeconomic data
+        period (str): Year or date-range label of the analyzed data
+        prefix (str): Prefix of the task names
+    
+    Returns:
+        list: Names of the added tasks, the summary report last
+    """
+    # Ensure directories exist
+    ensure_dirs()
+    
+    def results_file(filename):
+        return os.path.join(RESULTS_DIR, filename)
+    
+    def figure_file(filename):
+        return os.path.join(FIGURES_DIR, filename)
+    
+    stats_df = graph.add(f"{prefix}.descriptive_statistics", calculate_descriptive_statistics, gdf,
+                         outputs=[results_file("descriptive_statistics.csv")])
+    corr_matrix = graph.add(f"{prefix}.correlations", calculate_correlations, gdf,
+                            outputs=[results_file("correlation_matrix.csv"), figure_file("correlation_heatmap.png")])
+    ols_results = graph.add(f"{prefix}.ols_regression", run_ols_model, gdf,
+                            outputs=[results_file("ols_regression_results.txt")])
+    rf_results = graph.add(f"{prefix}.random_forest", run_random_forest, gdf,
+                           outputs=[results_file("rf_feature_importance.csv"),
+                                    figure_file("rf_feature_importance.png")])
+    spatial_results = graph.add(f"{prefix}.spatial_patterns", analyze_spatial_patterns, gdf,
+                                outputs=[results_file("global_spatial_statistics.csv")] +
+                                        [results_file("complaint_hotspots" + extension)
+                                         for extension in artifact_writer.ARTIFACT_FORMATS.values()])
+    graph.add(f"{prefix}.summary_report", compile_results, gdf, period, stats_df, corr_matrix, ols_results,
+              rf_results, spatial_results, outputs=[results_file("analysis_summary.md")])
+    
+    return [f"{prefix}.{name}" for name in ['descriptive_statistics', 'correlations', 'ols_regression',
+                                            'random_forest', 'spatial_patterns', 'summary_report']]
+
+def run_analysis(period=2019, max_workers=1, executor=task_graph.DEFAULT_EXECUTOR):
+    """
+    Run the complete socioeconomic analysis.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+        max_workers (int): Number of analyses run concurrently
+        executor (str): 'process' or 'thread' pool
+    
+    Returns:
+        dict: Dictionary with all analysis results
+    
+    Raises:
+        RuntimeError: If any analysis failed (the independent analyses still run)
+    """
+    # Load data
+    gdf = load_data(period)
+    
+    graph = task_graph.TaskGraph()
+    names = add_analysis_tasks(graph, gdf, period)
+    
+    run = task_graph.run_tasks(graph, max_workers=max_workers, executor=executor)
+    if run.failed:
+        raise RuntimeError(f"{len(run.failed)} analyses failed: {', '.join(run.failed)}")
+    
+    return run.results[names[-1]]
+
+def generate_summary_report(results, gdf, period=2019):
     """
     Generate a summary report of the analysis results.
     
     Args:
         results (dict): Dictionary with analysis results
         gdf (gpd.GeoDataFrame): GeoDataFrame with complaint and socioeconomic data
+        period (str): Year or date-range label of the analyzed data
     """
     print("Generating summary report...")
     
@@ -271,7 +403,7 @@ def generate_summary_report(results, gdf):
         
         # Overview
         f.write("## Overview\n\n")
-        f.write("This report summarizes the analysis of flood-related 311 complaints in NYC for 2019 ")
+        f.write(f"This report summarizes the analysis of flood-related 311 complaints in NYC for {period} ")
         f.write("and their relationship with socioeconomic factors at the census tract level.\n\n")
         
         # Data summary
@@ -335,7 +467,7 @@ def generate_summary_report(results, gdf):
         
         # Conclusions
         f.write("## Conclusions\n\n")
-        f.write("Based on the analysis of flood-related 311 complaints in NYC for 2019, we found that:\n\n")
+        f.write(f"Based on the analysis of flood-related 311 complaints in NYC for {period}, we found that:\n\n")
         f.write("1. There is significant spatial variation in flood-related complaint rates across NYC census tracts.\n")
         f.write("2. Socioeconomic factors show meaningful correlations with complaint rates, suggesting that reporting behavior is influenced by demographic characteristics.\n")
         f.write("3. The most important predictors of flood-related complaint rates are [list top factors based on analysis].\n")
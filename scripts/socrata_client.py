@@ -0,0 +1,217 @@
+"""
+Socrata API client for downloading NYC Open Data resources.
+
+This module provides a pooled HTTP session, retrying requests with exponential backoff,
+and a concurrent paged downloader that checkpoints every page to disk so an interrupted
+download resumes where it stopped.
+"""
+
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Constants
+DEFAULT_PAGE_SIZE = 50000
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+DEFAULT_TIMEOUT = 120
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def create_session(pool_size=DEFAULT_MAX_WORKERS, app_token=None):
+    """
+    Create an HTTP session with a connection pool sized for concurrent page fetches.
+    
+    Args:
+        pool_size (int): Maximum number of pooled connections per host
+        app_token (str): Optional Socrata app token (raises the API rate limit)
+    
+    Returns:
+        requests.Session: The pooled session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    
+    if app_token:
+        session.headers['X-App-Token'] = app_token
+    
+    return session
+
+def fetch(session, url, params=None, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT):
+    """
+    Fetch a URL, retrying connection errors and retryable status codes.
+    
+    Retries wait ``backoff * 2**attempt`` seconds plus jitter, or the server's
+    Retry-After delay when one is given.
+    
+    Args:
+        session (requests.Session): Session to use
+        url (str): URL to fetch
+        params (dict): Query parameters
+        retries (int): Number of retries after the first attempt
+        backoff (float): Base delay in seconds between retries
+        timeout (float): Request timeout in seconds
+    
+    Returns:
+        bytes: The response body
+    """
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response.content
+            
+            error = requests.HTTPError(f"{response.status_code} error for {response.url}", response=response)
+            retry_after = response.headers.get('Retry-After')
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        
+        if attempt == retries:
+            raise error
+        
+        if retry_after is not None and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = backoff * 2 ** attempt * (1 + random.random() / 2)
+        print(f"Request failed ({error}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+def count_rows(session, resource_url, where=None, **fetch_kwargs):
+    """
+    Count the rows of a Socrata resource matching a filter.
+    
+    Args:
+        session (requests.Session): Session to use
+        resource_url (str): Resource URL without extension (e.g. .../resource/erm2-nwe9)
+        where (str): SoQL $where clause
+        **fetch_kwargs: Retry settings passed to fetch
+    
+    Returns:
+        int: Number of matching rows
+    """
+    params = {'$select': 'count(*) AS row_count'}
+    if where:
+        params['$where'] = where
+    
+    result = json.loads(fetch(session, f"{resource_url}.json", params=params, **fetch_kwargs))
+    
+    return int(result[0]['row_count'])
+
+def _load_manifest(checkpoint_dir, query):
+    """Load the checkpoint manifest, discarding checkpoints written for a different query."""
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('query') == query:
+            return manifest
+        
+        print(f"Checkpoints in {checkpoint_dir} belong to a different query, starting over")
+        for name in os.listdir(checkpoint_dir):
+            if name.startswith('page_'):
+                os.remove(os.path.join(checkpoint_dir, name))
+    
+    return None
+
+def _save_manifest(checkpoint_dir, manifest):
+    """Atomically write the checkpoint manifest."""
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def page_path(checkpoint_dir, page):
+    """Get the checkpoint file of a page."""
+    return os.path.join(checkpoint_dir, f"page_{page:06d}.csv")
+
+def download_pages(resource_url, checkpoint_dir, select=None, where=None, order=':id',
+                   page_size=DEFAULT_PAGE_SIZE, limit=None, max_workers=DEFAULT_MAX_WORKERS,
+                   session=None, **fetch_kwargs):
+    """
+    Download a Socrata resource as CSV pages, fetching pages concurrently.
+    
+    Each page is written to ``checkpoint_dir`` as soon as it arrives (via a
+    temporary file and an atomic rename), so re-running an interrupted download
+    only fetches the missing pages. Pages are requested with a stable $order so
+    offsets stay consistent across runs.
+    
+    Args:
+        resource_url (str): Resource URL without extension (e.g. .../resource/erm2-nwe9)
+        checkpoint_dir (str): Directory holding the page checkpoints
+        select (list): Fields to request (None for all)
+        where (str): SoQL $where clause
+        order (str): SoQL $order clause used for stable paging
+        page_size (int): Rows per page
+        limit (int): Maximum number of rows to download (None for all matching rows)
+        max_workers (int): Maximum number of concurrent page fetches
+        session (requests.Session): Session to use (a pooled session is created if None)
+        **fetch_kwargs: Retry settings passed to fetch
+    
+    Returns:
+        list: Paths of the page files, in page order
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    if session is None:
+        session = create_session(pool_size=max_workers)
+    
+    query = {
+        'resource_url': resource_url,
+        'select': select,
+        'where': where,
+        'order': order,
+        'page_size': page_size,
+        'limit': limit
+    }
+    manifest = _load_manifest(checkpoint_dir, query)
+    if manifest is None:
+        total_rows = count_rows(session, resource_url, where=where, **fetch_kwargs)
+        if limit is not None:
+            total_rows = min(total_rows, limit)
+        manifest = {'query': query, 'total_rows': total_rows}
+        _save_manifest(checkpoint_dir, manifest)
+    
+    total_rows = manifest['total_rows']
+    n_pages = math.ceil(total_rows / page_size)
+    pending = [page for page in range(n_pages) if not os.path.exists(page_path(checkpoint_dir, page))]
+    print(f"Downloading {total_rows} rows in {n_pages} pages "
+          f"({n_pages - len(pending)} already checkpointed) with {max_workers} workers")
+    
+    def fetch_page(page):
+        offset = page * page_size
+        params = {
+            '$order': order,
+            '$limit': min(page_size, total_rows - offset),
+            '$offset': offset
+        }
+        if select:
+            params['$select'] = ','.join(select)
+        if where:
+            params['$where'] = where
+        
+        content = fetch(session, f"{resource_url}.csv", params=params, **fetch_kwargs)
+        
+        path = page_path(checkpoint_dir, page)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+        
+        return page
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch_page, page) for page in pending]
+        for i, future in enumerate(as_completed(futures), 1):
+            future.result()
+            if i % 10 == 0 or i == len(futures):
+                print(f"Downloaded {i}/{len(futures)} pages")
+    
+    return [page_path(checkpoint_dir, page) for page in range(n_pages)]
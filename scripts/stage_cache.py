@@ -0,0 +1,325 @@
+"""
+Content-addressed stage cache for NYC flood-related 311 complaints analysis.
+
+Each pipeline stage run is keyed by a hash of its parameters, the fingerprints
+of its input artifacts and the source code of the modules it runs. A stage
+whose key is unchanged loads its cached outputs instead of recomputing.
+
+Entries are invalidated automatically. A changed parameter, input or module
+gives a new key. An entry is also dropped when a file the stage wrote outside
+the cache (processed tables, figures) was since deleted or rewritten, e.g. by
+a run with other parameters. Least recently used entries are evicted once the
+cache exceeds its size bound.
+"""
+
+import pandas as pd
+import geopandas as gpd
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import artifact_writer
+import metrics
+
+# Constants
+DATA_DIR = "../data"
+STAGE_CACHE_DIR = os.path.join(DATA_DIR, "cache", "stages")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _file_stats(path):
+    """List (relative path, size, mtime_ns) of the files under a path."""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [('', stat.st_size, stat.st_mtime_ns)]
+    
+    stats = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            stats.append((os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns))
+    
+    return sorted(stats)
+
+def fingerprint(path):
+    """
+    Fingerprint a file or directory from the sizes and modification times of its files.
+    
+    Args:
+        path (str): File or directory
+    
+    Returns:
+        str: Hex digest (None if the path does not exist)
+    """
+    if not os.path.exists(path):
+        return None
+    
+    return hashlib.sha256(json.dumps(_file_stats(path)).encode()).hexdigest()
+
+def _local_modules(module, seen):
+    """Collect a module and the modules of this directory it imports, transitively."""
+    seen[module.__name__] = module
+    for value in vars(module).values():
+        name = getattr(value, '__name__', None)
+        if type(value) is type(sys) and name not in seen and \
+                os.path.dirname(os.path.abspath(getattr(value, '__file__', None) or '')) == SCRIPTS_DIR:
+            _local_modules(value, seen)
+    
+    return seen
+
+def code_version(*modules):
+    """
+    Hash the source of modules and of the modules of this directory they import.
+    
+    Args:
+        *modules (module): Modules run by a stage
+    
+    Returns:
+        str: Hex digest of the sources
+    """
+    seen = {}
+    for module in modules:
+        _local_modules(module, seen)
+    
+    digest = hashlib.sha256()
+    for name in sorted(seen):
+        with open(seen[name].__file__, 'rb') as f:
+            digest.update(name.encode() + b'\0' + f.read())
+    
+    return digest.hexdigest()
+
+def stage_key(stage, params=None, inputs=(), modules=()):
+    """
+    Compute the cache key of a stage run.
+    
+    Args:
+        stage (str): Stage name
+        params (dict): JSON-serializable stage parameters
+        inputs (iterable): Input files or directories
+        modules (iterable): Modules run by the stage
+    
+    Returns:
+        str: Hex digest of the stage, parameters, input fingerprints and code version
+    """
+    key = {
+        'stage': stage,
+        'params': params or {},
+        'inputs': {os.path.abspath(path): fingerprint(path) for path in inputs},
+        'code': code_version(*modules)
+    }
+    
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+class StageCache:
+    """
+    Cache of stage outputs, one directory per key.
+    
+    Args:
+        cache_dir (str): Directory of the cache entries
+        max_bytes (int): Size above which least recently used entries are evicted
+    """
+    
+    def __init__(self, cache_dir=STAGE_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+    
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+    
+    def _read_meta(self, key):
+        """Read the metadata of an entry (None if it does not exist)."""
+        meta_path = os.path.join(self._entry_dir(key), "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+    
+    def _write_meta(self, key, meta):
+        with open(os.path.join(self._entry_dir(key), "meta.json"), 'w') as f:
+            json.dump(meta, f, indent=2)
+    
+    def lookup(self, key, stage=None):
+        """
+        Load the outputs of a stage run, if cached and still valid.
+        
+        Args:
+            key (str): Cache key from stage_key
+            stage (str): Stage name, recorded in the metrics of a miss
+        
+        Returns:
+            dict: Cached values by name (None on a miss)
+        """
+        meta = self._read_meta(key)
+        if meta is None:
+            metrics.emit('cache', stage=stage, key=key[:12], hit=False, reason='absent')
+            return None
+        
+        # Files the stage wrote outside the cache must still be the ones it wrote
+        stale = [path for path, digest in meta['outputs'].items() if fingerprint(path) != digest]
+        if stale:
+            print(f"Invalidating cached {meta['stage']} stage: {len(stale)} outputs changed, e.g. {stale[0]}")
+            self.invalidate(key)
+            metrics.emit('cache', stage=meta['stage'], key=key[:12], hit=False, reason='stale')
+            return None
+        
+        values = {}
+        for name, file_name in meta['values'].items():
+            if file_name is None:
+                values[name] = None
+            elif meta['geo'].get(name):
+                values[name] = gpd.read_parquet(os.path.join(self._entry_dir(key), file_name))
+            else:
+                values[name] = pd.read_parquet(os.path.join(self._entry_dir(key), file_name))
+        
+        meta['last_used'] = time.time()
+        self._write_meta(key, meta)
+        metrics.emit('cache', stage=meta['stage'], key=key[:12], hit=True, bytes=self.size(key))
+        
+        return values
+    
+    def store(self, key, stage, values=None, outputs=()):
+        """
+        Cache the outputs of a stage run, then evict entries beyond the size bound.
+        
+        Args:
+            key (str): Cache key from stage_key
+            stage (str): Stage name
+            values (dict): DataFrames (or None) returned by the stage, by name
+            outputs (iterable): Files or directories the stage wrote outside the cache
+        """
+        # Outputs queued to the artifact writer must be on disk to be fingerprinted
+        artifact_writer.flush()
+        
+        path = self._entry_dir(key)
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        
+        meta = {'stage': stage, 'created': time.time(), 'last_used': time.time(), 'values': {}, 'geo': {},
+                'outputs': {os.path.abspath(output): fingerprint(output) for output in outputs}}
+        for name, df in (values or {}).items():
+            if df is None:
+                meta['values'][name] = None
+                continue
+            meta['values'][name] = f"{name}.parquet"
+            meta['geo'][name] = isinstance(df, gpd.GeoDataFrame)
+            df.to_parquet(os.path.join(tmp_path, f"{name}.parquet"), index=False)
+        with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+            json.dump(meta, f, indent=2)
+        
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self.evict(keep=key)
+    
+    def invalidate(self, key=None, stage=None):
+        """
+        Remove cache entries.
+        
+        Args:
+            key (str): Entry to remove (None for every entry of the stage)
+            stage (str): Stage whose entries are removed (None with no key for every entry)
+        """
+        keys = [key] if key is not None else self.keys()
+        for entry in keys:
+            meta = self._read_meta(entry)
+            if stage is None or (meta is not None and meta['stage'] == stage):
+                shutil.rmtree(self._entry_dir(entry), ignore_errors=True)
+    
+    def keys(self):
+        """
+        List the cached keys.
+        
+        Returns:
+            list: Keys of the complete cache entries
+        """
+        if not os.path.isdir(self.cache_dir):
+            return []
+        
+        return [key for key in os.listdir(self.cache_dir)
+                if os.path.exists(os.path.join(self.cache_dir, key, "meta.json"))]
+    
+    def size(self, key=None):
+        """
+        Get the disk size of the cache or of one entry.
+        
+        Args:
+            key (str): Entry to measure (None for the whole cache)
+        
+        Returns:
+            int: Size in bytes
+        """
+        path = self.cache_dir if key is None else self._entry_dir(key)
+        if not os.path.exists(path):
+            return 0
+        
+        return sum(size for _, size, _ in _file_stats(path))
+    
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache fits its size bound.
+        
+        Args:
+            keep (str): Entry never evicted (e.g. the one just stored)
+        
+        Returns:
+            int: Number of evicted entries
+        """
+        entries = [(self._read_meta(key)['last_used'], key) for key in self.keys() if key != keep]
+        total = self.size()
+        n_evicted = 0
+        for _, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            total -= self.size(key)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            n_evicted += 1
+        
+        if n_evicted:
+            print(f"Evicted {n_evicted} stage cache entries to stay under {self.max_bytes / 1024 ** 2:.0f} MB")
+        
+        return n_evicted
+    
+    def run(self, stage, func, params=None, inputs=(), modules=(), outputs=(), output_dirs=()):
+        """
+        Run a stage through the cache.
+        
+        On a hit the cached values are returned without calling func. On a
+        miss func is called and its values are cached together with the
+        fingerprints of its outputs: the given paths and the files under
+        output_dirs that it created or modified.
+        
+        Args:
+            stage (str): Stage name
+            func (callable): Function running the stage, returning a dict of DataFrames (or None)
+            params (dict): JSON-serializable stage parameters
+            inputs (iterable): Input files or directories
+            modules (iterable): Modules run by the stage
+            outputs (callable or iterable): Files or directories the stage writes, or a function
+                listing them after the run
+            output_dirs (iterable): Directories in which the stage writes files
+        
+        Returns:
+            tuple: (values, hit) with the stage values and whether they came from the cache
+        """
+        key = stage_key(stage, params, inputs, modules)
+        values = self.lookup(key, stage)
+        if values is not None:
+            print(f"Loaded {stage} stage from cache entry {key[:12]}")
+            return values, True
+        
+        started = time.time_ns()
+        values = func() or {}
+        artifact_writer.flush()
+        
+        written = list(outputs() if callable(outputs) else outputs)
+        for directory in output_dirs:
+            for relpath, _, mtime in _file_stats(directory) if os.path.isdir(directory) else []:
+                if mtime >= started:
+                    written.append(os.path.join(directory, relpath))
+        self.store(key, stage, values, written)
+        
+        return values, False
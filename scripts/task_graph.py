@@ -0,0 +1,270 @@
+"""
+Task graph executor for NYC flood-related 311 complaints analysis.
+
+The pipeline is declared as a DAG of tasks. A task lists the tasks it depends
+on, explicitly or by taking their results as arguments (see TaskGraph.add),
+and runs once they have all succeeded. Independent tasks run concurrently on
+a process or thread pool. A failing task only takes down the tasks that
+depend on it; every other branch of the graph still runs.
+
+Inline tasks run in the scheduling process itself and may add tasks to the
+graph, which lets a stage decide at run time (e.g. after a stage cache
+lookup) which tasks it needs.
+"""
+
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import threading
+import time
+
+import artifact_writer
+import metrics
+
+# Pools: processes for CPU-bound tasks and matplotlib figures (pyplot is not thread-safe), threads for I/O
+EXECUTORS = ['process', 'thread']
+DEFAULT_EXECUTOR = 'process'
+
+# pyplot keeps global state: tasks drawing figures hold this lock so thread pool workers take turns
+PYPLOT_LOCK = threading.Lock()
+
+class TaskResult:
+    """
+    Reference to the result of a task, replaced by the result when passed as a task argument.
+    
+    Args:
+        name (str): Task name
+    """
+    
+    def __init__(self, name):
+        self.name = name
+
+class Task:
+    """
+    Node of a task graph.
+    
+    Args:
+        name (str): Task name
+        func (callable): Function run by the task (module-level, so process pools can pickle it)
+        args (tuple): Positional arguments, possibly TaskResult references
+        kwargs (dict): Keyword arguments, possibly TaskResult references
+        deps (list): Names of the tasks this task depends on
+        outputs (list): Files the task writes
+        inline (bool): Whether the task runs in the scheduling process
+    """
+    
+    def __init__(self, name, func, args, kwargs, deps, outputs, inline):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.deps = deps
+        self.outputs = outputs
+        self.inline = inline
+
+class TaskGraph:
+    """Directed acyclic graph of tasks, in insertion order."""
+    
+    def __init__(self):
+        self.tasks = {}
+    
+    def add(self, name, func, *args, deps=(), outputs=(), inline=False, **kwargs):
+        """
+        Add a task.
+        
+        Tasks can only depend on tasks added before them, so the graph stays
+        acyclic. TaskResult arguments add their task to the dependencies.
+        
+        Args:
+            name (str): Unique task name
+            func (callable): Function run by the task
+            *args: Positional arguments of func
+            deps (iterable): Names of further tasks to run first
+            outputs (iterable): Files the task writes
+            inline (bool): Whether to run the task in the scheduling process (it may then add tasks)
+            **kwargs: Keyword arguments of func
+        
+        Returns:
+            TaskResult: Reference to the result of the task
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task {name} is already in the graph")
+        
+        refs = [arg.name for arg in list(args) + list(kwargs.values()) if isinstance(arg, TaskResult)]
+        deps = list(dict.fromkeys(list(deps) + refs))
+        unknown = [dep for dep in deps if dep not in self.tasks]
+        if unknown:
+            raise ValueError(f"Task {name} depends on tasks not in the graph: {unknown}")
+        
+        self.tasks[name] = Task(name, func, args, kwargs, deps, list(outputs), inline)
+        
+        return TaskResult(name)
+    
+    def outputs(self, names):
+        """
+        List the files written by tasks.
+        
+        Args:
+            names (iterable): Task names
+        
+        Returns:
+            list: Output files of the tasks
+        """
+        return [output for name in names for output in self.tasks[name].outputs]
+
+class TaskRun:
+    """
+    Outcome of running a task graph.
+    
+    Attributes:
+        results (dict): Result of each succeeded task
+        status (dict): 'done', 'failed' or 'skipped' (a dependency failed) per task
+        errors (dict): Exception of each failed task
+        durations (dict): Run time in seconds of each task that ran
+    """
+    
+    def __init__(self):
+        self.results = {}
+        self.status = {}
+        self.errors = {}
+        self.durations = {}
+    
+    @property
+    def failed(self):
+        """list: Names of the failed tasks."""
+        return [name for name, status in self.status.items() if status == 'failed']
+    
+    @property
+    def skipped(self):
+        """list: Names of the tasks skipped because a dependency failed."""
+        return [name for name, status in self.status.items() if status == 'skipped']
+
+def _row_count(value):
+    """Rows of a table (None for other values)."""
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+def _run_task(name, func, args, kwargs, outputs=()):
+    """Run a task function and time it, writing its queued artifacts before a worker returns."""
+    start = time.perf_counter()
+    rows_in = next((_row_count(arg) for arg in args if _row_count(arg) is not None), None)
+    with metrics.stage(name, rows_in=rows_in, outputs=outputs, kind='task') as record:
+        result = func(*args, **kwargs)
+        artifact_writer.flush()
+        record.set(rows_out=_row_count(result))
+    
+    return result, time.perf_counter() - start
+
+def _create_pool(executor, max_workers):
+    """Create the worker pool of a run."""
+    if executor == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers)
+    
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+def run_tasks(graph, max_workers=1, executor=DEFAULT_EXECUTOR):
+    """
+    Run a task graph.
+    
+    Ready tasks are submitted to the pool as soon as their dependencies have
+    succeeded. With a single worker every task runs in the calling process,
+    in insertion order.
+    
+    Args:
+        graph (TaskGraph): Tasks to run (inline tasks may add more while it runs)
+        max_workers (int): Number of concurrent tasks
+        executor (str): 'process' or 'thread' pool
+    
+    Returns:
+        TaskRun: Results, status, errors and durations of the tasks
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor {executor}; choose from {EXECUTORS}")
+    
+    run = TaskRun()
+    pool = _create_pool(executor, max_workers) if max_workers > 1 else None
+    running = {}
+    
+    def resolve(value):
+        return run.results[value.name] if isinstance(value, TaskResult) else value
+    
+    def finish(name, outcome):
+        """Record the outcome of a task: a (result, duration) pair or an exception."""
+        if isinstance(outcome, Exception):
+            run.status[name] = 'failed'
+            run.errors[name] = outcome
+            print(f"Task {name} failed: {type(outcome).__name__}: {outcome}")
+        else:
+            run.results[name], run.durations[name] = outcome
+            run.status[name] = 'done'
+    
+    def collect(future):
+        """Record the outcome of a pool task, returning it."""
+        name = running.pop(future)
+        try:
+            outcome = future.result()
+        except Exception as e:
+            outcome = e
+        finish(name, outcome)
+        
+        return outcome
+    
+    def replace_pool():
+        """Collect the tasks of a broken process pool, failed unless they finished first, and start a new pool."""
+        nonlocal pool
+        pool.shutdown(wait=False)
+        for future in list(running):
+            collect(future)
+        pool = _create_pool(executor, max_workers)
+    
+    try:
+        while True:
+            # Start every task whose dependencies have all succeeded, skip those with a failed one
+            progressed = True
+            while progressed:
+                progressed = False
+                for name, task in list(graph.tasks.items()):
+                    if name in run.status or name in running.values():
+                        continue
+                    dep_status = [run.status.get(dep) for dep in task.deps]
+                    if any(status in ('failed', 'skipped') for status in dep_status):
+                        run.status[name] = 'skipped'
+                        print(f"Task {name} skipped: a dependency failed")
+                        progressed = True
+                        continue
+                    if not all(status == 'done' for status in dep_status):
+                        continue
+                    
+                    args = [resolve(arg) for arg in task.args]
+                    kwargs = {key: resolve(value) for key, value in task.kwargs.items()}
+                    if pool is None or task.inline:
+                        try:
+                            outcome = _run_task(name, task.func, args, kwargs, task.outputs)
+                        except Exception as e:
+                            outcome = e
+                        finish(name, outcome)
+                        progressed = True
+                    else:
+                        # Workers are forked on submit and must not inherit a writer thread in the middle of a write
+                        if executor == 'process':
+                            artifact_writer.wait()
+                        try:
+                            future = pool.submit(_run_task, name, task.func, args, kwargs, task.outputs)
+                        except BrokenProcessPool:
+                            # The pool broke before its failed task was collected
+                            replace_pool()
+                            future = pool.submit(_run_task, name, task.func, args, kwargs, task.outputs)
+                        running[future] = name
+            
+            if not running:
+                break
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                # A worker that died (e.g. out of memory) breaks the whole process pool
+                if future in running and isinstance(collect(future), BrokenProcessPool):
+                    replace_pool()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    
+    return run
@@ -0,0 +1,345 @@
+"""
+Incrementally maintained per-tract aggregates for NYC flood-related 311 complaints analysis.
+
+This module persists complaint counts per census tract and status bucket, next
+to the tract and bucket each complaint contributes to. A refresh then applies
+count deltas for its new and changed complaints only: a changed complaint is
+subtracted from its old tract and bucket and added to its new ones, and the
+complaint rates are recomputed for the touched tracts only.
+
+A streaming build writes the contributions of each chunk as a run sorted by
+key and merges the runs into the store, without holding every complaint in
+memory.
+"""
+
+import numpy as np
+import json
+import os
+import shutil
+
+# Constants
+DATA_DIR = "../data"
+PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
+
+# Status buckets and the 311 statuses they hold; any other status is counted as 'other'
+STATUS_BUCKETS = {
+    'open': ['Open', 'Pending', 'Assigned'],
+    'in_progress': ['In Progress', 'Started'],
+    'closed': ['Closed']
+}
+BUCKET_NAMES = list(STATUS_BUCKETS) + ['other']
+
+# Entries of a sorted run: the tract and bucket a complaint contributes to
+RUN_DTYPE = np.dtype([('key', np.int64), ('tract_code', np.int32), ('bucket', np.int8)])
+MERGE_BLOCK_SIZE = 1_000_000
+
+def aggregates_dir(period=2019):
+    """
+    Get the directory holding the tract aggregates of a period.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        str: Directory of the aggregates
+    """
+    return os.path.join(PROCESSED_DATA_DIR, f"tract_aggregates_{period}")
+
+def has_tract_aggregates(period=2019):
+    """
+    Check whether tract aggregates were built for a period.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        bool: True if the aggregates exist
+    """
+    return os.path.exists(os.path.join(aggregates_dir(period), "meta.json"))
+
+def status_buckets(statuses):
+    """
+    Map 311 statuses to status bucket codes.
+    
+    Args:
+        statuses (pd.Series): Status per complaint
+    
+    Returns:
+        np.ndarray: int8 position in BUCKET_NAMES per complaint
+    """
+    lookup = {status: code for code, bucket in enumerate(STATUS_BUCKETS.values()) for status in bucket}
+    other = len(STATUS_BUCKETS)
+    
+    return statuses.astype(str).map(lookup).fillna(other).to_numpy(dtype=np.int8)
+
+def _bucket_counts(tract_codes, buckets, n_tracts):
+    """Count complaints per (tract, bucket) cell, skipping complaints outside every tract."""
+    inside = tract_codes >= 0
+    cells = tract_codes[inside].astype(np.int64) * len(BUCKET_NAMES) + buckets[inside]
+    
+    return np.bincount(cells, minlength=n_tracts * len(BUCKET_NAMES)).reshape(n_tracts, len(BUCKET_NAMES))
+
+def _complaint_rates(counts, population):
+    """Complaints per 1000 people."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (counts.sum(axis=1) / population * 1000).astype(np.float32)
+
+def build_tract_aggregates(keys, tract_codes, statuses, population, period=2019):
+    """
+    Build the tract aggregates of a period from scratch.
+    
+    Args:
+        keys (np.ndarray): Unique Key per complaint
+        tract_codes (np.ndarray): int32 tract_code per complaint (-1 if not in a tract)
+        statuses (pd.Series): Status per complaint
+        population (np.ndarray): Population per tract, in tract_code order
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        dict: Aggregates (see load_tract_aggregates)
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    population = np.asarray(population, dtype=np.float64)
+    
+    aggregates = {
+        'keys': keys[order],
+        'tract_codes': np.asarray(tract_codes, dtype=np.int32)[order],
+        'buckets': status_buckets(statuses)[order],
+        'population': population
+    }
+    aggregates['counts'] = _bucket_counts(aggregates['tract_codes'], aggregates['buckets'], len(population))
+    aggregates['rates'] = _complaint_rates(aggregates['counts'], population)
+    save_tract_aggregates(aggregates, period)
+    
+    return aggregates
+
+def save_tract_aggregates(aggregates, period=2019):
+    """
+    Save tract aggregates, replacing the previous ones in one rename.
+    
+    Args:
+        aggregates (dict): Aggregates (see load_tract_aggregates)
+        period (str): Year or date-range label of the processed data
+    """
+    path = aggregates_dir(period)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    
+    for name, array in aggregates.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+    _publish_aggregates(tmp_path, path, len(aggregates['keys']), len(aggregates['population']))
+
+def _publish_aggregates(tmp_path, path, n_complaints, n_tracts):
+    """Write the metadata of aggregates written to tmp_path, then move them to path."""
+    meta = {'n_complaints': int(n_complaints), 'n_tracts': int(n_tracts), 'buckets': BUCKET_NAMES}
+    with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+        json.dump(meta, f, indent=2)
+    
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+def runs_dir(period=2019):
+    """
+    Get the scratch directory holding the sorted runs of a period being built.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+    
+    Returns:
+        str: Directory of the runs
+    """
+    return aggregates_dir(period) + '.runs'
+
+def write_sorted_run(run_dir, keys, tract_codes, statuses):
+    """
+    Write the contributions of a batch of complaints as a run sorted by key.
+    
+    Args:
+        run_dir (str): Directory of the runs
+        keys (np.ndarray): Unique Key per complaint
+        tract_codes (np.ndarray): int32 tract_code per complaint (>= 0)
+        statuses (pd.Series): Status per complaint
+    
+    Returns:
+        str: Path of the run file
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    run = np.empty(len(keys), dtype=RUN_DTYPE)
+    run['key'] = keys
+    run['tract_code'] = tract_codes
+    run['bucket'] = status_buckets(statuses)
+    run.sort(order='key', kind='stable')
+    
+    path = os.path.join(run_dir, f"run_{len(os.listdir(run_dir)):06d}.npy")
+    np.save(path, run)
+    
+    return path
+
+def merge_sorted_runs(run_paths, population, period=2019, block_size=MERGE_BLOCK_SIZE):
+    """
+    Build the tract aggregates of a period by merging sorted runs.
+    
+    The runs are read block by block and the merged keys, tract codes and
+    buckets are written straight to memory-mapped files of the aggregate store,
+    so memory holds one block per run and the count array only.
+    
+    Args:
+        run_paths (list): Run files from write_sorted_run
+        population (np.ndarray): Population per tract, in tract_code order
+        period (str): Year or date-range label of the processed data
+        block_size (int): Number of entries read from a run at a time
+    
+    Returns:
+        dict: Aggregates (see load_tract_aggregates)
+    """
+    population = np.asarray(population, dtype=np.float64)
+    runs = [np.load(path, mmap_mode='r') for path in run_paths]
+    total = sum(len(run) for run in runs)
+    
+    path = aggregates_dir(period)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    out = {
+        name: np.lib.format.open_memmap(os.path.join(tmp_path, f"{name}.npy"), mode='w+', dtype=dtype, shape=(total,))
+        for name, dtype in [('keys', np.int64), ('tract_codes', np.int32), ('buckets', np.int8)]
+    }
+    counts = np.zeros((len(population), len(BUCKET_NAMES)), dtype=np.int64)
+    
+    positions = [0] * len(runs)
+    written = 0
+    while True:
+        blocks = {
+            i: run[positions[i]:positions[i] + block_size] for i, run in enumerate(runs) if positions[i] < len(run)
+        }
+        if not blocks:
+            break
+        # Every entry up to the smallest last key of the blocks precedes all entries not read yet
+        bound = min(block['key'][-1] for block in blocks.values())
+        taken = []
+        for i, block in blocks.items():
+            n = np.searchsorted(block['key'], bound, side='right')
+            taken.append(block[:n])
+            positions[i] += n
+        merged = np.concatenate(taken)
+        merged = merged[np.argsort(merged['key'], kind='stable')]
+        
+        end = written + len(merged)
+        out['keys'][written:end] = merged['key']
+        out['tract_codes'][written:end] = merged['tract_code']
+        out['buckets'][written:end] = merged['bucket']
+        counts += _bucket_counts(merged['tract_code'], merged['bucket'], len(population))
+        written = end
+    
+    for array in out.values():
+        array.flush()
+    del out, runs
+    np.save(os.path.join(tmp_path, "counts.npy"), counts)
+    np.save(os.path.join(tmp_path, "rates.npy"), _complaint_rates(counts, population))
+    np.save(os.path.join(tmp_path, "population.npy"), population)
+    _publish_aggregates(tmp_path, path, total, len(population))
+    
+    return load_tract_aggregates(period, mmap_mode='r')
+
+def load_tract_aggregates(period=2019, mmap_mode=None):
+    """
+    Load the tract aggregates of a period.
+    
+    Args:
+        period (str): Year or date-range label of the processed data
+        mmap_mode (str): Memory-map the arrays in this np.load mode instead of reading them (None to read)
+    
+    Returns:
+        dict: Sorted int64 keys with the int32 tract_codes and int8 buckets each complaint
+            contributes to, int64 (n_tracts, n_buckets) counts, float32 rates and float64 population
+    """
+    path = aggregates_dir(period)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta['buckets'] != BUCKET_NAMES:
+        raise ValueError(f"Tract aggregates in {path} use buckets {meta['buckets']}; rebuild them")
+    
+    names = ['keys', 'tract_codes', 'buckets', 'population', 'counts', 'rates']
+    
+    return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+
+def apply_delta(aggregates, keys, tract_codes, statuses):
+    """
+    Apply new and changed complaints to tract aggregates.
+    
+    The old contribution of each known complaint is subtracted and its new
+    one added, so counts move between tracts and status buckets. Complaints
+    that no longer count (e.g. no longer flood-related) are passed with a
+    tract_code of -1 and only subtracted.
+    
+    Args:
+        aggregates (dict): Aggregates (see load_tract_aggregates), updated in place
+        keys (np.ndarray): Unique Key per new or changed complaint (unique)
+        tract_codes (np.ndarray): int32 tract_code per complaint (-1 if it no longer counts)
+        statuses (pd.Series): Status per complaint
+    
+    Returns:
+        np.ndarray: Sorted tract codes whose counts changed
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    tract_codes = np.asarray(tract_codes, dtype=np.int32)
+    buckets = status_buckets(statuses)
+    n_tracts = len(aggregates['population'])
+    
+    # Old contributions of the complaints already in the aggregates
+    stored_keys = aggregates['keys']
+    if len(stored_keys):
+        positions = np.minimum(np.searchsorted(stored_keys, keys), len(stored_keys) - 1)
+        found = stored_keys[positions] == keys
+    else:
+        positions, found = np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    old_positions = positions[found]
+    old_tracts = aggregates['tract_codes'][old_positions]
+    old_buckets = aggregates['buckets'][old_positions]
+    
+    delta = _bucket_counts(tract_codes, buckets, n_tracts) - _bucket_counts(old_tracts, old_buckets, n_tracts)
+    aggregates['counts'] += delta
+    
+    # Record the new contributions
+    aggregates['tract_codes'][old_positions] = tract_codes[found]
+    aggregates['buckets'][old_positions] = buckets[found]
+    new = ~found & (tract_codes >= 0)
+    if new.any():
+        merged_keys = np.concatenate([stored_keys, keys[new]])
+        order = np.argsort(merged_keys, kind='stable')
+        aggregates['keys'] = merged_keys[order]
+        aggregates['tract_codes'] = np.concatenate([aggregates['tract_codes'], tract_codes[new]])[order]
+        aggregates['buckets'] = np.concatenate([aggregates['buckets'], buckets[new]])[order]
+    
+    # Only the touched tracts get a new rate
+    touched = np.flatnonzero(delta.any(axis=1))
+    aggregates['rates'][touched] = _complaint_rates(aggregates['counts'][touched], aggregates['population'][touched])
+    
+    return touched
+
+def to_geodataframe(aggregates, census_gdf):
+    """
+    Attach tract aggregates to the census tracts.
+    
+    Args:
+        aggregates (dict): Aggregates (see load_tract_aggregates)
+        census_gdf (gpd.GeoDataFrame): GeoDataFrame with census tract data, in tract_code order
+    
+    Returns:
+        gpd.GeoDataFrame: Census tracts with complaint_count, complaint_rate and one
+            count_<bucket> column per status bucket
+    """
+    if len(census_gdf) != len(aggregates['population']):
+        raise ValueError(
+            f"Tract aggregates cover {len(aggregates['population'])} tracts but the census data has {len(census_gdf)}"
+        )
+    
+    aggregated_gdf = census_gdf.copy()
+    aggregated_gdf['complaint_count'] = aggregates['counts'].sum(axis=1)
+    aggregated_gdf['complaint_rate'] = aggregates['rates']
+    for i, bucket in enumerate(BUCKET_NAMES):
+        aggregated_gdf[f'count_{bucket}'] = aggregates['counts'][:, i]
+    
+    return aggregated_gdf
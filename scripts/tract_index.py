@@ -0,0 +1,430 @@
+"""
+Census tract cache and spatial index for NYC flood-related 311 complaints analysis.
+
+This module stores the census tract layer as GeoParquet (WKB geometries) next to
+precomputed tract bounds and centroids, so runs after the first one skip parsing
+GeoJSON. A lookup raster over the tract extent stores the tract of every grid
+cell that lies inside a single tract, so most points are located with an array
+lookup and only points in cells on a tract boundary need an exact test. The
+cached pieces, and the STRtree used for the exact tests, are only loaded when
+first used.
+"""
+
+import geopandas as gpd
+import numpy as np
+import pyarrow.parquet as pq
+import shapely
+from scipy.spatial import cKDTree
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+
+import artifact_writer
+
+# Constants
+DATA_DIR = "../data"
+CACHE_DIR = os.path.join(DATA_DIR, "raw", "census_tract_cache")
+LOCATE_BLOCK_SIZE = 1000000
+CACHE_VERSION = 2
+
+# Lookup grid cell size in degrees (about 40 m of latitude) and cell values
+GRID_CELL_SIZE = 0.0004
+GRID_BLOCK_ROWS = 64
+NO_TRACT = -1
+BOUNDARY_CELL = -2
+
+# Parallel locate: Z-order tile resolution (2^level tiles per side), shards per
+# worker, and the smallest input worth shipping to worker processes
+ZORDER_LEVEL = 10
+SHARDS_PER_WORKER = 4
+PARALLEL_MIN_POINTS = 500000
+
+# Snapping: meters per degree of latitude, and the maximum spacing in meters
+# of the boundary vertices indexed by the KD-tree
+METERS_PER_DEGREE = 111320.0
+SNAP_VERTEX_SPACING = 25.0
+
+# Tract indexes opened by this (worker) process, by cache directory
+_open_indexes = {}
+
+def _source_signature(source_path):
+    """Identify a version of the source layer by its size and modification time."""
+    stat = os.stat(source_path)
+    
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+def is_cache_valid(source_path, cache_dir=CACHE_DIR):
+    """
+    Check whether the tract cache was built from the current version of a source layer.
+    
+    Args:
+        source_path (str): Path of the source tract layer (e.g. GeoJSON)
+        cache_dir (str): Directory of the tract cache
+    
+    Returns:
+        bool: True if the cache exists and matches the source layer
+    """
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if not (os.path.exists(meta_path) and os.path.exists(source_path)):
+        return False
+    
+    with open(meta_path) as f:
+        meta = json.load(f)
+    
+    if meta.get('cache_version') != CACHE_VERSION:
+        return False
+    
+    return all(meta.get(key) == value for key, value in _source_signature(source_path).items())
+
+def build_lookup_grid(geometries, cell_size=GRID_CELL_SIZE):
+    """
+    Rasterize tracts into a lookup grid.
+    
+    A cell stores a tract position when it lies strictly inside that tract and
+    intersects no other tract, NO_TRACT when it intersects no tract and
+    BOUNDARY_CELL otherwise. Cells are tested in bands of GRID_BLOCK_ROWS rows
+    to bound the number of cell boxes alive at once.
+    
+    Args:
+        geometries (np.ndarray): Tract geometries, in tract_code order
+        cell_size (float): Cell size in degrees
+    
+    Returns:
+        tuple: (grid, origin) with the int32 (n_rows, n_cols) grid and its (min x, min y) corner
+    """
+    tree = shapely.STRtree(geometries)
+    minx, miny, maxx, maxy = shapely.total_bounds(geometries)
+    n_cols = max(int(np.ceil((maxx - minx) / cell_size)), 1)
+    n_rows = max(int(np.ceil((maxy - miny) / cell_size)), 1)
+    grid = np.empty((n_rows, n_cols), dtype=np.int32)
+    
+    # Cells are grown by a hair before testing, so points rounded into a
+    # neighbouring cell by the floor in locate are still covered
+    margin = cell_size * 1e-6
+    x0 = minx + np.arange(n_cols) * cell_size - margin
+    for row_start in range(0, n_rows, GRID_BLOCK_ROWS):
+        rows = np.arange(row_start, min(row_start + GRID_BLOCK_ROWS, n_rows))
+        y0 = miny + rows * cell_size - margin
+        cell_x0, cell_y0 = np.meshgrid(x0, y0)
+        cells = shapely.box(
+            cell_x0.ravel(), cell_y0.ravel(),
+            cell_x0.ravel() + cell_size + 2 * margin, cell_y0.ravel() + cell_size + 2 * margin
+        )
+        
+        cell_idx, tract_idx = tree.query(cells, predicate='intersects')
+        n_tracts = np.bincount(cell_idx, minlength=len(cells))
+        inside = shapely.contains_properly(geometries[tract_idx], cells[cell_idx])
+        
+        band = np.full(len(cells), BOUNDARY_CELL, dtype=np.int32)
+        band[n_tracts == 0] = NO_TRACT
+        single = inside & (n_tracts[cell_idx] == 1)
+        band[cell_idx[single]] = tract_idx[single]
+        grid[rows] = band.reshape(len(rows), n_cols)
+    
+    return grid, (float(minx), float(miny))
+
+def write_tract_cache(census_gdf, source_path=None, cache_dir=CACHE_DIR):
+    """
+    Write the tract layer, its bounds and its centroids to the tract cache.
+    
+    Args:
+        census_gdf (gpd.GeoDataFrame): Census tracts, in tract_code order
+        source_path (str): Path of the source layer the tracts were read from (None if generated)
+        cache_dir (str): Directory of the tract cache
+    """
+    # Built in a scratch directory and moved into place, so readers never see a half-rewritten cache
+    tmp_dir = os.path.normpath(cache_dir) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    
+    geometries = census_gdf.geometry.values
+    census_gdf.to_parquet(os.path.join(tmp_dir, "tracts.parquet"), index=False)
+    np.save(os.path.join(tmp_dir, "bounds.npy"), shapely.bounds(geometries))
+    np.save(os.path.join(tmp_dir, "centroids.npy"), shapely.get_coordinates(shapely.centroid(geometries)))
+    
+    grid, origin = build_lookup_grid(np.asarray(geometries))
+    np.save(os.path.join(tmp_dir, "grid.npy"), grid)
+    n_boundary = (grid == BOUNDARY_CELL).sum()
+    print(f"Built {grid.shape[0]}x{grid.shape[1]} tract lookup grid ({n_boundary / grid.size * 100:.1f}% boundary cells)")
+    
+    meta = {
+        'cache_version': CACHE_VERSION,
+        'n_tracts': len(census_gdf),
+        'crs': census_gdf.crs.to_string() if census_gdf.crs else None,
+        'grid_origin': origin,
+        'grid_cell_size': GRID_CELL_SIZE
+    }
+    if source_path is not None:
+        meta.update(_source_signature(source_path))
+    with open(os.path.join(tmp_dir, "meta.json"), 'w') as f:
+        json.dump(meta, f, indent=2)
+    
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+class TractIndex:
+    """
+    Lazily loaded view of the tract cache.
+    
+    Each attribute is read from the cache (or built, for the STRtree) on first
+    access, so locating points only decodes the tract geometries and never the
+    attribute table.
+    
+    Args:
+        cache_dir (str): Directory of the tract cache
+    """
+    
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+    
+    def __len__(self):
+        return self.meta['n_tracts']
+    
+    @cached_property
+    def tracts(self):
+        """gpd.GeoDataFrame: Census tracts with their attributes, in tract_code order."""
+        return gpd.read_parquet(os.path.join(self.cache_dir, "tracts.parquet"))
+    
+    @cached_property
+    def geometries(self):
+        """np.ndarray: Tract geometries, decoded from WKB without the attribute table."""
+        table = pq.read_table(os.path.join(self.cache_dir, "tracts.parquet"), columns=['geometry'])
+        
+        return shapely.from_wkb(table.column('geometry').to_numpy())
+    
+    @cached_property
+    def bounds(self):
+        """np.ndarray: (n_tracts, 4) array of minx, miny, maxx, maxy."""
+        return np.load(os.path.join(self.cache_dir, "bounds.npy"), mmap_mode='r')
+    
+    @cached_property
+    def centroids(self):
+        """np.ndarray: (n_tracts, 2) array of centroid x, y."""
+        return np.load(os.path.join(self.cache_dir, "centroids.npy"), mmap_mode='r')
+    
+    @cached_property
+    def grid(self):
+        """np.ndarray: (n_rows, n_cols) lookup grid of tract positions, NO_TRACT or BOUNDARY_CELL."""
+        return np.load(os.path.join(self.cache_dir, "grid.npy"), mmap_mode='r')
+    
+    @cached_property
+    def tree(self):
+        """shapely.STRtree: Spatial index over the tract geometries."""
+        # STRtree cannot be serialized without rebuilding it (its pickle re-packs
+        # the geometries), so it is built from the cached WKB on first use
+        return shapely.STRtree(self.geometries)
+    
+    @cached_property
+    def projection_scale(self):
+        """np.ndarray: Meters per degree of longitude and latitude at the center of the tracts."""
+        center_lat = (self.bounds[:, 1].min() + self.bounds[:, 3].max()) / 2
+        
+        return np.array([METERS_PER_DEGREE * np.cos(np.radians(center_lat)), METERS_PER_DEGREE])
+    
+    @cached_property
+    def projected_geometries(self):
+        """np.ndarray: Tract geometries in local planar meters."""
+        scale = self.projection_scale
+        
+        return shapely.transform(self.geometries, lambda coords: coords * scale)
+    
+    @cached_property
+    def vertex_tree(self):
+        """tuple: (cKDTree over tract boundary vertices in meters, tract position of each vertex)."""
+        # Boundaries are densified so that every boundary point lies within half
+        # the vertex spacing of an indexed vertex
+        boundaries = shapely.segmentize(shapely.boundary(self.projected_geometries), SNAP_VERTEX_SPACING)
+        vertices, vertex_tracts = shapely.get_coordinates(boundaries, return_index=True)
+        
+        return cKDTree(vertices), vertex_tracts.astype(np.int32)
+    
+    def snap(self, lon, lat, tolerance):
+        """
+        Find the nearest tract to each point, within a tolerance.
+        
+        Tracts with a boundary vertex near a point are found with a KD-tree,
+        and only those candidates are measured exactly. Meant for the few
+        points that locate did not place in any tract.
+        
+        Args:
+            lon (array-like): Point longitudes
+            lat (array-like): Point latitudes
+            tolerance (float): Maximum distance to a tract in meters
+        
+        Returns:
+            tuple: (codes, distances) with the int32 tract_code of the nearest tract (-1 if none is
+                within the tolerance) and the float64 distance to it in meters (NaN if none)
+        """
+        xy = np.column_stack([np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)])
+        codes = np.full(len(xy), NO_TRACT, dtype=np.int32)
+        distances = np.full(len(xy), np.nan)
+        valid = np.flatnonzero(np.isfinite(xy).all(axis=1))
+        if len(valid) == 0:
+            return codes, distances
+        
+        # Candidate (point, tract) pairs from the boundary vertices within reach
+        tree, vertex_tracts = self.vertex_tree
+        xy = xy[valid] * self.projection_scale
+        neighbours = tree.query_ball_point(xy, r=tolerance + SNAP_VERTEX_SPACING / 2)
+        counts = np.fromiter((len(n) for n in neighbours), dtype=np.int64, count=len(neighbours))
+        if counts.sum() == 0:
+            return codes, distances
+        point_idx = np.repeat(np.arange(len(xy)), counts)
+        tract_idx = vertex_tracts[np.concatenate([n for n in neighbours if n]).astype(np.intp)]
+        pairs = np.unique(point_idx.astype(np.int64) * len(self) + tract_idx)
+        point_idx, tract_idx = pairs // len(self), (pairs % len(self)).astype(np.int32)
+        
+        # Exact distances; the nearest tract wins, and the first tract on ties
+        pair_distances = shapely.distance(shapely.points(xy[point_idx]), self.projected_geometries[tract_idx])
+        order = np.lexsort((tract_idx, pair_distances, point_idx))
+        first = order[np.r_[True, point_idx[order][1:] != point_idx[order][:-1]]]
+        first = first[pair_distances[first] <= tolerance]
+        
+        codes[valid[point_idx[first]]] = tract_idx[first]
+        distances[valid[point_idx[first]]] = pair_distances[first]
+        
+        return codes, distances
+    
+    def locate(self, lon, lat, block_size=LOCATE_BLOCK_SIZE, envelope=None):
+        """
+        Find the tract containing each point.
+        
+        Points are first looked up in the lookup grid. Only points in boundary
+        cells are tested against the tract geometries, in blocks of raw
+        coordinates so that one block of point geometries is alive at a time.
+        
+        Args:
+            lon (array-like): Point longitudes
+            lat (array-like): Point latitudes
+            block_size (int): Number of points per STRtree query
+            envelope (tuple): (minx, miny, maxx, maxy) of the points, to test them
+                against only the tracts intersecting it (None tests all tracts)
+        
+        Returns:
+            np.ndarray: int32 tract_code per point, -1 where no tract contains the point
+        """
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        
+        # Grid lookup; points outside the grid (or without coordinates) are in no tract
+        grid = self.grid
+        cell_size = self.meta['grid_cell_size']
+        col = np.floor((lon - self.meta['grid_origin'][0]) / cell_size)
+        row = np.floor((lat - self.meta['grid_origin'][1]) / cell_size)
+        on_grid = (col >= 0) & (col < grid.shape[1]) & (row >= 0) & (row < grid.shape[0])
+        codes = np.full(len(lon), NO_TRACT, dtype=np.int32)
+        codes[on_grid] = grid[row[on_grid].astype(np.intp), col[on_grid].astype(np.intp)]
+        
+        exact = np.flatnonzero(codes == BOUNDARY_CELL)
+        codes[exact] = NO_TRACT
+        if len(exact) == 0:
+            return codes
+        
+        # Candidate tracts stay in tract_code order, so the first match still wins
+        if envelope is None:
+            tree, candidates = self.tree, None
+        else:
+            minx, miny, maxx, maxy = envelope
+            bounds = self.bounds
+            candidates = np.flatnonzero(
+                (bounds[:, 0] <= maxx) & (bounds[:, 2] >= minx) & (bounds[:, 1] <= maxy) & (bounds[:, 3] >= miny)
+            )
+            tree = shapely.STRtree(self.geometries[candidates])
+        
+        # Exact point-in-polygon tests for the points in boundary cells
+        for start in range(0, len(exact), block_size):
+            block = exact[start:start + block_size]
+            points = shapely.points(lon[block], lat[block])
+            point_idx, tract_idx = tree.query(points, predicate='within')
+            if candidates is not None:
+                tract_idx = candidates[tract_idx]
+            
+            # Where tracts overlap, the first match wins
+            codes[block[point_idx[::-1]]] = tract_idx[::-1]
+        
+        return codes
+
+def _zorder_keys(lon, lat, extent, level=ZORDER_LEVEL):
+    """Interleave the bits of quantized coordinates into Z-order (Morton) tile keys."""
+    minx, miny, maxx, maxy = extent
+    n_tiles = 1 << level
+    keys = np.zeros(len(lon), dtype=np.uint32)
+    for shift, values, low, high in ((0, lon, minx, maxx), (1, lat, miny, maxy)):
+        tile = np.clip((values - low) / (high - low) * n_tiles, 0, n_tiles - 1).astype(np.uint32)
+        for bit in range(level):
+            keys |= ((tile >> bit) & 1) << (2 * bit + shift)
+    
+    return keys
+
+def _locate_shard(cache_dir, lon, lat):
+    """Locate one spatial shard of points in a worker process."""
+    index = _open_indexes.get(cache_dir)
+    if index is None:
+        index = _open_indexes[cache_dir] = TractIndex(cache_dir)
+    envelope = (lon.min(), lat.min(), lon.max(), lat.max())
+    
+    return index.locate(lon, lat, envelope=envelope)
+
+def locate_parallel(lon, lat, cache_dir=CACHE_DIR, n_workers=None):
+    """
+    Find the tract containing each point with a pool of worker processes.
+    
+    Points are sorted into Z-order tiles and cut into shards of equal size,
+    so each shard covers a compact area. Each worker opens the tract cache
+    once and tests its shards only against the tracts intersecting the shard
+    envelope. Results are put back in the original point order.
+    
+    Args:
+        lon (array-like): Point longitudes
+        lat (array-like): Point latitudes
+        cache_dir (str): Directory of the tract cache
+        n_workers (int): Number of worker processes (all cores if None)
+    
+    Returns:
+        np.ndarray: int32 tract_code per point, -1 where no tract contains the point
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    n_workers = n_workers or os.cpu_count() or 1
+    
+    if n_workers <= 1 or len(lon) < PARALLEL_MIN_POINTS:
+        return load_tract_index(cache_dir).locate(lon, lat)
+    
+    # Points without coordinates are in no tract and are not shipped to workers
+    codes = np.full(len(lon), NO_TRACT, dtype=np.int32)
+    valid = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+    if len(valid) == 0:
+        return codes
+    
+    bounds = np.load(os.path.join(cache_dir, "bounds.npy"), mmap_mode='r')
+    extent = (bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max())
+    order = valid[np.argsort(_zorder_keys(lon[valid], lat[valid], extent), kind='stable')]
+    shards = np.array_split(order, min(n_workers * SHARDS_PER_WORKER, len(order)))
+    
+    # Forked workers must not inherit a writer thread in the middle of a write
+    artifact_writer.flush()
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = executor.map(
+            _locate_shard, [cache_dir] * len(shards), [lon[shard] for shard in shards], [lat[shard] for shard in shards]
+        )
+        for shard, shard_codes in zip(shards, results):
+            codes[shard] = shard_codes
+    
+    return codes
+
+def load_tract_index(cache_dir=CACHE_DIR):
+    """
+    Open the tract cache without reading any of its data yet.
+    
+    Args:
+        cache_dir (str): Directory of the tract cache
+    
+    Returns:
+        TractIndex: Lazily loaded tract cache
+    """
+    return TractIndex(cache_dir)
@@ -7,13 +7,17 @@ This module provides functions to create various visualizations for flood-relate
 
 import pandas as pd
 import numpy as np
-import geopandas as gpd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.patches import Rectangle
 
+import artifact_writer
+import complaint_arrays
+import complaint_cube
+import task_graph
+
 # Constants
 DATA_DIR = "../data"
 FIGURES_DIR = "../figures"
@@ -164,24 +168,41 @@ def create_heatmap(df, title, filename, figsize=(12, 10)):
     plt.savefig(os.path.join(FIGURES_DIR, filename), dpi=300)
     plt.close()
 
+def daily_complaint_counts(df):
+    """
+    Count complaints per day.
+    
+    Args:
+        df (pd.DataFrame or complaint_cube.ComplaintCube): DataFrame with a Created Date column,
+            or the complaint cube
+    
+    Returns:
+        pd.Series: Number of complaints per date
+    """
+    if isinstance(df, complaint_cube.ComplaintCube):
+        return df.series('day')
+    
+    # Convert Created Date to datetime if needed
+    if not pd.api.types.is_datetime64_any_dtype(df['Created Date']):
+        df['Created Date'] = pd.to_datetime(df['Created Date'])
+    
+    return df.groupby(df['Created Date'].dt.normalize()).size()
+
 def create_time_series(df, title, filename, figsize=(12, 6)):
     """
     Create a time series plot of complaints by date.
     
     Args:
-        df (pd.DataFrame): DataFrame with a Created Date column
+        df (pd.DataFrame or complaint_cube.ComplaintCube): DataFrame with a Created Date column,
+            or the complaint cube
         title (str): Title for the plot
         filename (str): Output filename
         figsize (tuple): Figure size
     """
     print("Creating time series plot...")
     
-    # Convert Created Date to datetime if needed
-    if not pd.api.types.is_datetime64_any_dtype(df['Created Date']):
-        df['Created Date'] = pd.to_datetime(df['Created Date'])
-    
-    # Group by date and count
-    daily_counts = df.groupby(df['Created Date'].dt.date).size()
+    # Count complaints by date
+    daily_counts = daily_complaint_counts(df)
     
     # Create the plot
     fig, ax = plt.subplots(figsize=figsize)
@@ -210,20 +231,17 @@ def create_monthly_pattern(df, title, filename, figsize=(12, 6)):
     Create a bar chart of complaints by month.
     
     Args:
-        df (pd.DataFrame): DataFrame with a Created Date column
+        df (pd.DataFrame or complaint_cube.ComplaintCube): DataFrame with a Created Date column,
+            or the complaint cube
         title (str): Title for the plot
         filename (str): Output filename
         figsize (tuple): Figure size
     """
     print("Creating monthly pattern plot...")
     
-    # Convert Created Date to datetime if needed
-    if not pd.api.types.is_datetime64_any_dtype(df['Created Date']):
-        df['Created Date'] = pd.to_datetime(df['Created Date'])
-    
-    # Extract month and count
-    df['Month'] = df['Created Date'].dt.month
-    monthly_counts = df.groupby('Month').size()
+    # Roll the daily counts up by month
+    daily_counts = daily_complaint_counts(df)
+    monthly_counts = daily_counts.groupby(daily_counts.index.month).sum()
     
     # Create the plot
     fig, ax = plt.subplots(figsize=figsize)
@@ -254,20 +272,17 @@ def create_weekly_pattern(df, title, filename, figsize=(12, 6)):
     Create a bar chart of complaints by day of week.
     
     Args:
-        df (pd.DataFrame): DataFrame with a Created Date column
+        df (pd.DataFrame or complaint_cube.ComplaintCube): DataFrame with a Created Date column,
+            or the complaint cube
         title (str): Title for the plot
         filename (str): Output filename
         figsize (tuple): Figure size
     """
     print("Creating weekly pattern plot...")
     
-    # Convert Created Date to datetime if needed
-    if not pd.api.types.is_datetime64_any_dtype(df['Created Date']):
-        df['Created Date'] = pd.to_datetime(df['Created Date'])
-    
-    # Extract day of week and count
-    df['DayOfWeek'] = df['Created Date'].dt.dayofweek
-    weekly_counts = df.groupby('DayOfWeek').size()
+    # Roll the daily counts up by day of week
+    daily_counts = daily_complaint_counts(df)
+    weekly_counts = daily_counts.groupby(daily_counts.index.dayofweek).sum()
     
     # Create the plot
     fig, ax = plt.subplots(figsize=figsize)
@@ -297,7 +312,8 @@ def create_complaint_type_distribution(df, title, filename, figsize=(12, 8)):
     Create a bar chart of complaints by type.
     
     Args:
-        df (pd.DataFrame): DataFrame with a Complaint Type column
+        df (pd.DataFrame or complaint_cube.ComplaintCube): DataFrame with a Complaint Type column,
+            or the complaint cube
         title (str): Title for the plot
         filename (str): Output filename
         figsize (tuple): Figure size
@@ -305,7 +321,11 @@ def create_complaint_type_distribution(df, title, filename, figsize=(12, 8)):
     print("Creating complaint type distribution plot...")
     
     # Count complaints by type
-    type_counts = df['Complaint Type'].value_counts().head(10)
+    if isinstance(df, complaint_cube.ComplaintCube):
+        type_counts = df.series('type').iloc[:-1].sort_values(ascending=False, kind='stable').head(10)
+        type_counts.index.name = 'Complaint Type'
+    else:
+        type_counts = df['Complaint Type'].value_counts().head(10)
     
     # Create the plot
     fig, ax = plt.subplots(figsize=figsize)
@@ -326,88 +346,127 @@ def create_complaint_type_distribution(df, title, filename, figsize=(12, 8)):
     plt.savefig(os.path.join(FIGURES_DIR, filename), dpi=300)
     plt.close()
 
-def visualize_data(complaints_df, aggregated_gdf):
+def render_figure(create, *args, **kwargs):
     """
-    Create all visualizations for the analysis.
+    Run a figure function as a task, holding the pyplot lock of thread pools.
+    
+    Args:
+        create (callable): Figure function (create_*)
+        *args: Positional arguments of create
+        **kwargs: Keyword arguments of create
+    """
+    with task_graph.PYPLOT_LOCK:
+        create(*args, **kwargs)
+
+def render_complaint_figure(create, complaints_df, period, source, title, filename):
+    """
+    Run a complaint-level figure function as a task, loading its data in the task.
+    
+    Args:
+        create (callable): Figure function (create_*)
+        complaints_df (pd.DataFrame): Complaint data (None to load the source)
+        period (str): Year or date-range label of the source
+        source (str): 'arrays' for the complaint arrays, 'cube' for the complaint cube
+        title (str): Title for the figure
+        filename (str): Output filename
+    """
+    if complaints_df is None:
+        if source == 'arrays':
+            complaints_df = complaint_arrays.load_complaint_frame(period)
+        else:
+            complaints_df = complaint_cube.load_complaint_cube(period)
+    
+    render_figure(create, complaints_df, title, filename)
+
+def add_visualization_tasks(graph, complaints_df, aggregated_gdf, period=2019, resolution=50, prefix='visualization'):
+    """
+    Add one task per figure to a task graph.
     
     Args:
-        complaints_df (pd.DataFrame): DataFrame with complaint data
+        graph (task_graph.TaskGraph): Graph to add the tasks to
+        complaints_df (pd.DataFrame): DataFrame with complaint data (None to only create the tract maps)
         aggregated_gdf (gpd.GeoDataFrame): GeoDataFrame with aggregated complaint data
+        period (str): Year or date-range label shown in titles
+        resolution (int): Resolution of the pixel maps
+        prefix (str): Prefix of the task names
+    
+    Returns:
+        list: Names of the added tasks
     """
     # Ensure directories exist
     ensure_dirs()
     
-    # Create choropleth maps
-    create_choropleth_map(
-        aggregated_gdf,
-        'complaint_count',
-        'NYC Flood-Related 311 Complaints (2019) - Count by Census Tract',
-        'flood_complaints_count_choropleth.png'
-    )
-    
-    create_choropleth_map(
-        aggregated_gdf,
-        'complaint_rate',
-        'NYC Flood-Related 311 Complaints (2019) - Rate by Census Tract',
-        'flood_complaints_rate_choropleth.png',
-        cmap='YlOrRd'
-    )
-    
-    # Create simplified pixel maps
-    create_simplified_pixel_map(
-        aggregated_gdf,
-        'complaint_count',
-        'NYC Flood-Related 311 Complaints (2019) - Count Pixel Map',
-        'flood_complaints_count_pixel.png'
-    )
-    
-    create_simplified_pixel_map(
-        aggregated_gdf,
-        'complaint_rate',
-        'NYC Flood-Related 311 Complaints (2019) - Rate Pixel Map',
-        'flood_complaints_rate_pixel.png',
-        cmap='YlOrRd'
-    )
-    
-    # Create heatmap
-    create_heatmap(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Heatmap',
-        'flood_complaints_heatmap.png'
-    )
-    
-    # Create time series
-    create_time_series(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Daily Counts',
-        'flood_complaints_time_series.png'
-    )
-    
-    # Create monthly pattern
-    create_monthly_pattern(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Monthly Pattern',
-        'flood_complaints_monthly_pattern.png'
-    )
-    
-    # Create weekly pattern
-    create_weekly_pattern(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Weekly Pattern',
-        'flood_complaints_weekly_pattern.png'
-    )
-    
-    # Create complaint type distribution
-    create_complaint_type_distribution(
-        complaints_df,
-        'NYC Flood-Related 311 Complaints (2019) - Top 10 Complaint Types',
-        'flood_complaints_type_distribution.png'
-    )
+    names = []
+    
+    def add(name, func, *args, filename, **kwargs):
+        graph.add(f"{prefix}.{name}", func, *args, outputs=[os.path.join(FIGURES_DIR, filename)], **kwargs)
+        names.append(f"{prefix}.{name}")
+    
+    # Choropleth maps and pixel maps
+    for column, cmap in [('count', 'viridis'), ('rate', 'YlOrRd')]:
+        filename = f'flood_complaints_{column}_choropleth.png'
+        add(f'{column}_choropleth', render_figure, create_choropleth_map, aggregated_gdf, f'complaint_{column}',
+            f'NYC Flood-Related 311 Complaints ({period}) - {column.capitalize()} by Census Tract', filename,
+            cmap=cmap, filename=filename)
+        filename = f'flood_complaints_{column}_pixel.png'
+        add(f'{column}_pixel', render_figure, create_simplified_pixel_map, aggregated_gdf, f'complaint_{column}',
+            f'NYC Flood-Related 311 Complaints ({period}) - {column.capitalize()} Pixel Map', filename,
+            resolution=resolution, cmap=cmap, filename=filename)
+    
+    # Complaint-level charts need the complaints (not kept by the fused pipeline by default)
+    if complaints_df is None:
+        print("No complaint-level data, skipping heatmap and temporal charts")
+        return names
+    
+    # The heatmap reads the complaint arrays, the temporal and type charts roll the complaint cube up;
+    # tasks load these themselves rather than receiving a copy of the complaints
+    heatmap_df = None if complaint_arrays.has_complaint_arrays(period) else complaints_df
+    chart_data = None if complaint_cube.has_complaint_cube(period) else complaints_df
+    
+    add('heatmap', render_complaint_figure, create_heatmap, heatmap_df, period, 'arrays',
+        f'NYC Flood-Related 311 Complaints ({period}) - Heatmap', 'flood_complaints_heatmap.png',
+        filename='flood_complaints_heatmap.png')
+    
+    charts = [
+        ('time_series', create_time_series, 'Daily Counts'),
+        ('monthly_pattern', create_monthly_pattern, 'Monthly Pattern'),
+        ('weekly_pattern', create_weekly_pattern, 'Weekly Pattern'),
+        ('type_distribution', create_complaint_type_distribution, 'Top 10 Complaint Types')
+    ]
+    for name, create, label in charts:
+        filename = f'flood_complaints_{name}.png'
+        add(name, render_complaint_figure, create, chart_data, period, 'cube',
+            f'NYC Flood-Related 311 Complaints ({period}) - {label}', filename, filename=filename)
+    
+    return names
+
+def visualize_data(complaints_df, aggregated_gdf, period=2019, resolution=50, max_workers=1,
+                   executor=task_graph.DEFAULT_EXECUTOR):
+    """
+    Create all visualizations for the analysis.
+    
+    Args:
+        complaints_df (pd.DataFrame): DataFrame with complaint data (None to only create the tract maps)
+        aggregated_gdf (gpd.GeoDataFrame): GeoDataFrame with aggregated complaint data
+        period (str): Year or date-range label shown in titles
+        resolution (int): Resolution of the pixel maps
+        max_workers (int): Number of figures created concurrently
+        executor (str): 'process' or 'thread' pool
+    
+    Raises:
+        RuntimeError: If any figure failed (the other figures are still created)
+    """
+    graph = task_graph.TaskGraph()
+    add_visualization_tasks(graph, complaints_df, aggregated_gdf, period, resolution)
+    
+    run = task_graph.run_tasks(graph, max_workers=max_workers, executor=executor)
+    if run.failed:
+        raise RuntimeError(f"{len(run.failed)} figures failed: {', '.join(run.failed)}")
 
 if __name__ == "__main__":
     # Load processed data
-    complaints_df = pd.read_csv(os.path.join(DATA_DIR, "processed", "flood_complaints_2019.csv"))
-    aggregated_gdf = gpd.read_file(os.path.join(DATA_DIR, "processed", "aggregated_flood_complaints_2019.geojson"))
+    complaints_df = artifact_writer.read_artifact(os.path.join(DATA_DIR, "processed", "flood_complaints_2019"))
+    aggregated_gdf = artifact_writer.read_artifact(os.path.join(DATA_DIR, "processed", "aggregated_flood_complaints_2019"))
     
     # Create visualizations
     visualize_data(complaints_df, aggregated_gdf)
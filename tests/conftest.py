@@ -0,0 +1,8 @@
+"""
+Shared pytest setup: the scripts are flat modules importing their siblings, so scripts/ goes on sys.path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
@@ -0,0 +1,126 @@
+"""
+Tests for the complaint cube: rollups, series and slices against a pandas groupby of the complaints.
+"""
+
+import pandas as pd
+import numpy as np
+
+import pytest
+
+import complaint_arrays
+import complaint_cube
+
+N_TRACTS = 5
+MISSING = '<missing>'
+COLUMNS = {'tract': 'tract_code', 'type': 'Complaint Type', 'subcategory': 'flood_subcategory', 'status': 'Status'}
+
+@pytest.fixture
+def complaints():
+    """Complaints over a few weeks with missing dates, tracts, types, sub-categories and statuses."""
+    rng = np.random.default_rng(0)
+    n = 500
+    created = pd.Timestamp('2021-07-01') + pd.to_timedelta(rng.integers(0, 20 * 24, n), unit='h')
+    created = pd.Series(created).mask(rng.random(n) < 0.05)
+    
+    def pick(values, p_missing):
+        """Random values, missing with probability p_missing."""
+        return pd.Series(rng.choice(values, n)).mask(rng.random(n) < p_missing)
+    
+    return pd.DataFrame({
+        'Latitude': rng.uniform(40.6, 40.8, n),
+        'Longitude': rng.uniform(-74.0, -73.8, n),
+        'Created Date': created,
+        'Complaint Type': pick(['Sewer', 'Water System', 'Street Condition'], 0.05),
+        'Status': pick(['Open', 'Pending', 'Closed'], 0.05),
+        'flood_subcategory': pick(['sewer', 'street flooding', 'leak'], 0.2),
+        'tract_code': np.where(rng.random(n) < 0.1, -1, rng.integers(0, N_TRACTS, n)).astype(np.int32)
+    })
+
+@pytest.fixture(params=['dense', 'sparse'])
+def cube(request, complaints, tmp_path, monkeypatch):
+    """The cube exported from the complaint arrays, stored dense or sparse."""
+    monkeypatch.setattr(complaint_arrays, 'PROCESSED_DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(complaint_cube, 'PROCESSED_DATA_DIR', str(tmp_path))
+    if request.param == 'sparse':
+        monkeypatch.setattr(complaint_cube, 'DENSE_MAX_CELLS', 0)
+    
+    complaint_arrays.export_complaint_arrays(complaints, complaints['tract_code'].to_numpy(), period='test')
+    complaint_cube.export_complaint_cube(N_TRACTS, period='test')
+    cube = complaint_cube.load_complaint_cube('test')
+    assert cube.is_dense == (request.param == 'dense')
+    
+    return cube
+
+def labelled(complaints):
+    """Complaints with a column per cube dimension, missing labels spelled out and undated complaints dropped."""
+    frame = pd.DataFrame({dim: complaints[column] for dim, column in COLUMNS.items()})
+    frame['day'] = complaints['Created Date'].dt.normalize()
+    for dim in ['type', 'subcategory', 'status']:
+        frame[dim] = frame[dim].astype(object).fillna(MISSING)
+    
+    return frame[frame['day'].notna()]
+
+def groupby_counts(frame, dims):
+    """Count complaints per combination of the dimensions with a pandas groupby."""
+    counts = frame.groupby(list(dims)).size()
+    
+    return {key if isinstance(key, tuple) else (key,): int(n) for key, n in counts.items()}
+
+def cube_counts(cube, dims, **selections):
+    """Label the non-zero counts of a cube rollup."""
+    index = pd.MultiIndex.from_product(
+        [[MISSING if pd.isna(label) else label for label in cube.index(dim)] for dim in dims]
+    )
+    rolled = cube.rollup(*dims, **selections).ravel()
+    
+    return {key: int(n) for key, n in zip(index, rolled) if n}
+
+@pytest.mark.parametrize('dims', [
+    ('tract',), ('day',), ('type', 'status'), ('status', 'type'), ('subcategory', 'day', 'tract'),
+    ('tract', 'day', 'type', 'subcategory', 'status')
+])
+def test_rollup_matches_groupby(cube, complaints, dims):
+    assert cube_counts(cube, dims) == groupby_counts(labelled(complaints), dims)
+
+def test_rollup_without_dims_is_total(cube, complaints):
+    assert cube.rollup().shape == ()
+    assert int(cube.rollup()) == cube.total == complaints['Created Date'].notna().sum()
+
+@pytest.mark.parametrize('dims', [('day',), ('type', 'status'), ('tract', 'status')])
+def test_rollup_with_selections_matches_filtered_groupby(cube, complaints, dims):
+    frame = labelled(complaints)
+    days = pd.to_datetime(['2021-07-03', '2021-07-10', '2021-07-11'])
+    selected = frame[frame['status'].isin(['Open', 'Pending']) & frame['tract'].isin([0, 3, -1])
+                     & frame['day'].isin(days)]
+    
+    counts = cube_counts(cube, dims, status=['Open', 'Pending', 'Unknown'], tract=[0, 3, -1], day=days)
+    
+    assert counts == groupby_counts(selected, dims)
+
+def test_series_matches_groupby(cube, complaints):
+    frame = labelled(complaints)
+    
+    series = cube.series('day', type=['Sewer'])
+    
+    expected = frame[frame['type'] == 'Sewer'].groupby('day').size()
+    assert series.index[0] == frame['day'].min() and series.index[-1] == frame['day'].max()
+    pd.testing.assert_series_equal(
+        series[series > 0], expected.rename('complaints').rename_axis('day'), check_dtype=False, check_freq=False
+    )
+
+def test_series_of_tracts_puts_outside_last(cube, complaints):
+    series = cube.series('tract')
+    
+    assert series.index.tolist() == [0, 1, 2, 3, 4, -1]
+    expected = labelled(complaints).groupby('tract').size().reindex(series.index, fill_value=0)
+    np.testing.assert_array_equal(series.to_numpy(), expected.to_numpy())
+
+def test_slice_matches_filtered_groupby(cube, complaints):
+    frame = labelled(complaints)
+    
+    sliced = cube.slice(type=['Sewer', 'Water System'], tract=[1, 2])
+    
+    selected = frame[frame['type'].isin(['Sewer', 'Water System']) & frame['tract'].isin([1, 2])]
+    assert sliced.shape == cube.shape and sliced.is_dense == cube.is_dense
+    assert sliced.total == len(selected)
+    assert cube_counts(sliced, ('tract', 'day', 'status')) == groupby_counts(selected, ('tract', 'day', 'status'))
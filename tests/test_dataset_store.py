@@ -0,0 +1,114 @@
+"""
+Tests for the partitioned raw data store: upserts and recovery from interrupted replaces.
+"""
+
+import pandas as pd
+import os
+
+import pytest
+
+import dataset_store
+
+def make_records(keys, created, boroughs, statuses=None):
+    """311 records with the columns the store partitions on."""
+    return pd.DataFrame({
+        'Unique Key': pd.array(keys, dtype='int64'),
+        'Created Date': pd.to_datetime(created),
+        'Borough': boroughs,
+        'Status': statuses or ['Open'] * len(keys)
+    })
+
+def stored_records(root):
+    """Read the whole store, sorted by key."""
+    return dataset_store.read_partitions(root=root).sort_values('Unique Key').reset_index(drop=True)
+
+def store_listing(root):
+    """List every directory under the store, hidden ones included, relative to the root."""
+    return sorted(os.path.relpath(os.path.join(parent, name), root)
+                  for parent, names, _ in os.walk(root) for name in names)
+
+@pytest.fixture
+def store(tmp_path):
+    """A store with two records in Jan 2021 Brooklyn and one in Feb 2021 Queens."""
+    root = str(tmp_path / 'store')
+    dataset_store.write_partitions(make_records(
+        [1, 2, 3], ['2021-01-05', '2021-01-20', '2021-02-03'], ['BROOKLYN', 'BROOKLYN', 'QUEENS']
+    ), root=root)
+    
+    return root
+
+def test_upsert_moves_record_between_partitions(store):
+    moved = make_records([2], ['2021-02-10'], ['QUEENS'], statuses=['Closed'])
+    
+    written = dataset_store.upsert_partitions(moved, root=store)
+    
+    assert sorted(written) == sorted([
+        dataset_store.partition_dir(2021, 2, 'QUEENS', root=store),
+        dataset_store.partition_dir(2021, 1, 'BROOKLYN', root=store)
+    ])
+    records = stored_records(store)
+    assert records['Unique Key'].tolist() == [1, 2, 3]
+    assert records.loc[1, 'Status'] == 'Closed'
+    partitions = dataset_store.list_partitions(store)
+    assert partitions[['year', 'month', 'borough']].values.tolist() == [[2021, 1, 'BROOKLYN'], [2021, 2, 'QUEENS']]
+    # Each touched partition is compacted into a single file
+    assert len(dataset_store.partition_files(partitions)) == 2
+
+def test_upsert_removes_emptied_partition(store):
+    moved = make_records([3], ['2021-01-25'], ['BROOKLYN'])
+    
+    dataset_store.upsert_partitions(moved, root=store)
+    
+    assert not os.path.exists(dataset_store.partition_dir(2021, 2, 'QUEENS', root=store))
+    assert stored_records(store)['Unique Key'].tolist() == [1, 2, 3]
+
+def test_upsert_searches_only_previous_months(store):
+    moved = make_records([2], ['2021-02-10'], ['QUEENS'])
+    
+    # Pointing the search at the wrong month leaves the earlier version in place
+    dataset_store.upsert_partitions(moved, root=store, previous_months=[2021 * 12 + 2])
+    
+    assert stored_records(store)['Unique Key'].tolist() == [1, 2, 2, 3]
+
+@pytest.mark.parametrize('fail_on', [1, 2])
+def test_interrupted_replace_is_recovered(store, monkeypatch, fail_on):
+    path = dataset_store.partition_dir(2021, 1, 'BROOKLYN', root=store)
+    replace = os.replace
+    calls = []
+    
+    def interrupted_replace(src, dst):
+        calls.append(src)
+        if len(calls) == fail_on:
+            raise KeyboardInterrupt
+        replace(src, dst)
+    
+    monkeypatch.setattr(dataset_store.os, 'replace', interrupted_replace)
+    with pytest.raises(KeyboardInterrupt):
+        dataset_store.upsert_partitions(make_records([1], ['2021-01-05'], ['BROOKLYN'], ['Closed']), root=store)
+    monkeypatch.setattr(dataset_store.os, 'replace', replace)
+    
+    month_dir = os.path.dirname(path)
+    hidden = sorted(name for name in os.listdir(month_dir) if name.startswith('.'))
+    assert hidden == (['.tmp-borough=BROOKLYN'] if fail_on == 1 else ['.old-borough=BROOKLYN', '.tmp-borough=BROOKLYN'])
+    assert os.path.isdir(path) == (fail_on == 1)
+    
+    # Listing the store restores the records the replace had moved aside
+    records = stored_records(store)
+    assert records['Unique Key'].tolist() == [1, 2, 3]
+    assert records['Status'].tolist() == ['Open', 'Open', 'Open']
+    assert not any('.old-' in entry or '.tmp-' in entry for entry in store_listing(store))
+    
+    # The retried upsert then succeeds
+    dataset_store.upsert_partitions(make_records([1], ['2021-01-05'], ['BROOKLYN'], ['Closed']), root=store)
+    assert stored_records(store)['Status'].tolist() == ['Closed', 'Open', 'Open']
+
+def test_upsert_recovers_partition_left_aside(store):
+    path = dataset_store.partition_dir(2021, 1, 'BROOKLYN', root=store)
+    parent, name = os.path.split(path)
+    os.replace(path, os.path.join(parent, f".old-{name}"))
+    
+    # The upsert merges into the restored partition instead of dropping its records
+    dataset_store.upsert_partitions(make_records([4], ['2021-01-30'], ['BROOKLYN']), root=store)
+    
+    assert stored_records(store)['Unique Key'].tolist() == [1, 2, 3, 4]
+    assert not os.path.exists(os.path.join(parent, f".old-{name}"))
@@ -0,0 +1,102 @@
+"""
+Tests for the flood taxonomy: Aho-Corasick rule matching against plain substring filters.
+"""
+
+import pandas as pd
+import numpy as np
+
+import pytest
+
+import flood_taxonomy
+
+COMPLAINT_TYPES = [
+    'Sewer', 'Water System', 'Water Conservation', 'Water Quality', 'WATER LEAK', 'Plumbing', 'Noise - Residential',
+    'Street Condition', 'Drinking Water', 'Standing Water', 'Water Conservation Leak', 'Illegal Parking', 'Wet Paint'
+]
+DESCRIPTORS = [
+    'Street Flooding (SJ)', 'Catch Basin Clogged/Flooding (Use Comments) (SC)', 'Manhole Overflow (Use Comments) (SA1)',
+    'Ponding', 'Pothole', 'Loud Music/Party', 'Sewer Backup (Use Comments) (SA)', 'Hydrant Running Full (WA4)',
+    'Blocked Hydrant', 'Water Quality Complaint', 'Highway Flooding (SH)', None
+]
+
+def baseline_is_flood(complaint_types):
+    """The substring filter on Complaint Type that the taxonomy replaced."""
+    pattern = '|'.join(['flood', 'water', 'sewer', 'drain', 'basin', 'wet', 'leak', 'plumb'])
+    
+    return complaint_types.str.lower().str.contains(pattern, na=False).to_numpy()
+
+def substring_rule_ids(complaints_df, taxonomy=None):
+    """Classify row by row with plain substring tests, trying the rules in order."""
+    rules = [flood_taxonomy._normalize_rule(rule) for rule in (taxonomy or flood_taxonomy.DEFAULT_TAXONOMY)['rules']]
+    rule_ids = []
+    for _, row in complaints_df.iterrows():
+        rule_id = flood_taxonomy.NO_RULE
+        for i, rule in enumerate(rules):
+            texts = [str(row[field]).lower() for field in rule['fields'] if pd.notna(row.get(field))]
+            if any(keyword in text for keyword in rule['include'] for text in texts) and \
+                    not any(keyword in text for keyword in rule['exclude'] for text in texts):
+                rule_id = i
+                break
+        rule_ids.append(rule_id)
+    
+    return np.array(rule_ids, dtype=np.int16)
+
+@pytest.fixture
+def complaints():
+    """Every combination of the sample Complaint Types and Descriptors."""
+    types, descriptors = zip(*[(t, d) for t in COMPLAINT_TYPES for d in DESCRIPTORS])
+    
+    return pd.DataFrame({'Complaint Type': list(types), 'Descriptor': list(descriptors)})
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_classify_matches_substring_rules(complaints, categorical):
+    if categorical:
+        complaints = complaints.astype('category')
+    
+    rule_ids = flood_taxonomy.classify(complaints)
+    
+    np.testing.assert_array_equal(rule_ids, substring_rule_ids(complaints))
+    # Descriptors add flood complaints the Complaint Type alone does not reveal
+    by_descriptor = (rule_ids != flood_taxonomy.NO_RULE) & ~baseline_is_flood(complaints['Complaint Type'].astype(str))
+    assert set(complaints.loc[by_descriptor, 'Descriptor']) == {
+        'Street Flooding (SJ)', 'Catch Basin Clogged/Flooding (Use Comments) (SC)',
+        'Manhole Overflow (Use Comments) (SA1)', 'Ponding', 'Sewer Backup (Use Comments) (SA)', 'Highway Flooding (SH)'
+    }
+
+def test_classify_on_complaint_type_differs_from_baseline_by_excluded_phrases():
+    complaints = pd.DataFrame({'Complaint Type': COMPLAINT_TYPES + [None]})
+    
+    is_flood = flood_taxonomy.classify(complaints) != flood_taxonomy.NO_RULE
+    
+    differs = is_flood != baseline_is_flood(complaints['Complaint Type'])
+    assert complaints.loc[differs, 'Complaint Type'].tolist() == ['Water Conservation', 'Water Quality']
+
+def test_excluded_phrases_only_block_their_rule():
+    complaints = pd.DataFrame({
+        'Complaint Type': ['Water Conservation', 'WATER QUALITY', 'Water Conservation Leak', 'Drinking Water'],
+        'Descriptor': ['Leak in pipe', 'Cloudy', 'Other', 'Water Quality Complaint']
+    })
+    
+    rule_ids = flood_taxonomy.classify(complaints)
+    
+    # The water rule only looks at Complaint Type, so a Descriptor phrase does not exclude it
+    assert rule_ids[:2].tolist() == [flood_taxonomy.NO_RULE] * 2
+    assert list(flood_taxonomy.rule_labels(rule_ids[2:])) == ['leak', 'water']
+    assert list(flood_taxonomy.subcategory_labels(rule_ids[2:])) == ['leak', 'water']
+
+def test_custom_taxonomy_exclusion_on_descriptor(tmp_path):
+    path = tmp_path / 'taxonomy.json'
+    path.write_text(
+        '{"rules": [{"name": "hydrant", "fields": ["Descriptor"], "include": ["hydrant"], "exclude": ["blocked"]},'
+        ' {"name": "water", "keywords": ["water"]}]}'
+    )
+    taxonomy = flood_taxonomy.load_taxonomy(str(path))
+    complaints = pd.DataFrame({
+        'Complaint Type': ['Water System', 'Illegal Parking', 'Water System'],
+        'Descriptor': ['Hydrant Running Full (WA4)', 'Blocked Hydrant', 'Blocked Hydrant']
+    })
+    
+    rule_ids = flood_taxonomy.classify(complaints, taxonomy)
+    
+    np.testing.assert_array_equal(rule_ids, substring_rule_ids(complaints, taxonomy))
+    assert rule_ids.tolist() == [0, flood_taxonomy.NO_RULE, 1]
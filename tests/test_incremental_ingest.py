@@ -0,0 +1,122 @@
+"""
+Tests for incremental ingestion: the key index, the high-water mark and delta upserts.
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import os
+
+import pytest
+
+import dataset_store
+import incremental_ingest
+
+def make_records(keys, created, statuses, boroughs=None):
+    """311 records with the columns that are partitioned on and fingerprinted."""
+    return pd.DataFrame({
+        'Unique Key': pd.array(keys, dtype='int64'),
+        'Created Date': pd.to_datetime(created),
+        'Closed Date': pd.to_datetime([pd.NaT] * len(keys)),
+        'Borough': boroughs or ['BRONX'] * len(keys),
+        'Status': statuses
+    })
+
+@pytest.fixture
+def dirs(tmp_path):
+    """Store and state directories of a bulk import of three January records."""
+    store_root, state_dir = str(tmp_path / 'store'), str(tmp_path / 'state')
+    dataset_store.write_partitions(
+        make_records([1, 2, 3], ['2021-01-05', '2021-01-10', '2021-01-20'], ['Open'] * 3), root=store_root
+    )
+    
+    return store_root, state_dir
+
+def stored_records(root):
+    """Read the whole store, sorted by key."""
+    return dataset_store.read_partitions(root=root).sort_values('Unique Key').reset_index(drop=True)
+
+def test_bootstrap_watermark_uses_latest_month(dirs):
+    store_root, _ = dirs
+    dataset_store.write_partitions(make_records([9], ['2020-12-31'], ['Open']), root=store_root, mode='append')
+    
+    assert incremental_ingest.bootstrap_watermark(store_root) == {
+        'created_date': '2021-01-20T00:00:00', 'unique_key': 3
+    }
+    assert incremental_ingest.bootstrap_watermark(store_root + '_empty') is None
+
+def test_build_key_index_is_sorted_with_months(dirs):
+    store_root, _ = dirs
+    
+    keys, fingerprints, months = incremental_ingest.build_key_index(store_root)
+    
+    assert keys.tolist() == [1, 2, 3]
+    assert months.tolist() == [2021 * 12 + 1] * 3
+    assert fingerprints.dtype == np.uint64 and len(set(fingerprints)) == 1
+
+def test_load_key_index_requires_every_file(dirs):
+    _, state_dir = dirs
+    incremental_ingest.save_key_index(
+        np.array([1], dtype=np.int64), np.array([7], dtype=np.uint64), np.array([5], dtype=np.int32), state_dir
+    )
+    assert [array.tolist() for array in incremental_ingest.load_key_index(state_dir)] == [[1], [7], [5]]
+    
+    os.remove(os.path.join(state_dir, 'months.npy'))
+    assert incremental_ingest.load_key_index(state_dir) is None
+
+def test_ingest_writes_only_new_and_changed_records(dirs):
+    store_root, state_dir = dirs
+    batch = make_records(
+        [2, 3, 4, 4], ['2021-01-10', '2021-02-02', '2021-02-03', '2021-02-03'],
+        ['Open', 'Closed', 'Open', 'Closed']
+    )
+    
+    delta = incremental_ingest.ingest_incremental(batch, state_dir, store_root, refreshed_at='2021-02-04T00:00:00')
+    
+    # Record 2 is unchanged; 3 changed status and moved to February; 4 is new and deduplicated (last wins)
+    assert delta['Unique Key'].tolist() == [3, 4]
+    records = stored_records(store_root)
+    assert records['Unique Key'].tolist() == [1, 2, 3, 4]
+    assert records['Status'].tolist() == ['Open', 'Open', 'Closed', 'Closed']
+    assert dataset_store.list_partitions(store_root)['month'].tolist() == [1, 2]
+    
+    keys, fingerprints, months = incremental_ingest.load_key_index(state_dir)
+    assert keys.tolist() == [1, 2, 3, 4]
+    assert months.tolist() == [2021 * 12 + 1, 2021 * 12 + 1, 2021 * 12 + 2, 2021 * 12 + 2]
+    np.testing.assert_array_equal(fingerprints, incremental_ingest.record_fingerprints(records))
+    
+    with open(os.path.join(state_dir, 'watermark.json')) as f:
+        assert json.load(f) == {
+            'created_date': '2021-02-03T00:00:00', 'unique_key': 4, 'updated_at': '2021-02-04T00:00:00'
+        }
+
+def test_ingest_searches_previous_months_from_key_index(dirs, monkeypatch):
+    store_root, state_dir = dirs
+    incremental_ingest.ingest_incremental(make_records([5], ['2021-03-01'], ['Open']), state_dir, store_root)
+    searched = []
+    partitions_holding = dataset_store._partitions_holding
+    
+    def record_search(keys, root, key, months=None):
+        searched.append(None if months is None else list(months))
+        return partitions_holding(keys, root, key, months=months)
+    
+    monkeypatch.setattr(dataset_store, '_partitions_holding', record_search)
+    batch = make_records([1, 6], ['2021-03-05', '2021-03-06'], ['Closed', 'Open'])
+    incremental_ingest.ingest_incremental(batch, state_dir, store_root)
+    
+    # Only January holds an earlier version (of record 1); record 6 is new
+    assert searched == [[2021 * 12 + 1]]
+    assert stored_records(store_root)['Unique Key'].tolist() == [1, 2, 3, 5, 6]
+    assert dataset_store.list_partitions(store_root)['month'].tolist() == [1, 3]
+
+def test_ingest_of_unchanged_batch_keeps_watermark(dirs):
+    store_root, state_dir = dirs
+    incremental_ingest.save_watermark({'created_date': '2021-01-31T00:00:00', 'unique_key': 10}, state_dir)
+    
+    delta = incremental_ingest.ingest_incremental(
+        make_records([1, 2], ['2021-01-05', '2021-01-10'], ['Open', 'Open']), state_dir, store_root
+    )
+    
+    assert delta.empty
+    assert incremental_ingest.load_watermark(state_dir) == {'created_date': '2021-01-31T00:00:00', 'unique_key': 10}
+    assert incremental_ingest.load_key_index(state_dir)[0].tolist() == [1, 2, 3]
@@ -0,0 +1,169 @@
+"""
+Tests for the Socrata client against a local http.server stand-in for the NYC Open Data API.
+"""
+
+import pandas as pd
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+import requests
+
+import socrata_client
+
+N_ROWS = 25
+PAGE_SIZE = 10
+
+class SocrataHandler(BaseHTTPRequestHandler):
+    """
+    Serve a row count at <resource>.json and CSV pages at <resource>.csv.
+    
+    Queued failures are answered first, one per request, as (status, Retry-After)
+    pairs. Offsets in fail_offsets always fail with a 404.
+    """
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, *args):
+        pass
+    
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        with server.lock:
+            server.requests.append((url.path, params))
+            failure = server.failures.pop(0) if server.failures else None
+        
+        if failure is not None:
+            status, retry_after = failure
+            self._send(status, b'busy', {'Retry-After': retry_after} if retry_after is not None else None)
+        elif url.path.endswith('.json'):
+            self._send(200, json.dumps([{'row_count': str(len(server.rows))}]).encode())
+        elif int(params['$offset']) in server.fail_offsets:
+            self._send(404, b'not found')
+        else:
+            offset, limit = int(params['$offset']), int(params['$limit'])
+            self._send(200, server.rows.iloc[offset:offset + limit].to_csv(index=False).encode())
+
+@pytest.fixture
+def server():
+    """Run the stand-in API on a free localhost port."""
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), SocrataHandler)
+    httpd.rows = pd.DataFrame({'unique_key': range(1, N_ROWS + 1), 'status': ['Closed'] * N_ROWS})
+    httpd.requests = []
+    httpd.failures = []
+    httpd.fail_offsets = set()
+    httpd.lock = threading.Lock()
+    httpd.resource_url = f"http://127.0.0.1:{httpd.server_address[1]}/resource/test"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    
+    yield httpd
+    
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(socrata_client.time, 'sleep', delays.append)
+    
+    return delays
+
+def page_requests(server):
+    """List the (offset, limit) of the CSV page requests the server received."""
+    return sorted(
+        (int(params['$offset']), int(params['$limit'])) for path, params in server.requests if path.endswith('.csv')
+    )
+
+def read_pages(paths):
+    """Concatenate downloaded CSV pages."""
+    return pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+
+def test_download_pages_fetches_every_page(server, tmp_path, sleeps):
+    paths = socrata_client.download_pages(
+        server.resource_url, str(tmp_path), order='unique_key', page_size=PAGE_SIZE, max_workers=2
+    )
+    
+    assert [os.path.basename(path) for path in paths] == ['page_000000.csv', 'page_000001.csv', 'page_000002.csv']
+    assert page_requests(server) == [(0, 10), (10, 10), (20, 5)]
+    assert read_pages(paths)['unique_key'].tolist() == list(range(1, N_ROWS + 1))
+    assert all(params['$order'] == 'unique_key' for path, params in server.requests if path.endswith('.csv'))
+    assert sleeps == []
+
+def test_download_pages_stops_at_limit(server, tmp_path, sleeps):
+    paths = socrata_client.download_pages(server.resource_url, str(tmp_path), page_size=PAGE_SIZE, limit=12)
+    
+    assert page_requests(server) == [(0, 10), (10, 2)]
+    assert len(read_pages(paths)) == 12
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_fetch_retries_with_retry_after(server, sleeps, status):
+    server.failures = [(status, '3'), (status, None)]
+    
+    content = socrata_client.fetch(requests.Session(), f"{server.resource_url}.json", backoff=0.5)
+    
+    assert json.loads(content) == [{'row_count': str(N_ROWS)}]
+    assert len(server.requests) == 3
+    # The server's Retry-After delay wins over the backoff, which applies without one
+    assert sleeps[0] == 3.0
+    assert 1.0 <= sleeps[1] <= 1.5
+
+def test_fetch_gives_up_after_retries(server, sleeps):
+    server.failures = [(503, '0')] * 3
+    
+    with pytest.raises(requests.HTTPError):
+        socrata_client.fetch(requests.Session(), f"{server.resource_url}.json", retries=2)
+    
+    assert len(server.requests) == 3
+    assert sleeps == [0.0, 0.0]
+
+def test_fetch_does_not_retry_client_errors(server, sleeps):
+    server.failures = [(404, None)]
+    
+    with pytest.raises(requests.HTTPError):
+        socrata_client.fetch(requests.Session(), f"{server.resource_url}.json")
+    
+    assert len(server.requests) == 1
+    assert sleeps == []
+
+def test_download_pages_resumes_after_interruption(server, tmp_path, sleeps):
+    server.fail_offsets = {10}
+    with pytest.raises(requests.HTTPError):
+        socrata_client.download_pages(server.resource_url, str(tmp_path), page_size=PAGE_SIZE, max_workers=1)
+    
+    assert sorted(os.listdir(tmp_path)) == ['manifest.json', 'page_000000.csv', 'page_000002.csv']
+    with open(tmp_path / 'manifest.json') as f:
+        assert json.load(f)['total_rows'] == N_ROWS
+    
+    # The rerun reuses the manifest (no new row count) and fetches the missing page only
+    server.fail_offsets = set()
+    server.requests = []
+    paths = socrata_client.download_pages(server.resource_url, str(tmp_path), page_size=PAGE_SIZE, max_workers=1)
+    
+    assert [path for path, _ in server.requests] == ['/resource/test.csv']
+    assert page_requests(server) == [(10, 10)]
+    assert read_pages(paths)['unique_key'].tolist() == list(range(1, N_ROWS + 1))
+
+def test_download_pages_discards_checkpoints_of_another_query(server, tmp_path, sleeps):
+    socrata_client.download_pages(server.resource_url, str(tmp_path), page_size=PAGE_SIZE)
+    
+    server.requests = []
+    paths = socrata_client.download_pages(server.resource_url, str(tmp_path), where="status = 'Closed'",
+                                          page_size=PAGE_SIZE)
+    
+    assert len([path for path, _ in server.requests if path.endswith('.json')]) == 1
+    assert page_requests(server) == [(0, 10), (10, 10), (20, 5)]
+    assert len(read_pages(paths)) == N_ROWS
@@ -0,0 +1,134 @@
+"""
+Tests for the stage cache: key invalidation, stale outputs and LRU eviction.
+"""
+
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Point
+import importlib.util
+import os
+import sys
+
+import pytest
+
+import stage_cache
+
+@pytest.fixture
+def cache(tmp_path):
+    """An empty cache with no practical size bound."""
+    return stage_cache.StageCache(str(tmp_path / 'cache'))
+
+def load_module(path, name):
+    """Import a module from a file."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    
+    return module
+
+def write_file(path, text):
+    """Write a text file."""
+    with open(path, 'w') as f:
+        f.write(text)
+
+def test_stage_key_changes_with_params_inputs_and_code(tmp_path):
+    input_path = str(tmp_path / 'input.csv')
+    write_file(input_path, 'a\n1\n')
+    module_path = str(tmp_path / 'stage_module.py')
+    write_file(module_path, 'VALUE = 1\n')
+    module = load_module(module_path, 'stage_module')
+    
+    key = stage_cache.stage_key('filter', {'year': 2019}, [input_path], [module])
+    assert stage_cache.stage_key('filter', {'year': 2019}, [input_path], [module]) == key
+    assert stage_cache.stage_key('join', {'year': 2019}, [input_path], [module]) != key
+    assert stage_cache.stage_key('filter', {'year': 2020}, [input_path], [module]) != key
+    
+    write_file(input_path, 'a\n1\n2\n')
+    input_key = stage_cache.stage_key('filter', {'year': 2019}, [input_path], [module])
+    assert input_key != key
+    
+    write_file(module_path, 'VALUE = 2\n')
+    assert stage_cache.stage_key('filter', {'year': 2019}, [input_path], [module]) not in (key, input_key)
+    
+    # A missing input has its own key too
+    os.remove(input_path)
+    assert stage_cache.stage_key('filter', {'year': 2019}, [input_path], [module]) not in (key, input_key)
+
+def test_code_version_follows_local_imports():
+    # stage_cache imports artifact_writer and metrics from its directory, but not pandas
+    seen = stage_cache._local_modules(stage_cache, {})
+    
+    assert {'stage_cache', 'artifact_writer', 'metrics'} <= set(seen)
+    assert 'pandas' not in seen
+    assert stage_cache.code_version(stage_cache) == stage_cache.code_version(sys.modules['metrics'], stage_cache)
+
+def test_lookup_returns_stored_values(cache):
+    complaints = pd.DataFrame({'Unique Key': [1, 2], 'Status': ['Open', 'Closed']})
+    tracts = gpd.GeoDataFrame({'GEOID': ['a']}, geometry=[Point(-73.9, 40.7)], crs="EPSG:4326")
+    
+    cache.store('k1', 'filter', {'complaints': complaints, 'tracts': tracts, 'missing': None})
+    values = cache.lookup('k1')
+    
+    pd.testing.assert_frame_equal(values['complaints'], complaints)
+    assert isinstance(values['tracts'], gpd.GeoDataFrame)
+    assert values['tracts'].crs == tracts.crs
+    assert values['missing'] is None
+    assert cache.lookup('absent') is None
+
+@pytest.mark.parametrize('change', ['rewrite', 'delete'])
+def test_lookup_drops_entry_with_stale_output(cache, tmp_path, change):
+    output = str(tmp_path / 'flood_complaints.parquet')
+    write_file(output, 'written by the stage')
+    cache.store('k1', 'filter', {'complaints': pd.DataFrame({'a': [1]})}, outputs=[output])
+    assert cache.lookup('k1') is not None
+    
+    if change == 'rewrite':
+        # Another run rewrote the output with other parameters
+        write_file(output, 'written by another run')
+    else:
+        os.remove(output)
+    
+    assert cache.lookup('k1') is None
+    assert cache.keys() == []
+
+def test_run_records_outputs_written_in_output_dirs(cache, tmp_path):
+    out_dir = tmp_path / 'processed'
+    out_dir.mkdir()
+    write_file(str(out_dir / 'old.csv'), 'untouched')
+    calls = []
+    
+    def stage():
+        calls.append(1)
+        write_file(str(out_dir / 'new.csv'), 'written')
+        return {'result': pd.DataFrame({'a': [1]})}
+    
+    assert cache.run('stage', stage, params={'p': 1}, output_dirs=[str(out_dir)])[1] is False
+    assert cache.run('stage', stage, params={'p': 1}, output_dirs=[str(out_dir)])[1] is True
+    assert len(calls) == 1
+    
+    # Only the file the stage wrote is checked, so touching another one keeps the entry
+    write_file(str(out_dir / 'old.csv'), 'changed elsewhere')
+    assert cache.run('stage', stage, params={'p': 1}, output_dirs=[str(out_dir)])[1] is True
+    write_file(str(out_dir / 'new.csv'), 'rewritten')
+    _, hit = cache.run('stage', stage, params={'p': 1}, output_dirs=[str(out_dir)])
+    assert hit is False and len(calls) == 2
+
+def test_evict_removes_least_recently_used(cache):
+    frame = pd.DataFrame({'a': range(1000)})
+    for i, key in enumerate(['k1', 'k2', 'k3']):
+        cache.store(key, 'stage', {'values': frame})
+        meta = cache._read_meta(key)
+        meta['last_used'] = i
+        cache._write_meta(key, meta)
+    entry_size = cache.size('k1')
+    
+    # Using k1 makes k2 the least recently used entry
+    cache.lookup('k1')
+    cache.max_bytes = int(entry_size * 2.5)
+    assert cache.evict() == 1
+    assert sorted(cache.keys()) == ['k1', 'k3']
+    
+    # A new entry is kept even when it alone exceeds the bound
+    cache.max_bytes = 0
+    cache.store('k4', 'stage', {'values': frame})
+    assert cache.keys() == ['k4']
@@ -0,0 +1,112 @@
+"""
+Tests for the task graph executor: failure isolation, inline tasks and broken process pools.
+"""
+
+import os
+import time
+
+import pytest
+
+import task_graph
+
+EXECUTORS = ['thread', 'process']
+
+def add(a, b):
+    """Task returning the sum of its arguments."""
+    return a + b
+
+def fail(message):
+    """Task that raises."""
+    raise ValueError(message)
+
+def crash():
+    """Task killing its worker process, as the out-of-memory killer would."""
+    os._exit(1)
+
+def sleep_then(value, seconds):
+    """Task returning a value after a delay."""
+    time.sleep(seconds)
+    return value
+
+def add_tasks(graph, value):
+    """Inline task adding a task that depends on an existing one."""
+    graph.add('added', add, value, task_graph.TaskResult('base'))
+    return value
+
+@pytest.mark.parametrize('executor', EXECUTORS)
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_failure_only_skips_dependents(executor, max_workers):
+    graph = task_graph.TaskGraph()
+    base = graph.add('base', add, 1, 2)
+    broken = graph.add('broken', fail, 'no data')
+    graph.add('dependent', add, broken, 1)
+    graph.add('indirect', add, 1, 1, deps=['dependent'])
+    graph.add('sibling', add, base, 10)
+    
+    run = task_graph.run_tasks(graph, max_workers=max_workers, executor=executor)
+    
+    assert run.status == {
+        'base': 'done', 'broken': 'failed', 'dependent': 'skipped', 'indirect': 'skipped', 'sibling': 'done'
+    }
+    assert run.results == {'base': 3, 'sibling': 13}
+    assert isinstance(run.errors['broken'], ValueError) and str(run.errors['broken']) == 'no data'
+    assert run.failed == ['broken']
+    assert sorted(run.skipped) == ['dependent', 'indirect']
+
+@pytest.mark.parametrize('executor', EXECUTORS)
+def test_inline_task_adds_tasks(executor):
+    graph = task_graph.TaskGraph()
+    base = graph.add('base', add, 1, 2)
+    graph.add('planner', add_tasks, graph, base, inline=True)
+    
+    run = task_graph.run_tasks(graph, max_workers=2, executor=executor)
+    
+    assert run.status == {'base': 'done', 'planner': 'done', 'added': 'done'}
+    assert run.results['added'] == 6
+
+def test_unknown_dependency_and_executor_are_rejected():
+    graph = task_graph.TaskGraph()
+    with pytest.raises(ValueError):
+        graph.add('task', add, task_graph.TaskResult('missing'), 1)
+    with pytest.raises(ValueError):
+        task_graph.run_tasks(graph, executor='cluster')
+
+def test_broken_process_pool_fails_running_tasks_only():
+    graph = task_graph.TaskGraph()
+    crashed = graph.add('crash', crash)
+    graph.add('dependent', add, crashed, 1)
+    graph.add('concurrent', sleep_then, 1, 5)
+    
+    run = task_graph.run_tasks(graph, max_workers=2, executor='process')
+    
+    # The tasks in flight go down with the pool; the dependents are skipped
+    assert run.status == {'crash': 'failed', 'concurrent': 'failed', 'dependent': 'skipped'}
+    assert all(isinstance(error, task_graph.BrokenProcessPool) for error in run.errors.values())
+
+def test_tasks_after_a_broken_pool_run_on_a_new_pool(monkeypatch):
+    pools = []
+    create_pool = task_graph._create_pool
+    
+    def record_pool(executor, max_workers):
+        """Create a pool and remember it."""
+        pools.append(create_pool(executor, max_workers))
+        return pools[-1]
+    
+    def wait_until_broken():
+        """Wait until the first pool has noticed that its worker died."""
+        while not pools[0]._broken:
+            time.sleep(0.01)
+    
+    monkeypatch.setattr(task_graph, '_create_pool', record_pool)
+    graph = task_graph.TaskGraph()
+    graph.add('crash', crash)
+    # Inline, so it runs in the scheduler while the crashed worker takes its pool down
+    gate = graph.add('gate', wait_until_broken, inline=True)
+    graph.add('after', add, 1, 2, deps=[gate.name])
+    
+    run = task_graph.run_tasks(graph, max_workers=2, executor='process')
+    
+    assert run.status == {'crash': 'failed', 'gate': 'done', 'after': 'done'}
+    assert isinstance(run.errors['crash'], task_graph.BrokenProcessPool)
+    assert run.results['after'] == 3
+    assert len(pools) == 2
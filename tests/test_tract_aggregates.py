@@ -0,0 +1,145 @@
+"""
+Tests for the per-tract aggregates: streaming builds from sorted runs and incremental deltas.
+"""
+
+import pandas as pd
+import numpy as np
+
+import pytest
+
+import tract_aggregates
+
+STATUSES = np.array(['Open', 'Pending', 'In Progress', 'Closed', 'Unknown'])
+POPULATION = np.array([1000.0, 2500.0, np.nan, 400.0])
+
+@pytest.fixture(autouse=True)
+def processed_dir(tmp_path, monkeypatch):
+    """Keep the aggregate stores of a test in its own directory."""
+    monkeypatch.setattr(tract_aggregates, 'PROCESSED_DATA_DIR', str(tmp_path))
+    
+    return tmp_path
+
+def random_complaints(n, seed=0):
+    """Complaints with unique shuffled keys, tract codes and statuses."""
+    rng = np.random.default_rng(seed)
+    keys = rng.permutation(np.arange(10, 10 + 3 * n, 3))[:n].astype(np.int64)
+    tract_codes = rng.integers(0, len(POPULATION), n).astype(np.int32)
+    statuses = pd.Series(STATUSES[rng.integers(0, len(STATUSES), n)])
+    
+    return keys, tract_codes, statuses
+
+def assert_same_aggregates(actual, expected):
+    for name in ['keys', 'tract_codes', 'buckets', 'counts', 'population']:
+        np.testing.assert_array_equal(np.asarray(actual[name]), np.asarray(expected[name]), err_msg=name)
+    np.testing.assert_allclose(np.asarray(actual['rates']), np.asarray(expected['rates']), equal_nan=True)
+
+@pytest.mark.parametrize('block_size', [1, 3, 1000])
+def test_merge_sorted_runs_matches_build(block_size):
+    keys, tract_codes, statuses = random_complaints(40)
+    expected = tract_aggregates.build_tract_aggregates(keys, tract_codes, statuses, POPULATION, period='built')
+    
+    # Chunks of uneven sizes whose key ranges overlap
+    run_dir = tract_aggregates.runs_dir('merged')
+    bounds = [0, 7, 8, 25, 40]
+    run_paths = [
+        tract_aggregates.write_sorted_run(run_dir, keys[a:b], tract_codes[a:b], statuses[a:b].reset_index(drop=True))
+        for a, b in zip(bounds[:-1], bounds[1:])
+    ]
+    merged = tract_aggregates.merge_sorted_runs(run_paths, POPULATION, period='merged', block_size=block_size)
+    
+    assert_same_aggregates(merged, expected)
+    assert_same_aggregates(tract_aggregates.load_tract_aggregates('merged'), expected)
+
+def test_merge_sorted_runs_without_complaints():
+    merged = tract_aggregates.merge_sorted_runs([], POPULATION, period='empty')
+    
+    assert len(merged['keys']) == 0
+    assert merged['counts'].shape == (len(POPULATION), len(tract_aggregates.BUCKET_NAMES))
+    assert merged['counts'].sum() == 0
+
+@pytest.fixture
+def base():
+    """Aggregates of eight complaints over the four tracts, and the complaints they were built from."""
+    keys = np.array([5, 1, 7, 3, 9, 11, 13, 15], dtype=np.int64)
+    tract_codes = np.array([0, 0, 1, 1, 1, 2, 3, 3], dtype=np.int32)
+    statuses = pd.Series(['Open', 'Closed', 'Closed', 'In Progress', 'Open', 'Closed', 'Pending', 'Unknown'])
+    aggregates = tract_aggregates.build_tract_aggregates(keys, tract_codes, statuses, POPULATION, period='base')
+    
+    return aggregates, pd.DataFrame({'key': keys, 'tract_code': tract_codes, 'status': statuses})
+
+def apply_to_complaints(complaints, delta):
+    """Apply a delta to the complaint table a from-scratch build would see."""
+    complaints = complaints.set_index('key')
+    delta = delta.set_index('key')
+    known = delta.index.isin(complaints.index)
+    complaints.loc[delta.index[known]] = delta[known]
+    # Complaints that were never counted are not added when they do not count now either
+    new = delta[~known & (delta['tract_code'] >= 0)]
+    
+    return pd.concat([complaints, new]).sort_index().reset_index()
+
+def test_apply_delta_matches_build_from_scratch(base):
+    aggregates, complaints = base
+    delta = pd.DataFrame({
+        # 5 moves tract, 7 changes bucket, 13 moves tract and bucket, 9 is unchanged,
+        # 11 no longer counts, 2 is new, 4 is new but does not count
+        'key': np.array([5, 7, 13, 9, 11, 2, 4], dtype=np.int64),
+        'tract_code': np.array([1, 1, 0, 1, -1, 3, -1], dtype=np.int32),
+        'status': ['Open', 'Open', 'Closed', 'Open', 'Closed', 'Started', 'Open']
+    })
+    
+    tract_aggregates.apply_delta(aggregates, delta['key'].to_numpy(), delta['tract_code'].to_numpy(), delta['status'])
+    
+    final = apply_to_complaints(complaints, delta)
+    expected = tract_aggregates.build_tract_aggregates(
+        final['key'].to_numpy(), final['tract_code'].to_numpy(), final['status'], POPULATION, period='scratch'
+    )
+    assert_same_aggregates(aggregates, expected)
+
+def test_apply_delta_moves_counts_between_tracts_and_buckets(base):
+    aggregates, _ = base
+    before = aggregates['counts'].copy()
+    in_progress, closed, other = (tract_aggregates.BUCKET_NAMES.index(name)
+                                  for name in ['in_progress', 'closed', 'other'])
+    
+    # 1 moves from (tract 0, closed) to (tract 3, in progress); 15 from (3, other) to (3, closed)
+    touched = tract_aggregates.apply_delta(
+        aggregates, np.array([1, 15]), np.array([3, 3]), pd.Series(['In Progress', 'Closed'])
+    )
+    
+    change = aggregates['counts'] - before
+    expected_change = np.zeros_like(change)
+    expected_change[0, closed] = -1
+    expected_change[3, [in_progress, closed, other]] = [1, 1, -1]
+    np.testing.assert_array_equal(change, expected_change)
+    assert touched.tolist() == [0, 3]
+    assert aggregates['counts'].sum() == 8
+
+def test_apply_delta_subtracts_complaints_that_no_longer_count(base):
+    aggregates, _ = base
+    before = aggregates['counts'].copy()
+    
+    touched = tract_aggregates.apply_delta(
+        aggregates, np.array([11, 99]), np.array([-1, -1]), pd.Series(['Closed'] * 2)
+    )
+    
+    closed = tract_aggregates.BUCKET_NAMES.index('closed')
+    assert touched.tolist() == [2]
+    assert aggregates['counts'][2, closed] == before[2, closed] - 1
+    assert aggregates['counts'].sum() == before.sum() - 1
+    # The complaint stays known, so a later delta that counts it again adds it back once
+    assert 99 not in aggregates['keys']
+    assert aggregates['tract_codes'][np.searchsorted(aggregates['keys'], 11)] == -1
+    tract_aggregates.apply_delta(aggregates, np.array([11]), np.array([2]), pd.Series(['Closed']))
+    np.testing.assert_array_equal(aggregates['counts'], before)
+
+def test_apply_delta_recomputes_rates_of_touched_tracts_only(base):
+    aggregates, _ = base
+    aggregates['rates'][:] = -1
+    
+    # 1 changes bucket within tract 0; 9 keeps its tract and bucket, so tract 1 is not touched
+    touched = tract_aggregates.apply_delta(aggregates, np.array([1, 9]), np.array([0, 1]), pd.Series(['Open'] * 2))
+    
+    assert touched.tolist() == [0]
+    assert aggregates['rates'][0] == 2
+    assert aggregates['rates'][1:].tolist() == [-1, -1, -1]
@@ -0,0 +1,94 @@
+"""
+Tests for the tract index: grid, STRtree and parallel lookups against a spatial join with the tract geometries.
+"""
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+import pytest
+
+import tract_index
+
+EXTENT = (-74.05, 40.6, -73.95, 40.7)
+
+@pytest.fixture(scope='module')
+def census_gdf():
+    """Voronoi tracts over the extent, in tract_code order."""
+    rng = np.random.default_rng(0)
+    minx, miny, maxx, maxy = EXTENT
+    seeds = shapely.multipoints(np.column_stack([rng.uniform(minx, maxx, 40), rng.uniform(miny, maxy, 40)]))
+    box = shapely.box(*EXTENT)
+    cells = shapely.get_parts(shapely.voronoi_polygons(seeds, extend_to=box))
+    
+    return gpd.GeoDataFrame(
+        {'GEOID': [f"36047{i:06d}" for i in range(len(cells))]}, geometry=shapely.intersection(cells, box),
+        crs="EPSG:4326"
+    )
+
+@pytest.fixture(scope='module')
+def cache_dir(census_gdf, tmp_path_factory):
+    """Tract cache of the Voronoi tracts."""
+    cache_dir = str(tmp_path_factory.mktemp('tracts') / 'census_tract_cache')
+    tract_index.write_tract_cache(census_gdf, cache_dir=cache_dir)
+    
+    return cache_dir
+
+@pytest.fixture(scope='module')
+def points(census_gdf):
+    """Points inside the tracts, on and near their boundaries, outside the extent and without coordinates."""
+    rng = np.random.default_rng(1)
+    minx, miny, maxx, maxy = EXTENT
+    inside = np.column_stack([rng.uniform(minx, maxx, 2000), rng.uniform(miny, maxy, 2000)])
+    
+    # Tract vertices and edge midpoints lie on boundaries; nudged copies land on either side
+    vertices = shapely.get_coordinates(census_gdf.geometry.boundary.values)
+    midpoints = (vertices[:-1] + vertices[1:]) / 2
+    on_boundary = np.concatenate([vertices, midpoints])
+    near_boundary = np.concatenate([on_boundary + offset for offset in (1e-9, -1e-9, 2e-5, -2e-5)])
+    near_boundary[:, 1] += rng.normal(0, 1e-6, len(near_boundary))
+    
+    outside = np.array([[minx - 0.01, miny], [maxx + 0.5, maxy], [minx, maxy + 1e-9], [np.nan, miny], [minx, np.inf]])
+    
+    return np.concatenate([inside, on_boundary, near_boundary, outside])
+
+def sjoin_tract_codes(census_gdf, xy):
+    """Locate points with a spatial join on the within predicate (first tract if several match)."""
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(xy[:, 0], xy[:, 1]), crs=census_gdf.crs)
+    joined = gpd.sjoin(points, census_gdf, how='left', predicate='within')
+    first = joined['index_right'].groupby(level=0).min()
+    
+    return first.fillna(tract_index.NO_TRACT).to_numpy(dtype=np.int32)
+
+def test_locate_matches_sjoin_within(census_gdf, cache_dir, points):
+    index = tract_index.TractIndex(cache_dir)
+    
+    codes = index.locate(points[:, 0], points[:, 1])
+    
+    expected = sjoin_tract_codes(census_gdf, points)
+    np.testing.assert_array_equal(codes, expected)
+    # The grid settles most points; the boundary cells, and the points on boundaries, are still covered
+    assert (index.grid == tract_index.BOUNDARY_CELL).mean() < 0.5
+    assert (expected == tract_index.NO_TRACT).sum() > 5
+
+@pytest.mark.parametrize('block_size', [1, 7])
+def test_locate_with_envelope_and_blocks_matches_sjoin(census_gdf, cache_dir, points, block_size):
+    index = tract_index.TractIndex(cache_dir)
+    subset = points[np.isfinite(points).all(axis=1) & (points[:, 0] < -74.0)]
+    envelope = (subset[:, 0].min(), subset[:, 1].min(), subset[:, 0].max(), subset[:, 1].max())
+    
+    codes = index.locate(subset[:, 0], subset[:, 1], block_size=block_size, envelope=envelope)
+    
+    np.testing.assert_array_equal(codes, sjoin_tract_codes(census_gdf, subset))
+
+def test_locate_parallel_keeps_point_order(cache_dir, points, monkeypatch):
+    monkeypatch.setattr(tract_index, 'PARALLEL_MIN_POINTS', 0)
+    # Shuffled, so the Z-order shards hold points from all over the input
+    shuffled = points[np.random.default_rng(2).permutation(len(points))]
+    
+    codes = tract_index.locate_parallel(shuffled[:, 0], shuffled[:, 1], cache_dir=cache_dir, n_workers=2)
+    
+    expected = tract_index.TractIndex(cache_dir).locate(shuffled[:, 0], shuffled[:, 1])
+    assert codes.dtype == np.int32
+    np.testing.assert_array_equal(codes, expected)
+    assert len(np.unique(expected)) > 10